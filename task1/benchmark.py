@@ -0,0 +1,278 @@
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+# The benchmarks run against an in-process stand-in of MongoDB, the settings only have to be present.
+os.environ.setdefault('MONGODB_URI', 'mongodb://benchmark')
+os.environ.setdefault('DATABASE_NAME', 'benchmark')
+os.environ.setdefault('COLLECTION_NAME', 'logs')
+
+import database
+import logs_tool
+import output
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LINES = 100000
+DEFAULT_SERVICES = 20
+DEFAULT_SEVERITIES = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+DEFAULT_SEPARATOR_FRACTION = 0.2
+WORDS = ('request', 'user', 'session', 'timeout', 'cache', 'connection', 'retry', 'order', 'payment', 'query',
+         'started', 'finished', 'failed', 'accepted', 'rejected', 'updated', 'deleted', 'created', 'slow', 'queued')
+
+
+def generate_log_lines(count, services=DEFAULT_SERVICES, severities=DEFAULT_SEVERITIES,
+                       separator_fraction=DEFAULT_SEPARATOR_FRACTION, seed=0):
+    """
+    Yield count synthetic log lines in the layout read by logs_tool, one millisecond or more apart.
+
+    separator_fraction of the messages contain ' - ', the separator of the log fields, which the parser has to put
+    back into the message. The lines only depend on the arguments, so runs with the same arguments are comparable.
+    """
+    rng = random.Random(seed)
+    service_names = [f'service-{i}' for i in range(services)]
+    timestamp = datetime(2024, 1, 1)
+    for i in range(count):
+        timestamp += timedelta(milliseconds=rng.randint(1, 50))
+        message = ' '.join(rng.choices(WORDS, k=rng.randint(3, 12)))
+        if rng.random() < separator_fraction:
+            message = f"{message} - id={i} - {rng.choice(WORDS)}"
+        yield (f"{timestamp.strftime('%Y-%m-%d %H:%M:%S')},{timestamp.microsecond // 1000:03d} - "
+               f"{rng.choice(service_names)} - {rng.choice(severities)} - {message}\n")
+
+
+def write_log_file(path, count, **options):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(generate_log_lines(count, **options))
+    return os.path.getsize(path)
+
+
+def use_in_process_database():
+    """
+    Point the MongoDBClient singleton at a fresh in-memory mongomock client, as a standard collection.
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise RuntimeError("The database benchmarks need the mongomock package (pip install mongomock).") from None
+    database.MongoClient = mongomock.MongoClient
+    mongo_client = database.MongoDBClient()
+    mongo_client.connection = None
+    mongo_client.db = None
+    mongo_client.collections = {}
+    # mongomock cannot describe collections, the stand-in is always a standard collection.
+    mongo_client.timeseries = False
+    return mongo_client
+
+
+def read_entries(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return logs_tool.parse_log_file(file)
+
+
+def add_args(path, batch_size):
+    return argparse.Namespace(file=[path], batch_size=batch_size, workers=1, chunk_size=logs_tool.DEFAULT_CHUNK_SIZE,
+                              writers=1, queue_size=logs_tool.DEFAULT_QUEUE_SIZE, write_concern=None,
+                              incremental=False, follow=False)
+
+
+def bench_parse_line(path, batch_size):
+    with open(path, 'r', encoding='utf-8') as file:
+        start = time.perf_counter()
+        count = 0
+        for line in file:
+            logs_tool.parse_log_line(line)
+            count += 1
+    return count, time.perf_counter() - start
+
+
+def bench_parse_file(path, batch_size):
+    start = time.perf_counter()
+    entries = read_entries(path)
+    return len(entries), time.perf_counter() - start
+
+
+def bench_format_entry(path, batch_size):
+    entries = read_entries(path)
+    start = time.perf_counter()
+    for entry in entries:
+        logs_tool.format_log_entry(entry)
+    return len(entries), time.perf_counter() - start
+
+
+def bench_write_text(path, batch_size):
+    entries = read_entries(path)
+    with open(os.devnull, 'w') as stream:
+        start = time.perf_counter()
+        count, _ = output.write_log_entries(entries, stream, logs_tool.LOG_FIELDS)
+    return count, time.perf_counter() - start
+
+
+def bench_insert(path, batch_size):
+    mongo_client = use_in_process_database()
+    entries = read_entries(path)
+    start = time.perf_counter()
+    for batch in logs_tool.batch_logs(entries, batch_size):
+        if mongo_client.insert_data(batch) is None:
+            raise RuntimeError("Failed to insert a batch into the in-process database.")
+    return len(entries), time.perf_counter() - start
+
+
+def bench_add(path, batch_size):
+    mongo_client = use_in_process_database()
+    start = time.perf_counter()
+    logs_tool.add_logs(add_args(path, batch_size))
+    return mongo_client.get_collection().count_documents({}), time.perf_counter() - start
+
+
+def bench_get(path, batch_size):
+    use_in_process_database()
+    logs_tool.add_logs(add_args(path, batch_size))
+    args = argparse.Namespace(field='service', eq='service-1', ne=None, lt=None, gt=None, where=None, limit=None,
+                              skip=0, after=None, sort='datetime', desc=False, fields=None, format='text',
+                              batch_size=batch_size, explain=False, from_snapshot=None, **{'in': None})
+    with open(os.devnull, 'w') as stream, redirect_stdout(stream):
+        start = time.perf_counter()
+        logs_tool.get_logs(args)
+        elapsed = time.perf_counter() - start
+    # get streams the entries of a single service, report the throughput over the entries it printed.
+    count = database.MongoDBClient().get_collection().count_documents({'service': 'service-1'})
+    return count, elapsed
+
+
+BENCHMARKS = {
+    'parse_line': bench_parse_line,
+    'parse_file': bench_parse_file,
+    'format_entry': bench_format_entry,
+    'write_text': bench_write_text,
+    'insert': bench_insert,
+    'add': bench_add,
+    'get': bench_get
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_benchmark(name, path, batch_size):
+    """
+    Run one benchmark and return its result: processed lines, seconds, lines per second and peak RSS.
+    """
+    count, seconds = BENCHMARKS[name](path, batch_size)
+    return {
+        'lines': count,
+        'seconds': round(seconds, 4),
+        'lines_per_sec': round(count / seconds) if seconds else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def _run_in_child(name, path, batch_size, results):
+    # Per-batch info logs would be measured as well.
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        result = run_benchmark(name, path, batch_size)
+    except Exception as e:
+        result = {'error': str(e)}
+    results.put(result)
+
+
+def run_isolated(name, path, batch_size):
+    """
+    Run the benchmark in a fresh interpreter, so its peak RSS is not inflated by the previous benchmarks.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_in_child, args=(name, path, batch_size, results))
+    process.start()
+    result = results.get()
+    process.join()
+    if 'error' in result:
+        logger.error(f"The {name} benchmark failed: {result['error']}")
+    return result
+
+
+def compare_results(results, baseline):
+    """
+    Return (benchmark, lines/sec, baseline lines/sec, ratio) rows for the benchmarks present in both runs.
+    """
+    rows = []
+    for name, result in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if previous and previous.get('lines_per_sec') and result.get('lines_per_sec'):
+            ratio = round(result['lines_per_sec'] / previous['lines_per_sec'], 2)
+            rows.append([name, result['lines_per_sec'], previous['lines_per_sec'], ratio])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parse, format and ingest paths of logs_tool.py on "
+                                                 "synthetic logs and save the results as JSON.")
+    parser.add_argument('--lines', type=logs_tool.positive_int, default=DEFAULT_LINES,
+                        help=f'Number of generated log lines (default: {DEFAULT_LINES})')
+    parser.add_argument('--services', type=logs_tool.positive_int, default=DEFAULT_SERVICES,
+                        help=f'Number of distinct services (default: {DEFAULT_SERVICES})')
+    parser.add_argument('--severities', nargs='+', default=list(DEFAULT_SEVERITIES),
+                        help=f'Severities of the log lines (default: {" ".join(DEFAULT_SEVERITIES)})')
+    parser.add_argument('--separator-fraction', type=float, default=DEFAULT_SEPARATOR_FRACTION,
+                        help=f'Fraction of the messages containing " - " (default: {DEFAULT_SEPARATOR_FRACTION})')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generator (default: 0)')
+    parser.add_argument('--batch-size', type=logs_tool.positive_int, default=logs_tool.DEFAULT_BATCH_SIZE,
+                        help=f'Batch size of inserts and cursors (default: {logs_tool.DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help='Benchmarks to run (default: all)')
+    parser.add_argument('--output', help='Path of the JSON file the results are written to')
+    parser.add_argument('--compare', help='Path of the JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'benchmark.log')
+        size = write_log_file(path, args.lines, services=args.services, severities=args.severities,
+                              separator_fraction=args.separator_fraction, seed=args.seed)
+        results = {
+            'meta': {
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'lines': args.lines,
+                'bytes': size,
+                'services': args.services,
+                'severities': args.severities,
+                'separator_fraction': args.separator_fraction,
+                'seed': args.seed,
+                'batch_size': args.batch_size
+            },
+            'benchmarks': {}
+        }
+        for name in args.only:
+            results['benchmarks'][name] = run_isolated(name, path, args.batch_size)
+
+    rows = [[name, result.get('lines_per_sec', 'failed'), result.get('seconds', ''), result.get('peak_rss_mb', '')]
+            for name, result in results['benchmarks'].items()]
+    output.write_table(rows, ['benchmark', 'lines/sec', 'seconds', 'peak RSS (MB)'], sys.stdout)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+        print()
+        output.write_table(compare_results(results, baseline), ['benchmark', 'lines/sec', 'baseline', 'ratio'],
+                           sys.stdout)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
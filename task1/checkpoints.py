@@ -0,0 +1,87 @@
+import hashlib
+import json
+import logging
+import os
+
+import config
+
+logging.basicConfig(level=config.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+def hash_line(line):
+    return hashlib.sha1(line).hexdigest()
+
+
+def load_state(state_file):
+    """
+    Load the checkpoints saved by previous incremental runs, keyed by absolute file path.
+    """
+    try:
+        with open(state_file, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        logger.debug(f"State file {state_file} does not exist, starting from scratch.")
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read state file {state_file}, starting from scratch: {e}")
+        return {}
+
+
+def save_state(state_file, state):
+    """
+    Atomically write the checkpoints, dropping the ones of files that no longer exist.
+    """
+    state = {path: checkpoint for path, checkpoint in state.items() if os.path.exists(path)}
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w') as file:
+        json.dump(state, file, indent=2)
+    os.replace(tmp_file, state_file)
+
+
+def make_checkpoint(file, offset, last_line):
+    """
+    Describe the position after last_line, which ends at offset in the open binary file.
+    """
+    file_stat = os.fstat(file.fileno())
+    return {
+        'device': file_stat.st_dev,
+        'inode': file_stat.st_ino,
+        'size': file_stat.st_size,
+        'offset': offset,
+        'last_line_length': len(last_line),
+        'last_line_hash': hash_line(last_line)
+    }
+
+
+def find_checkpoint(state, file_path, file):
+    """
+    Return the checkpoint of the open file, also when it was renamed (rotated) since the checkpoint was made.
+    """
+    file_stat = os.fstat(file.fileno())
+    candidates = [state.get(file_path)] + list(state.values())
+    for checkpoint in candidates:
+        if checkpoint and checkpoint['inode'] == file_stat.st_ino and checkpoint['device'] == file_stat.st_dev:
+            return checkpoint
+    return None
+
+
+def resume_offset(file, checkpoint):
+    """
+    Return the byte offset to resume reading the open binary file from.
+
+    Reading restarts at 0 when there is no checkpoint, the file was truncated or the line before the saved offset
+    is not the one that was last ingested (the file was replaced in place).
+    """
+    if checkpoint is None:
+        return 0
+    offset = checkpoint['offset']
+    if os.fstat(file.fileno()).st_size < offset:
+        logger.warning(f"{file.name} was truncated, reading it from the beginning.")
+        return 0
+    length = checkpoint['last_line_length']
+    file.seek(offset - length)
+    if hash_line(file.read(length)) != checkpoint['last_line_hash']:
+        logger.warning(f"{file.name} was replaced, reading it from the beginning.")
+        return 0
+    return offset
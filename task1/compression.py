@@ -0,0 +1,138 @@
+import bz2
+import io
+import sys
+import zlib
+
+STDIN_PATH = '-'
+READ_SIZE = 1024 * 1024
+HEADER_SIZE = 4
+
+# Magic bytes at the start of the supported compressed formats.
+MAGIC_BYTES = {
+    b'\x1f\x8b': 'gzip',
+    b'BZh': 'bz2',
+    b'\x28\xb5\x2f\xfd': 'zstd'
+}
+
+
+class _Uncompressed:
+    eof = True
+    unused_data = b''
+
+    @staticmethod
+    def decompress(data):
+        return data
+
+
+def _gzip_decompressor():
+    return zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+
+
+def _zstd_decompressor():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("The zstandard package is required to read zstd compressed files.") from None
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+DECOMPRESSORS = {
+    'gzip': _gzip_decompressor,
+    'bz2': bz2.BZ2Decompressor,
+    'zstd': _zstd_decompressor
+}
+
+
+def detect_compression(header):
+    """
+    Return the compression format ('gzip', 'bz2' or 'zstd') whose magic bytes start header, or None.
+    """
+    for magic, compression in MAGIC_BYTES.items():
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+class _DecompressingReader(io.RawIOBase):
+    """
+    Raw stream of the decompressed content of file, whose first bytes were already read into header.
+
+    Concatenated members (gzip, bz2) and frames (zstd), as written by appending to an archive, are read one after
+    the other.
+    """
+
+    def __init__(self, name, file, header, new_decompressor, close_file=True):
+        self.name = name
+        self._file = file
+        self._close_file = close_file
+        self._pending = header
+        self._new_decompressor = new_decompressor
+        self._decompressor = new_decompressor()
+        self._buffer = b''
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._position == len(self._buffer):
+            data = self._pending or self._file.read(READ_SIZE)
+            self._pending = b''
+            if not data:
+                if not self._decompressor.eof:
+                    raise ValueError(f"{self.name}: Compressed data ends before the end of the stream.")
+                return 0
+            if self._decompressor.eof:
+                self._decompressor = self._new_decompressor()
+            try:
+                self._buffer = self._decompressor.decompress(data)
+            except Exception as e:
+                raise ValueError(f"{self.name}: Invalid compressed data: {e}") from e
+            self._position = 0
+            if self._decompressor.eof:
+                self._pending = self._decompressor.unused_data
+        size = min(len(buffer), len(self._buffer) - self._position)
+        buffer[:size] = self._buffer[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def close(self):
+        if not self.closed and self._close_file:
+            self._file.close()
+        super().close()
+
+
+def _read_header(file):
+    header = b''
+    while len(header) < HEADER_SIZE:
+        data = file.read(HEADER_SIZE - len(header))
+        if not data:
+            break
+        header += data
+    return header
+
+
+def open_log_file(file_path):
+    """
+    Open the log file, or stdin if file_path is '-', as a binary stream of its decompressed content.
+
+    The compression is detected from the magic bytes, not from the file name, and the content is decompressed while
+    it is read, so compressed files are never written to disk. Uncompressed regular files are returned as they are.
+    Closing the stream closes the file, but not stdin.
+    """
+    is_stdin = file_path == STDIN_PATH
+    file = sys.stdin.buffer if is_stdin else open(file_path, 'rb')
+    try:
+        header = _read_header(file)
+        compression = detect_compression(header)
+        if compression is None and not is_stdin and file.seekable():
+            file.seek(0)
+            return file
+        new_decompressor = DECOMPRESSORS[compression] if compression else _Uncompressed
+        name = '<stdin>' if is_stdin else file_path
+        reader = _DecompressingReader(name, file, header, new_decompressor, close_file=not is_stdin)
+    except BaseException:
+        if not is_stdin:
+            file.close()
+        raise
+    return io.BufferedReader(reader, buffer_size=READ_SIZE)
@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
@@ -14,6 +15,17 @@ def set_and_check_env_var(var_name):
     return value
 
 
+def get_int_env_var(var_name, default):
+    value = os.getenv(var_name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Invalid {var_name}: {value}. Using default value: {default}.")
+        return default
+
+
 LOG_LEVEL = os.getenv('LOG_LEVEL', '').upper()
 
 if LOG_LEVEL not in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
@@ -29,3 +41,41 @@ MONGODB_URI = set_and_check_env_var('MONGODB_URI')
 DATABASE_NAME = set_and_check_env_var('DATABASE_NAME')
 
 COLLECTION_NAME = set_and_check_env_var('COLLECTION_NAME')
+
+# Connection pool of the MongoDB driver. The driver monitors the servers in the background every
+# MONGODB_HEARTBEAT_FREQUENCY_MS instead of the application checking the connection before each operation.
+MONGODB_MAX_POOL_SIZE = get_int_env_var('MONGODB_MAX_POOL_SIZE', 100)
+MONGODB_MIN_POOL_SIZE = get_int_env_var('MONGODB_MIN_POOL_SIZE', 0)
+MONGODB_HEARTBEAT_FREQUENCY_MS = get_int_env_var('MONGODB_HEARTBEAT_FREQUENCY_MS', 10000)
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = get_int_env_var('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 30000)
+MONGODB_CONNECT_TIMEOUT_MS = get_int_env_var('MONGODB_CONNECT_TIMEOUT_MS', 20000)
+# 0 waits for the responses of the server without a timeout.
+MONGODB_SOCKET_TIMEOUT_MS = get_int_env_var('MONGODB_SOCKET_TIMEOUT_MS', 0)
+
+# Fingerprints of the files and chunks already added by logs_tool.py, defaults to a collection next to the logs.
+MANIFEST_COLLECTION_NAME = os.getenv('MANIFEST_COLLECTION_NAME') or f"{COLLECTION_NAME}_manifest"
+
+# Hourly per service and severity summaries written by the rollup command of logs_tool.py.
+ROLLUP_COLLECTION_NAME = os.getenv('ROLLUP_COLLECTION_NAME') or f"{COLLECTION_NAME}_hourly"
+
+# Unix socket of the query daemon started by logs_tool.py serve, used by get and stats when the daemon is running.
+# The per-user runtime directory is preferred over the shared temporary directory.
+SOCKET_PATH = os.getenv('LOGS_TOOL_SOCKET') or (
+    os.path.join(os.environ['XDG_RUNTIME_DIR'], 'logs_tool.sock') if os.getenv('XDG_RUNTIME_DIR')
+    else os.path.join(tempfile.gettempdir(), f"logs_tool-{os.getuid()}.sock")
+)
+
+# 'timeseries' creates the log collection as a time-series collection when it does not exist yet (see the migrate
+# command of logs_tool.py for existing collections), 'standard' as a plain collection.
+COLLECTION_TYPE = os.getenv('COLLECTION_TYPE', 'standard').lower()
+
+if COLLECTION_TYPE not in ['standard', 'timeseries']:
+    logger.warning(f"Invalid COLLECTION_TYPE: {COLLECTION_TYPE}. Using default type: standard.")
+    COLLECTION_TYPE = 'standard'
+
+TIMESERIES_GRANULARITIES = ['seconds', 'minutes', 'hours']
+TIMESERIES_GRANULARITY = os.getenv('TIMESERIES_GRANULARITY', 'seconds').lower()
+
+if TIMESERIES_GRANULARITY not in TIMESERIES_GRANULARITIES:
+    logger.warning(f"Invalid TIMESERIES_GRANULARITY: {TIMESERIES_GRANULARITY}. Using default granularity: seconds.")
+    TIMESERIES_GRANULARITY = 'seconds'
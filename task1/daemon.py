@@ -0,0 +1,374 @@
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from datetime import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 60.0
+# Larger results are streamed to the client but not cached.
+MAX_CACHED_BYTES = 4 * 1024 * 1024
+CONNECT_TIMEOUT = 1.0
+STREAM_BUFFER_SIZE = 64 * 1024
+
+# A request is one JSON line, the response a sequence of frames: a one byte type and the length of the payload.
+# Output frames carry the stdout of the command, log frames its log lines and the end frame a JSON status.
+FRAME_HEADER = struct.Struct('!cI')
+OUTPUT_FRAME = b'o'
+LOG_FRAME = b'l'
+END_FRAME = b'e'
+LOG_FORMAT = logging.BASIC_FORMAT
+
+
+def target_id():
+    """
+    Fingerprint of the database and collections this process works on, so a daemon never answers for another one.
+    """
+    target = '\x1f'.join(str(value) for value in (config.MONGODB_URI, config.DATABASE_NAME, config.COLLECTION_NAME,
+                                                   config.ROLLUP_COLLECTION_NAME))
+    return hashlib.sha256(target.encode('utf-8')).hexdigest()
+
+
+def _write_frame(file, frame_type, payload):
+    file.write(FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def _read_frames(file):
+    while True:
+        header = file.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return
+        frame_type, size = FRAME_HEADER.unpack(header)
+        payload = file.read(size)
+        if len(payload) < size:
+            return
+        yield frame_type, payload
+
+
+def _overlaps(time_range, start, end):
+    first, last = time_range
+    return (first is None or end is None or first <= end) and (last is None or start is None or last >= start)
+
+
+class ResultCache:
+    """
+    LRU cache of query results (output and log lines) with the datetime range the query depends on.
+
+    Results expire after ttl seconds, invalidate drops the results whose range overlaps new data. Every
+    invalidation also bumps the generation, so a result computed while data was being changed is not stored.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, _, output, logs = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return output, logs
+
+    def put(self, key, time_range, output, logs, generation):
+        with self._lock:
+            if generation != self.generation or self.size == 0:
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl, time_range, output, logs)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, start=None, end=None):
+        """
+        Drop the results depending on log entries between start and end (None for unbounded). Returns their number.
+        """
+        with self._lock:
+            self.generation += 1
+            stale = [key for key, entry in self._entries.items() if _overlaps(entry[1], start, end)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+
+class _FrameWriter(io.TextIOBase):
+    """
+    Text stream sending what is written as output frames, keeping a copy for the cache up to MAX_CACHED_BYTES.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.captured = []
+        self.captured_size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            data = text.encode('utf-8')
+            _write_frame(self.file, OUTPUT_FRAME, data)
+            if self.captured is not None:
+                self.captured_size += len(data)
+                if self.captured_size <= MAX_CACHED_BYTES:
+                    self.captured.append(text)
+                else:
+                    self.captured = None
+        return len(text)
+
+    def flush(self):
+        self.file.flush()
+
+
+class _FrameLogHandler(logging.Handler):
+    """
+    Send the log records of the thread answering the query as log frames, keeping them for the cache. Results
+    that logged an error are not cached.
+    """
+
+    def __init__(self, file):
+        super().__init__(logging.getLogger().level)
+        self.file = file
+        self.lines = []
+        self.failed = False
+        self.thread = threading.get_ident()
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def filter(self, record):
+        return record.thread == self.thread
+
+    def emit(self, record):
+        line = self.format(record)
+        self.lines.append(line)
+        self.failed = self.failed or record.levelno >= logging.ERROR
+        _write_frame(self.file, LOG_FRAME, line.encode('utf-8'))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    wbufsize = STREAM_BUFFER_SIZE
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        try:
+            handled = self.server.process(request, self.wfile)
+        except Exception as e:
+            logger.error(f"Failed to answer request: {e}")
+            handled = False
+        _write_frame(self.wfile, END_FRAME, json.dumps({'handled': handled}).encode('utf-8'))
+
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server answering query commands with run_query(argv), which writes the output of the command to
+    sys.stdout and returns the (start, end) datetime range it depends on.
+
+    Queries run one at a time, as they write to sys.stdout, while cache invalidations are answered concurrently.
+    """
+    daemon_threads = True
+
+    def __init__(self, path, run_query, cache):
+        self.run_query = run_query
+        self.cache = cache
+        self._query_lock = threading.Lock()
+        # The socket is created by bind, the umask makes it only accessible to the current user from the start.
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def process(self, request, file):
+        if request.get('target') != target_id():
+            logger.warning("Rejected a request for another database or collection")
+            return False
+        if request.get('command') == 'invalidate':
+            start, end = (datetime.fromisoformat(value) if value else None
+                          for value in (request.get('start'), request.get('end')))
+            dropped = self.cache.invalidate(start, end)
+            logger.debug(f"Invalidated {dropped} cached results between {start} and {end}")
+            return True
+        if request.get('command') != 'query':
+            return False
+
+        key = json.dumps(request['argv'])
+        cached = self.cache.get(key)
+        if cached is not None:
+            output, logs = cached
+            for line in logs:
+                _write_frame(file, LOG_FRAME, line.encode('utf-8'))
+            if output:
+                _write_frame(file, OUTPUT_FRAME, output.encode('utf-8'))
+            return True
+
+        writer = _FrameWriter(file)
+        log_handler = _FrameLogHandler(file)
+        root_logger = logging.getLogger()
+        with self._query_lock:
+            generation = self.cache.generation
+            root_logger.addHandler(log_handler)
+            try:
+                with redirect_stdout(writer):
+                    time_range = self.run_query(request['argv'])
+            except (Exception, SystemExit) as e:
+                logger.error(f"Failed to run {' '.join(request['argv'])}: {e}")
+                time_range = None
+            finally:
+                root_logger.removeHandler(log_handler)
+        if time_range is not None and writer.captured is not None and not log_handler.failed:
+            self.cache.put(key, time_range, ''.join(writer.captured), log_handler.lines, generation)
+        return True
+
+
+def serve(path, run_query, cache):
+    """
+    Answer the queries sent to the Unix socket at path until interrupted. A socket left behind by a daemon that is
+    no longer running is replaced.
+    """
+    if os.path.lexists(path) and not _is_own_socket(path):
+        raise RuntimeError(f"{path} is not a socket of the current user, remove it or choose another --socket.")
+    if is_running(path):
+        raise RuntimeError(f"A daemon is already listening on {path}.")
+    if os.path.lexists(path):
+        os.remove(path)
+    with QueryServer(path, run_query, cache) as server:
+        logger.info(f"Serving queries on {path}")
+        signal.signal(signal.SIGTERM, _stop)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopped serving queries.")
+        finally:
+            os.remove(path)
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _is_own_socket(path):
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+
+def _peer_uid(sock):
+    """
+    User id of the process listening on the connected socket, or None where the platform does not tell.
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    credentials = struct.Struct('3i')
+    _, uid, _ = credentials.unpack(sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, credentials.size))
+    return uid
+
+
+def _connect(path):
+    """
+    Connect to the daemon listening on path. Returns None if there is none, or if the socket or the process
+    listening on it belongs to another user, whose answers must not be trusted.
+    """
+    if not os.path.lexists(path):
+        return None
+    if not _is_own_socket(path):
+        logger.warning(f"Ignoring {path}, it is not a socket of the current user.")
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(path)
+        peer_uid = _peer_uid(sock)
+    except OSError:
+        sock.close()
+        return None
+    if peer_uid is not None and peer_uid != os.getuid():
+        logger.warning(f"Ignoring the daemon on {path}, it runs as another user.")
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def is_running(path):
+    sock = _connect(path)
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def _request(path, request, stdout=None, stderr=None):
+    """
+    Send the request to the daemon and copy the output and log frames of the response to stdout and stderr.
+    Returns whether the daemon handled the request, or None if no daemon is listening.
+    """
+    sock = _connect(path)
+    if sock is None:
+        return None
+    with sock, sock.makefile('rwb') as file:
+        file.write(json.dumps({**request, 'target': target_id()}).encode('utf-8') + b'\n')
+        file.flush()
+        for frame_type, payload in _read_frames(file):
+            if frame_type == OUTPUT_FRAME and stdout is not None:
+                stdout.write(payload.decode('utf-8'))
+            elif frame_type == LOG_FRAME and stderr is not None:
+                stderr.write(payload.decode('utf-8') + '\n')
+            elif frame_type == END_FRAME:
+                return json.loads(payload)['handled']
+    raise ConnectionError("The daemon closed the connection before the end of the response.")
+
+
+def forward_query(argv, stdout, stderr, path):
+    """
+    Run the command line argv on the daemon listening on path, writing its output and log lines to stdout and
+    stderr. Returns False, before anything was written, if no daemon is running or it serves another database.
+    """
+    try:
+        handled = _request(path, {'command': 'query', 'argv': argv}, stdout, stderr)
+    except OSError as e:
+        logger.error(f"Lost the connection to the daemon on {path}: {e}")
+        return True
+    if handled:
+        stdout.flush()
+    return bool(handled)
+
+
+def invalidate(start, end, path):
+    """
+    Tell the daemon listening on path, if any, that log entries between start and end (None for unbounded) were
+    added or removed.
+    """
+    try:
+        _request(path, {'command': 'invalidate', 'start': start.isoformat() if start else None,
+                        'end': end.isoformat() if end else None})
+    except OSError as e:
+        logger.warning(f"Failed to invalidate the cached results of the daemon on {path}: {e}")
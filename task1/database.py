@@ -1,11 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import threading
+import time
+
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import BulkWriteError
 from pymongo.mongo_client import MongoClient
 
 import config
+import profiling
+import records
 
 logging.basicConfig(level=config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+DEFAULT_CURSOR_BATCH_SIZE = 1000
+DUPLICATE_KEY_ERROR = 11000
+
+# Layout of the documents in time-series collections: service and severity are stored together in the metaField,
+# which MongoDB uses to group the entries of a series into compressed buckets.
+TIMESERIES_TIME_FIELD = 'datetime'
+TIMESERIES_META_FIELD = 'meta'
+TIMESERIES_META_KEYS = ('service', 'severity')
+TIMESERIES_FIELDS = ('datetime', 'service', 'severity', 'message')
+# Deleting from a time-series collection with a filter on other fields than the metaField (here datetime) needs
+# MongoDB 7.0.
+TIMESERIES_DELETE_VERSION = (7, 0)
+
+
+def _timeseries_field(field):
+    if field in TIMESERIES_META_KEYS:
+        return f'{TIMESERIES_META_FIELD}.{field}'
+    return field
+
+
+def to_timeseries_document(document):
+    meta = {key: document[key] for key in TIMESERIES_META_KEYS if key in document}
+    converted = {field: value for field, value in document.items() if field not in TIMESERIES_META_KEYS}
+    converted[TIMESERIES_META_FIELD] = meta
+    return converted
+
+
+def to_timeseries_query(query):
+    """
+    Rewrite a query on log entry fields into the same query on the fields of a time-series collection.
+    """
+    if isinstance(query, list):
+        return [to_timeseries_query(item) for item in query]
+    if not isinstance(query, dict):
+        return query
+    converted = {}
+    for key, value in query.items():
+        if key.startswith('$'):
+            converted[key] = to_timeseries_query(value)
+        else:
+            converted[_timeseries_field(key)] = value
+    return converted
+
+
+def to_timeseries_projection(projection):
+    """
+    Rewrite a projection on log entry fields into one returning log entries shaped like those of a standard
+    collection from a time-series collection. Only exclusions of _id or inclusions are supported.
+    """
+    projection = dict(projection or {})
+    included = [field for field, value in projection.items() if value and field != '_id']
+    if not included:
+        included = [field for field in TIMESERIES_FIELDS if projection.get(field, 1)]
+    converted = {field: f'${_timeseries_field(field)}' if field in TIMESERIES_META_KEYS else 1 for field in included}
+    if '_id' in projection:
+        converted['_id'] = projection['_id']
+    return converted
+
+
+def client_options():
+    """
+    Options of the MongoClient: pool sizing, server monitoring interval and timeouts from config.
+    """
+    return {
+        'maxPoolSize': config.MONGODB_MAX_POOL_SIZE,
+        'minPoolSize': config.MONGODB_MIN_POOL_SIZE,
+        'heartbeatFrequencyMS': config.MONGODB_HEARTBEAT_FREQUENCY_MS,
+        'serverSelectionTimeoutMS': config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        'connectTimeoutMS': config.MONGODB_CONNECT_TIMEOUT_MS,
+        'socketTimeoutMS': config.MONGODB_SOCKET_TIMEOUT_MS
+    }
+
 
 class MongoDBClient:
     """
@@ -16,50 +96,452 @@ class MongoDBClient:
     """
     _instance = None
 
+    # Indexes backing the filters accepted by logs_tool.get_logs. Equality on service (and service + severity) with
+    # datetime ranges uses the compound index, severity alone its own one, message equality, $in and regular
+    # expressions anchored with ^ the ascending message index (a prefix regex is a bounded range of its keys) and
+    # --text searches the text index (without a language, so words are neither stemmed nor dropped as stop words).
+    # background only matters for servers older than 4.2, newer ones always build indexes without blocking.
+    INDEXES = [
+        IndexModel([('datetime', ASCENDING)], name='datetime_1', background=True),
+        IndexModel([('service', ASCENDING), ('severity', ASCENDING), ('datetime', ASCENDING)],
+                   name='service_1_severity_1_datetime_1', background=True),
+        IndexModel([('severity', ASCENDING), ('datetime', ASCENDING)], name='severity_1_datetime_1', background=True),
+        IndexModel([('message', ASCENDING)], name='message_1', background=True),
+        IndexModel([('message', TEXT)], name='message_text', default_language='none', background=True),
+    ]
+    # Indexes declared by earlier versions, dropped together with the declared ones. message_hashed could not serve
+    # regular expressions and was replaced by message_1.
+    REPLACED_INDEXES = ['message_hashed']
+    # Time-series collections keep service and severity in the metaField. Hashed and text indexes are not supported
+    # on them.
+    TIMESERIES_INDEXES = [
+        IndexModel([('datetime', ASCENDING)], name='datetime_1'),
+        IndexModel([('meta.service', ASCENDING), ('meta.severity', ASCENDING), ('datetime', ASCENDING)],
+                   name='meta.service_1_meta.severity_1_datetime_1'),
+        IndexModel([('meta.severity', ASCENDING), ('datetime', ASCENDING)], name='meta.severity_1_datetime_1'),
+    ]
+
     def __new__(cls):
         if cls._instance is None:
             logger.info("Creating the instance")
             cls._instance = super(MongoDBClient, cls).__new__(cls)
             cls._instance.connection = None
+            cls._instance.db = None
+            cls._instance.collections = {}
+            cls._instance.timeseries = None
+            cls._instance._lock = threading.Lock()
         return cls._instance
 
     def connect(self):
-        if self.connection is None or self.connection.admin.command("ping", check=True).get('ok') != 1.0:
-            try:
-                self.connection = MongoClient(config.MONGODB_URI)
-                self.connection.admin.command('ping')
-                logger.info("Connected to database")
-            except Exception as e:
-                logger.error(f"Failed to connect to MongoDB: {e}")
-                self.connection = None
+        """
+        Return the MongoClient, created and checked with a single ping on first use, or None if the server cannot be
+        reached.
+
+        The client is then reused: its connection pool and background server monitoring (every
+        MONGODB_HEARTBEAT_FREQUENCY_MS) replace checking the connection before each operation, and operations
+        failing on a lost connection raise errors that are handled by the callers.
+        """
+        if self.connection is None:
+            with self._lock:
+                if self.connection is None:
+                    connection = None
+                    try:
+                        connection = MongoClient(config.MONGODB_URI, **client_options())
+                        connection.admin.command('ping')
+                        self.connection = connection
+                        logger.info("Connected to database")
+                    except Exception as e:
+                        logger.error(f"Failed to connect to MongoDB: {e}")
+                        # Stop the monitoring threads of the client, the next call creates a new one.
+                        if connection is not None:
+                            connection.close()
         return self.connection
 
-    def insert_data(self, data):
+    def get_database(self):
+        if self.db is None:
+            client = self.connect()
+            if client is None:
+                return None
+            self.db = client[config.DATABASE_NAME]
+        return self.db
+
+    def get_collection(self, name=None):
+        """
+        Return the handle of the collection (the log collection by default), cached after the first call.
+        """
+        name = name or config.COLLECTION_NAME
+        collection = self.collections.get(name)
+        if collection is None:
+            db = self.get_database()
+            if db is None:
+                return None
+            collection = self.collections[name] = db[name]
+        return collection
+
+    def is_timeseries(self):
+        """
+        Whether the log collection is a time-series collection, looked up once per process.
+        """
+        if self.timeseries is None:
+            db = self.get_database()
+            if db is None:
+                return False
+            info = next(db.list_collections(filter={'name': config.COLLECTION_NAME}), None)
+            self.timeseries = info is not None and info.get('type') == 'timeseries'
+        return self.timeseries
+
+    def server_version(self):
+        """
+        (major, minor) version of the MongoDB server, or None if it cannot be read.
+        """
         client = self.connect()
-        if client is not None:
+        if client is None:
+            return None
+        try:
+            return tuple(client.server_info()['versionArray'][:2])
+        except Exception as e:
+            logger.error(f"Failed to read the server version: {e}")
+        return None
+
+    def supports_delete(self):
+        """
+        Whether log entries can be deleted by datetime, which a time-series collection only supports from MongoDB 7.0.
+        Logs an error if they cannot.
+        """
+        if not self.is_timeseries():
+            return True
+        version = self.server_version()
+        if version is None:
+            return False
+        if version < TIMESERIES_DELETE_VERSION:
+            logger.error(f"Deleting entries of a time-series collection by datetime needs MongoDB "
+                         f"{'.'.join(map(str, TIMESERIES_DELETE_VERSION))} or newer, the server runs "
+                         f"{'.'.join(map(str, version))}.")
+            return False
+        return True
+
+    def _create_timeseries_collection(self, db, granularity):
+        db.create_collection(config.COLLECTION_NAME, timeseries={
+            'timeField': TIMESERIES_TIME_FIELD,
+            'metaField': TIMESERIES_META_FIELD,
+            'granularity': granularity
+        })
+        self.timeseries = True
+        logger.info(f"Created the time-series collection {config.COLLECTION_NAME}")
+
+    def ensure_collection(self):
+        """
+        Create the log collection as a time-series collection if COLLECTION_TYPE asks for it and it does not exist.
+        Returns False on failure.
+        """
+        if config.COLLECTION_TYPE != 'timeseries':
+            return True
+        db = self.get_database()
+        if db is not None:
             try:
-                db = client[config.DATABASE_NAME]
-                collection = db[config.COLLECTION_NAME]
-                collection.insert_many(data)
-                logger.info(f"Inserted data successfully")
-                logger.debug(f"Inserted data: {data}")
+                if config.COLLECTION_NAME not in db.list_collection_names():
+                    self._create_timeseries_collection(db, config.TIMESERIES_GRANULARITY)
+                elif not self.is_timeseries():
+                    logger.warning(f"COLLECTION_TYPE is timeseries but {config.COLLECTION_NAME} is a standard "
+                                   f"collection, run the migrate command to convert it.")
+                return True
             except Exception as e:
-                logger.error(f"Failed to insert data: {e}")
+                logger.error(f"Failed to create the collection: {e}")
+        return False
 
-    def find_data(self, key, filter_type, value):
-        client = self.connect()
-        if client is not None:
+    def migrate_to_timeseries(self, granularity=None, batch_size=DEFAULT_CURSOR_BATCH_SIZE):
+        """
+        Convert the log collection into a time-series collection. The standard collection is renamed to
+        <COLLECTION_NAME>_standard and kept as a backup while its documents are copied in batches.
+
+        Returns the number of copied documents, or None on failure.
+        """
+        db = self.get_database()
+        if db is None:
+            return None
+        backup_name = f"{config.COLLECTION_NAME}_standard"
+        try:
+            if self.is_timeseries():
+                logger.info(f"{config.COLLECTION_NAME} is already a time-series collection")
+                return 0
+            names = db.list_collection_names()
+            if backup_name in names:
+                logger.error(f"{backup_name} already exists, drop it or rename it before migrating again.")
+                return None
+            if config.COLLECTION_NAME in names:
+                self.get_collection().rename(backup_name)
+            self._create_timeseries_collection(db, granularity or config.TIMESERIES_GRANULARITY)
+            if config.COLLECTION_NAME not in names:
+                return 0
+
+            copied = 0
+            batch = []
+            collection = self.get_collection()
+            for document in self.get_collection(backup_name).find({}, batch_size=batch_size):
+                batch.append(to_timeseries_document(document))
+                if len(batch) >= batch_size:
+                    copied += len(collection.insert_many(batch, ordered=False).inserted_ids)
+                    batch = []
+            if batch:
+                copied += len(collection.insert_many(batch, ordered=False).inserted_ids)
+            logger.info(f"Copied {copied} documents, the standard collection is kept as {backup_name}")
+            return copied
+        except Exception as e:
+            logger.error(f"Failed to migrate to a time-series collection: {e}")
+        return None
+
+    def get_manifest_entry(self, query):
+        """
+        Return the manifest entry (fingerprint of an added file or chunk) matching the query, or None.
+        """
+        collection = self.get_collection(config.MANIFEST_COLLECTION_NAME)
+        if collection is not None:
             try:
-                db = client[config.DATABASE_NAME]
-                collection = db[config.COLLECTION_NAME]
-                query = {key: {filter_type: value}}
-                if collection.count_documents(query) > 0:
-                    data = collection.find(query)
-                    logger.info(f"Retrieved logs successfully.")
-                    return data
+                return collection.find_one(query)
+            except Exception as e:
+                logger.error(f"Failed to read manifest: {e}")
+        return None
+
+    def save_manifest_entry(self, entry):
+        collection = self.get_collection(config.MANIFEST_COLLECTION_NAME)
+        if collection is not None:
+            try:
+                collection.replace_one({'_id': entry['_id']}, entry, upsert=True)
+                return True
+            except Exception as e:
+                logger.error(f"Failed to save manifest entry: {e}")
+        return False
+
+    def declared_indexes(self):
+        return self.TIMESERIES_INDEXES if self.is_timeseries() else self.INDEXES
+
+    def ensure_indexes(self):
+        """
+        Create the declared indexes that do not exist yet. Returns the names of the indexes, or None on failure.
+        """
+        collection = self.get_collection()
+        if collection is not None:
+            try:
+                names = collection.create_indexes(self.declared_indexes())
+                logger.info(f"Ensured indexes: {', '.join(names)}")
+                return names
+            except Exception as e:
+                logger.error(f"Failed to create indexes: {e}")
+        return None
+
+    def list_indexes(self):
+        collection = self.get_collection()
+        if collection is not None:
+            try:
+                return list(collection.list_indexes())
+            except Exception as e:
+                logger.error(f"Failed to list indexes: {e}")
+        return None
+
+    def drop_indexes(self):
+        """
+        Drop the declared (and replaced) indexes, leaving the _id index and indexes created outside of this class
+        untouched.
+        """
+        collection = self.get_collection()
+        if collection is not None:
+            try:
+                existing = {index['name'] for index in collection.list_indexes()}
+                names = [index.document['name'] for index in self.declared_indexes()] + self.REPLACED_INDEXES
+                dropped = [name for name in names if name in existing]
+                for name in dropped:
+                    collection.drop_index(name)
+                logger.info(f"Dropped indexes: {', '.join(dropped) or 'none'}")
+                return dropped
+            except Exception as e:
+                logger.error(f"Failed to drop indexes: {e}")
+        return None
+
+    def explain_query(self, query, **options):
+        """
+        Return the explain output (query planner and execution stats) of the query run by find_data.
+        """
+        collection = self.get_collection()
+        if collection is not None:
+            try:
+                return self._find_cursor(collection, query, **options).explain()
+            except Exception as e:
+                logger.error(f"Failed to explain query: {e}")
+        return None
+
+    def insert_data(self, data, ordered=True, write_concern=None):
+        """
+        Insert a batch of documents or LogRecords, which are converted to documents here. Returns the number of
+        inserted documents, or None on failure.
+
+        With ordered=False every document is attempted and documents whose _id already exists are skipped, which
+        does not count as a failure. write_concern (a pymongo WriteConcern) overrides the one of the connection.
+        """
+        collection = self.get_collection()
+        if collection is not None:
+            try:
+                if write_concern is not None:
+                    collection = collection.with_options(write_concern=write_concern)
+                if self.is_timeseries():
+                    data = [to_timeseries_document(records.to_document(document)) for document in data]
                 else:
-                    logger.info(f"No logs found that meet the requirements.")
-                    return None
+                    data = [records.to_document(document) for document in data]
+                result = collection.insert_many(data, ordered=ordered)
+                inserted = len(result.inserted_ids)
+                logger.info(f"Inserted {inserted} documents successfully")
+                logger.debug("Inserted data: %s", data)
+                return inserted
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                duplicates_only = not ordered and not e.details.get('writeConcernErrors') and all(
+                    error['code'] == DUPLICATE_KEY_ERROR for error in errors)
+                if duplicates_only:
+                    inserted = e.details['nInserted']
+                    logger.info(f"Inserted {inserted} documents successfully, skipped {len(errors)} duplicates")
+                    return inserted
+                logger.error(f"Failed to insert data: {e}")
+            except Exception as e:
+                logger.error(f"Failed to insert data: {e}")
+        return None
+
+    def _find_cursor(self, collection, query, projection=None, sort=None, skip=0, limit=0, after=None,
+                     batch_size=DEFAULT_CURSOR_BATCH_SIZE):
+        sort = list(sort or [])
+        timeseries = self.is_timeseries()
+        if after is not None:
+            query = {'$and': [query, self._after_clause(collection, sort, after, timeseries)]}
+        # Pages are sorted with _id as the tie breaker, so the first page is in the order the --after condition of
+        # the next ones assumes.
+        if (after is not None or limit) and ('_id', ASCENDING) not in sort:
+            sort.append(('_id', ASCENDING))
+        if timeseries:
+            query = to_timeseries_query(query)
+            projection = to_timeseries_projection(projection)
+            sort = [(_timeseries_field(field), direction) for field, direction in sort]
+        cursor = collection.find(query, projection, skip=skip, limit=limit, batch_size=batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor
+
+    @staticmethod
+    def _after_clause(collection, sort, after, timeseries=False):
+        """
+        Keyset pagination condition selecting the documents following the one with the _id after, in the order of
+        sort (at most one field) with _id as the tie breaker.
+        """
+        if not sort:
+            return {'_id': {'$gt': after}}
+        field, direction = sort[0]
+        anchor = collection.find_one({'_id': after}, to_timeseries_projection({field: 1}) if timeseries else {field: 1})
+        if anchor is None:
+            raise ValueError(f"No log entry with _id {after}.")
+        operator = '$gt' if direction == ASCENDING else '$lt'
+        return {'$or': [
+            {field: {operator: anchor.get(field)}},
+            {field: anchor.get(field), '_id': {'$gt': after}}
+        ]}
+
+    def aggregate_data(self, pipeline, collection_name=None):
+        """
+        Run an aggregation pipeline on the server and return the resulting documents as a list, or None on failure.
+
+        On a time-series log collection a leading $match is rewritten for its fields and the following stages see
+        service and severity as top-level fields, as in a standard collection. collection_name runs the pipeline on
+        another collection, such as the rollup collection.
+        """
+        collection = self.get_collection(collection_name)
+        if collection is not None:
+            try:
+                if collection_name in (None, config.COLLECTION_NAME) and self.is_timeseries():
+                    pipeline = list(pipeline)
+                    match = []
+                    if pipeline and '$match' in pipeline[0]:
+                        match = [{'$match': to_timeseries_query(pipeline.pop(0)['$match'])}]
+                    flatten = {key: f'${_timeseries_field(key)}' for key in TIMESERIES_META_KEYS}
+                    pipeline = match + [{'$set': flatten}] + pipeline
+                return list(collection.aggregate(pipeline, allowDiskUse=True))
+            except Exception as e:
+                logger.error(f"Failed to aggregate data: {e}")
+        return None
+
+    def delete_data(self, query, collection_name=None):
+        """
+        Delete the documents matching the query from the log collection, or from collection_name. Returns the number
+        of deleted documents, or None on failure.
+        """
+        collection = self.get_collection(collection_name)
+        if collection is not None:
+            try:
+                if collection_name in (None, config.COLLECTION_NAME) and self.is_timeseries():
+                    query = to_timeseries_query(query)
+                deleted = collection.delete_many(query).deleted_count
+                logger.info(f"Deleted {deleted} documents from {collection.name}")
+                return deleted
+            except Exception as e:
+                logger.error(f"Failed to delete data: {e}")
+        return None
+
+    def find_data(self, query, **options):
+        """
+        Return a lazy cursor over the documents matching the query, or None on failure.
+
+        The documents are streamed from the server in batches of batch_size while the cursor is iterated. Supported
+        options are projection, sort (list of (field, direction) pairs), skip, limit, after (_id of the last document
+        of the previous page) and batch_size.
+        """
+        collection = self.get_collection()
+        if collection is not None:
+            try:
+                return self._find_cursor(collection, query, **options)
             except Exception as e:
                 logger.error(f"Failed to get data: {e}")
-                return None
+        return None
+
+
+class BulkWriter:
+    """
+    Pool of threads inserting batches of documents with unordered bulk writes, so the caller can keep producing
+    batches while earlier ones are in flight.
+
+    At most max_pending batches are queued or being written, submit blocks when the database falls behind.
+    """
+
+    def __init__(self, mongo_client, writers, max_pending, write_concern=None):
+        self.mongo_client = mongo_client
+        self.write_concern = write_concern
+        self._profiler = profiling.active()
+        self._insert = mongo_client.insert_data
+        if self._profiler is not None:
+            self._insert = self._profiler.wrap('insert', mongo_client.insert_data, count=len)
+        self._executor = ThreadPoolExecutor(max_workers=writers, thread_name_prefix='writer')
+        self._slots = threading.BoundedSemaphore(max(max_pending, writers))
+
+    def submit(self, batch):
+        """
+        Queue the batch for insertion. Returns a future of the number of inserted documents (None on failure).
+        """
+        if not self._slots.acquire(blocking=False):
+            logger.debug("Waiting for the database to catch up with the queued batches")
+            wait_start = time.perf_counter()
+            self._slots.acquire()
+            if self._profiler is not None:
+                self._profiler.record('insert wait', time.perf_counter() - wait_start, 0.0, 1)
+        try:
+            future = self._executor.submit(self._insert, batch, ordered=False, write_concern=self.write_concern)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self):
+        """
+        Wait for the batches being written and drop the queued ones.
+        """
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,13 +1,87 @@
 import argparse
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import glob
+import hashlib
+from itertools import islice
 import logging
+import os
+import re
+import sys
+import time
 
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConfigurationError
+from pymongo.write_concern import WriteConcern
+
+import checkpoints
+import compression
 import config
+import daemon
 import database
+import output
+import profiling
+from records import LogRecord
 
 logging.basicConfig(level=config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_SIZE = 1000
+LOG_FIELDS = ('datetime', 'service', 'severity', 'message')
+FILTER_OPERATORS = ('eq', 'ne', 'lt', 'gt', 'in')
+# Search operators, only valid for the message field.
+SEARCH_OPERATORS = ('contains', 'regex', 'text')
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_STATE_FILE = '.logs_tool_state.json'
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_ROLLUP_BATCH_SIZE = 10000
+DEFAULT_WRITERS = 4
+DEFAULT_QUEUE_SIZE = 8
+STATS_GROUPS = ('service', 'severity', 'message', 'time')
+BUCKET_UNITS = {'s': 'second', 'm': 'minute', 'h': 'hour', 'd': 'day'}
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S,%f'
+
+# (prefix, datetime) of the last second parsed by parse_timestamp, consecutive log lines usually share it.
+_last_second = (None, None)
+
+
+def _parse_second(prefix):
+    if prefix[4] != '-' or prefix[7] != '-' or prefix[10] != ' ' or prefix[13] != ':' or prefix[16] != ':':
+        return None
+    digits = prefix[:4] + prefix[5:7] + prefix[8:10] + prefix[11:13] + prefix[14:16] + prefix[17:19]
+    if not (digits.isascii() and digits.isdigit()):
+        return None
+    try:
+        return datetime(int(prefix[:4]), int(prefix[5:7]), int(prefix[8:10]),
+                        int(prefix[11:13]), int(prefix[14:16]), int(prefix[17:19]))
+    except ValueError:
+        return None
+
+
+def parse_timestamp(timestamp_str):
+    """
+    Parse a 'YYYY-MM-DD HH:MM:SS,mmm' timestamp into a datetime.
+
+    Fixed-width input is sliced into integers directly and the datetime of the previous second is reused when
+    consecutive timestamps share it. Any other input falls back to datetime.strptime, which raises ValueError
+    for invalid timestamps.
+    """
+    global _last_second
+    fraction = timestamp_str[20:]
+    if len(timestamp_str) == 23 and timestamp_str[19] == ',' and fraction.isascii() and fraction.isdigit():
+        prefix = timestamp_str[:19]
+        cached_prefix, second = _last_second
+        if prefix != cached_prefix:
+            second = _parse_second(prefix)
+            if second is not None:
+                _last_second = (prefix, second)
+        if second is not None:
+            return second.replace(microsecond=int(fraction) * 1000)
+    return datetime.strptime(timestamp_str, TIMESTAMP_FORMAT)
+
 
 def parse_log_line(line):
     split_signs = ' - '
@@ -24,75 +98,432 @@ def parse_log_line(line):
     timestamp_str, service, level, message = parts
 
     try:
-        timestamp = datetime.strptime(timestamp_str.strip(), '%Y-%m-%d %H:%M:%S,%f')
+        timestamp = parse_timestamp(timestamp_str.strip())
     except ValueError as ve:
         raise ValueError("Timestamp format is incorrect: {}".format(timestamp_str)) from ve
 
-    return {
-        'datetime': timestamp,
-        'service': service.strip(),
-        'severity': level.strip(),
-        'message': message.strip()
-    }
+    return LogRecord(timestamp, service.strip(), level.strip(), message.strip())
+
+
+def iter_log_entries(lines):
+    """
+    Lazily parse log lines, yielding one log entry per non-empty line.
+
+    Raises ValueError annotated with the line number on the first malformed line.
+    """
+    for i, line in enumerate(lines, start=1):
+        if line.strip():
+            try:
+                yield parse_log_line(line)
+            except ValueError as e:
+                raise ValueError(f'Error parsing line {i}: {e}') from e
 
 
 def parse_log_file(file_content):
-    logs = []
-    for i, line in enumerate(file_content, start=1):
+    try:
+        return list(iter_log_entries(file_content))
+    except ValueError as e:
+        logger.error(e)
+        return None
+
+
+def batch_logs(log_entries, batch_size):
+    """
+    Group an iterable of log entries into lists of at most batch_size entries.
+    """
+    iterator = iter(log_entries)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def expand_log_paths(patterns):
+    """
+    Expand glob patterns into a sorted list of paths. Patterns without matches are kept as literal paths so that
+    reading them reports the error.
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches if matches else [pattern])
+    return paths
+
+
+def content_id(log_entry, position):
+    """
+    Deterministic _id of a parsed log entry (LogRecord) derived from its content and the byte position of its line in
+    the (decompressed) file, so adding the same line twice is detected by the database as a duplicate key while
+    repeated lines of a file are all kept. The position does not depend on the chunk size or on incremental mode, and
+    stays the same when the file is rotated or compressed. The id is stored as an ObjectId built from a 12 byte hash,
+    so it has the type and size of the ids generated by the driver.
+    """
+    content = '\x1f'.join([log_entry.datetime.isoformat(), log_entry.service, log_entry.severity,
+                            log_entry.message, str(position)])
+    return ObjectId(hashlib.blake2b(content.encode('utf-8'), digest_size=12).digest())
+
+
+def iter_log_chunks(file, chunk_size):
+    """
+    Yield (offset, data) chunks of the open binary file, each holding chunk_size bytes extended to the end of the
+    line, so the same content always splits into the same chunks.
+    """
+    offset = 0
+    while True:
+        data = file.read(chunk_size)
+        if not data:
+            return
+        if not data.endswith(b'\n'):
+            data += file.readline()
+        yield offset, data
+        offset += len(data)
+
+
+def iter_chunk_entries(file_path, offset, data):
+    """
+    Lazily parse the lines of a chunk starting at offset in the file into log entries with content ids.
+    """
+    position = offset
+    for line in data.splitlines(keepends=True):
         if line.strip():
             try:
-                parsed_line = parse_log_line(line)
-                logs.append(parsed_line)
+                log_entry = parse_log_line(line.decode('utf-8'))
             except ValueError as e:
-                logger.error(f'Error parsing line {i}: {e}')
+                raise ValueError(f"{file_path}: Error parsing line at byte {position}: {e}") from e
+            log_entry._id = content_id(log_entry, position)
+            yield log_entry
+        position += len(line)
+
+
+def parse_log_chunk(file_path, offset, data):
+    return list(iter_chunk_entries(file_path, offset, data))
+
+
+def iter_parsed_chunks(file_path, file, args, mongo_client, executor=None, file_hash=None):
+    """
+    Yield (offset, fingerprint, log entries) for the chunks of the open binary file, with None instead of the entries
+    for chunks whose fingerprint is already in the manifest. The chunks are also fed to file_hash, if given.
+
+    Without an executor the chunks are parsed lazily in this process, otherwise in the process pool with at most two
+    chunks per worker in flight, so memory stays bounded when inserting is slower than parsing.
+    """
+    pending = deque()
+    chunks = iter_log_chunks(file, args.chunk_size)
+    profiler = profiling.active()
+    if profiler is not None:
+        chunks = profiler.timed_iter('read', chunks, size=lambda chunk: len(chunk[1]))
+    for offset, data in chunks:
+        if file_hash is not None:
+            file_hash.update(data)
+        # The offset is part of the fingerprint, so a chunk repeating an earlier one is not taken as already added.
+        fingerprint = hashlib.sha256(f'{offset}:'.encode('ascii') + data).hexdigest()
+        if mongo_client.get_manifest_entry({'_id': fingerprint}) is not None:
+            yield offset, fingerprint, None
+        elif executor is None:
+            yield offset, fingerprint, iter_chunk_entries(file_path, offset, data)
+        else:
+            pending.append((offset, fingerprint, executor.submit(parse_log_chunk, file_path, offset, data)))
+            if len(pending) >= args.workers * 2:
+                offset, fingerprint, future = pending.popleft()
+                yield offset, fingerprint, future.result()
+    while pending:
+        offset, fingerprint, future = pending.popleft()
+        yield offset, fingerprint, future.result()
+
+
+def record_written_chunks(pending_chunks, key, mongo_client, wait=False):
+    """
+    Record in the manifest the chunks at the front of pending_chunks whose batches were all written, in file order.
+    With wait, block until every pending chunk is written.
+
+    Returns the number of inserted log entries of the recorded chunks, or None if one of their batches failed.
+    """
+    inserted = 0
+    while pending_chunks:
+        offset, fingerprint, entries_count, futures = pending_chunks[0]
+        if not wait and not all(future.done() for future in futures):
+            break
+        results = [future.result() for future in futures]
+        if None in results:
+            return None
+        pending_chunks.popleft()
+        inserted += sum(results)
+        mongo_client.save_manifest_entry({'_id': fingerprint, 'type': 'chunk', 'path': key, 'offset': offset,
+                                          'entries': entries_count})
+    return inserted
+
+
+def widen_time_range(time_range, log_entries):
+    """
+    Widen the [first, last] datetime range in place to include the log entries.
+    """
+    first = min(log_entry.datetime for log_entry in log_entries)
+    last = max(log_entry.datetime for log_entry in log_entries)
+    if time_range[0] is None or first < time_range[0]:
+        time_range[0] = first
+    if time_range[1] is None or last > time_range[1]:
+        time_range[1] = last
+
+
+def add_log_file(file_path, args, mongo_client, writer, executor=None, time_range=None):
+    """
+    Insert the log entries of the file, skipping it when it is unchanged since it was added and skipping the chunks
+    recorded in the manifest. Every chunk is recorded once all its entries are inserted, and the whole file after
+    its last chunk. Compressed files are decompressed while they are read and '-' reads stdin, which is only
+    deduplicated by chunk.
+
+    Batches are handed to the writer (a database.BulkWriter), so the next chunk is parsed while the previous ones
+    are being inserted. time_range, if given, is widened to the datetimes of the submitted entries.
+
+    Returns the number of inserted log entries, or None if a batch could not be inserted.
+    """
+    file_entry = None
+    if file_path == compression.STDIN_PATH:
+        key = file_path
+    else:
+        key = os.path.abspath(file_path)
+        file_stat = os.stat(file_path)
+        file_entry = {'type': 'file', 'path': key, 'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns,
+                      'chunk_size': args.chunk_size}
+        if mongo_client.get_manifest_entry(file_entry) is not None:
+            logger.info(f"{file_path} was already added, skipping it.")
+            return 0
+
+    inserted = 0
+    skipped_chunks = 0
+    pending_chunks = deque()
+    file_hash = hashlib.sha256()
+    profiler = profiling.active()
+    with compression.open_log_file(file_path) as file:
+        parsed_chunks = iter_parsed_chunks(file_path, file, args, mongo_client, executor, file_hash)
+        for offset, fingerprint, log_entries in parsed_chunks:
+            if log_entries is None:
+                skipped_chunks += 1
+                continue
+            futures = []
+            entries_count = 0
+            batches = batch_logs(log_entries, args.batch_size)
+            if profiler is not None:
+                batches = profiler.timed_iter('parse', batches, count=len)
+            for batch in batches:
+                if time_range is not None:
+                    widen_time_range(time_range, batch)
+                futures.append(writer.submit(batch))
+                entries_count += len(batch)
+            pending_chunks.append((offset, fingerprint, entries_count, futures))
+            chunks_inserted = record_written_chunks(pending_chunks, key, mongo_client)
+            if chunks_inserted is None:
                 return None
+            inserted += chunks_inserted
+
+    chunks_inserted = record_written_chunks(pending_chunks, key, mongo_client, wait=True)
+    if chunks_inserted is None:
+        return None
+    inserted += chunks_inserted
+    if skipped_chunks:
+        logger.info(f"Skipped {skipped_chunks} chunk(s) of {file_path} that were already added.")
+    if file_entry is not None:
+        mongo_client.save_manifest_entry({'_id': f"file:{file_hash.hexdigest()}", **file_entry})
+    return inserted
 
-    return logs
 
+def iter_new_log_lines(file, offset):
+    """
+    Yield (line, end_offset) for the complete lines of the open binary file after offset.
+
+    A trailing line without a newline is still being written and is left for the next run.
+    """
+    file.seek(offset)
+    for line in file:
+        if not line.endswith(b'\n'):
+            return
+        offset += len(line)
+        yield line, offset
+
+
+def add_new_logs(file_path, state, args, mongo_client, time_range=None):
+    """
+    Insert the lines appended to the file since its checkpoint in state, saving the checkpoint after every batch.
+    time_range, if given, is widened to the datetimes of the inserted entries.
+
+    Returns the number of inserted log entries, or None if a batch could not be inserted.
+    """
+    key = os.path.abspath(file_path)
+    inserted = 0
+    with open(file_path, 'rb') as file:
+        if compression.detect_compression(file.read(compression.HEADER_SIZE)):
+            raise ValueError(f"{file_path} is compressed, compressed files cannot be added incrementally.")
+        offset = checkpoints.resume_offset(file, checkpoints.find_checkpoint(state, key, file))
+        for batch in batch_logs(iter_new_log_lines(file, offset), args.batch_size):
+            entries = []
+            for line, end_offset in batch:
+                if line.strip():
+                    position = end_offset - len(line)
+                    try:
+                        log_entry = parse_log_line(line.decode('utf-8'))
+                    except ValueError as e:
+                        raise ValueError(f"{file_path}: Error parsing line at byte {position}: {e}") from e
+                    log_entry._id = content_id(log_entry, position)
+                    entries.append(log_entry)
+            if entries and time_range is not None:
+                widen_time_range(time_range, entries)
+            if entries and mongo_client.insert_data(entries, ordered=False) is None:
+                return None
+            last_line, offset = batch[-1]
+            state[key] = checkpoints.make_checkpoint(file, offset, last_line)
+            checkpoints.save_state(args.state_file, state)
+            inserted += len(entries)
+    return inserted
+
+
+def add_logs_incrementally(args):
+    if compression.STDIN_PATH in args.file:
+        logger.error("Stdin cannot be added incrementally.")
+        return
+    if args.workers > 1:
+        logger.warning("--workers is ignored in incremental mode.")
+
+    mongo_client = database.MongoDBClient()
+    mongo_client.ensure_collection()
+    mongo_client.ensure_indexes()
+    state = checkpoints.load_state(args.state_file)
+    while True:
+        time_range = [None, None] if daemon.is_running(config.SOCKET_PATH) else None
+        try:
+            if not add_new_log_files(args, state, mongo_client, time_range):
+                return
+        finally:
+            invalidate_cached_results(time_range)
+
+        if not args.follow:
+            return
+        try:
+            time.sleep(args.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Stopped following log files.")
+            return
+
+
+def add_new_log_files(args, state, mongo_client, time_range=None):
+    """
+    Insert the new lines of every file once. Returns False if adding them failed.
+    """
+    for path in expand_log_paths(args.file):
+        try:
+            inserted = add_new_logs(path, state, args, mongo_client, time_range)
+        except FileNotFoundError:
+            if args.follow:
+                logger.debug(f"The file at {path} does not exist yet.")
+                continue
+            logger.error(f"The file at {path} does not exist.")
+            return False
+        except (ValueError, OSError) as e:
+            logger.error(e)
+            return False
+        if inserted is None:
+            logger.error(f"Failed to insert batch from {path}, it will be resumed from its last checkpoint.")
+            return False
+        if inserted:
+            logger.info(f"Inserted {inserted} new log entries from {path}.")
+        else:
+            logger.debug(f"No new log entries in {path}.")
+    return True
 
-def read_log_file(file_path):
+
+def invalidate_cached_results(time_range):
+    """
+    Drop the results cached by the query daemon that depend on the [first, last] datetime range, if any entries were
+    added in it.
+    """
+    if time_range is not None and time_range[0] is not None:
+        daemon.invalidate(time_range[0], time_range[1], config.SOCKET_PATH)
+
+
+def add_logs(args):
+    if args.incremental or args.follow:
+        add_logs_incrementally(args)
+        return
+
+    paths = expand_log_paths(args.file)
+    mongo_client = database.MongoDBClient()
+    mongo_client.ensure_collection()
+    mongo_client.ensure_indexes()
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    writer = database.BulkWriter(mongo_client, args.writers, args.writers + args.queue_size, args.write_concern)
+    # Only track the datetimes of the added entries when a query daemon has results to invalidate.
+    time_range = [None, None] if daemon.is_running(config.SOCKET_PATH) else None
+    inserted = 0
     try:
-        with open(file_path, 'r') as file:
-            file_content = file.readlines()
-        return file_content
+        for path in paths:
+            file_inserted = add_log_file(path, args, mongo_client, writer, executor, time_range)
+            if file_inserted is None:
+                logger.error(f"Failed to insert batch from {path}, aborting after {inserted} log entries. Run the "
+                             f"command again to add the rest, entries that were already added are skipped.")
+                return
+            inserted += file_inserted
     except FileNotFoundError:
-        logger.error(f"The file at {file_path} does not exist.")
-        return None
+        logger.error(f"The file at {path} does not exist.")
+        return
     except PermissionError:
-        logger.error(f"Permission denied when trying to read {file_path}.")
-        return None
-    except Exception as e:
-        logger.error(f"An error occurred: {e}")
-        return None
-
+        logger.error(f"Permission denied when trying to read {path}.")
+        return
+    except (ValueError, OSError) as e:
+        logger.error(e)
+        logger.error(f"Failed to add log files, {inserted} log entries were inserted before the error.")
+        return
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        invalidate_cached_results(time_range)
 
-def add_logs(args):
-    log_file_content = read_log_file(args.file)
-    if log_file_content:
-        parsed_logs = parse_log_file(log_file_content)
-        if parsed_logs:
-            mongo_client = database.MongoDBClient()
-            mongo_client.insert_data(parsed_logs)
-        else:
-            logger.error("Failed to parse log file.")
+    if inserted:
+        logger.info(f"Inserted {inserted} log entries from {len(paths)} file(s).")
+    else:
+        logger.warning("No new log entries found in the files.")
 
 
-def format_log_entry(log_entry):
+def write_concern(value):
+    """
+    Build the WriteConcern of a --write-concern value: a number of nodes, 'majority' or a tag set name, optionally
+    followed by ',j' to also wait for the journal.
+    """
+    w, _, journal = value.partition(',')
+    if not w or journal not in ('', 'j'):
+        raise argparse.ArgumentTypeError(f"{value} is not a write concern, expected w or w,j (e.g. 1 or majority,j)")
     try:
-        dt = log_entry['datetime']
-        if not isinstance(dt, datetime):
-            logging.error("Datetime value is not a datetime object")
-            return None
+        return WriteConcern(w=int(w) if w.isdigit() else w, j=True if journal else None)
+    except ConfigurationError as e:
+        raise argparse.ArgumentTypeError(f"{value} is not a valid write concern: {e}")
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
 
-        formatted_dt = dt.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+def non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a non-negative integer")
+    return number
 
-        service = log_entry['service']
-        severity = log_entry['severity']
-        message = log_entry['message']
 
-        formatted_log = f"{formatted_dt} - {service} - {severity} - {message}"
-        logging.debug("Log entry formatted successfully")
-        return formatted_log
+def format_log_entry(log_entry, fields=LOG_FIELDS):
+    try:
+        parts = []
+        for field in fields:
+            value = log_entry[field]
+            if field == 'datetime':
+                if not isinstance(value, datetime):
+                    logging.error("Datetime value is not a datetime object")
+                    return None
+                value = output.format_timestamp(value)
+            parts.append(str(value))
+        return ' - '.join(parts)
     except KeyError as e:
         logging.error(f"Missing key in log entry: {e}")
         return None
@@ -101,96 +532,863 @@ def format_log_entry(log_entry):
         return None
 
 
+def build_find_options(args):
+    """
+    Translate the paging, sorting and projection arguments of get into find_data options.
+    """
+    options = {'skip': args.skip, 'limit': args.limit or 0, 'batch_size': args.batch_size}
+    if args.fields:
+        options['projection'] = {field: 1 for field in args.fields}
+    if args.sort:
+        options['sort'] = [(args.sort, DESCENDING if args.desc else ASCENDING)]
+    if args.after:
+        try:
+            options['after'] = ObjectId(args.after)
+        except InvalidId:
+            raise ValueError(f"'{args.after}' is not a valid log entry id.")
+    return options
+
+
+def describe_plan(stage):
+    """
+    Render a winning plan as a chain of stages, e.g. 'FETCH <- IXSCAN (datetime_1)'.
+    """
+    description = stage['stage']
+    if 'indexName' in stage:
+        description += f" ({stage['indexName']})"
+    inputs = [stage['inputStage']] if 'inputStage' in stage else stage.get('inputStages', [])
+    if len(inputs) == 1:
+        return f"{description} <- {describe_plan(inputs[0])}"
+    if inputs:
+        return f"{description} <- [{', '.join(describe_plan(input_stage) for input_stage in inputs)}]"
+    return description
+
+
+def format_explain(explain):
+    winning_plan = explain['queryPlanner']['winningPlan']
+    # Servers using the slot based execution engine nest the plan under 'queryPlan'.
+    winning_plan = winning_plan.get('queryPlan', winning_plan)
+    stats = explain.get('executionStats', {})
+    return '\n'.join([
+        f"Winning plan: {describe_plan(winning_plan)}",
+        f"Documents returned: {stats.get('nReturned', 'n/a')}",
+        f"Keys examined: {stats.get('totalKeysExamined', 'n/a')}",
+        f"Documents examined: {stats.get('totalDocsExamined', 'n/a')}",
+        f"Execution time: {stats.get('executionTimeMillis', 'n/a')} ms"
+    ])
+
+
+def manage_indexes(args):
+    mongo_client = database.MongoDBClient()
+    if args.action == 'build':
+        mongo_client.ensure_indexes()
+    elif args.action == 'drop':
+        mongo_client.drop_indexes()
+    else:
+        indexes = mongo_client.list_indexes()
+        if indexes is not None:
+            for index in indexes:
+                keys = ', '.join(f"{field}: {direction}" for field, direction in index['key'].items())
+                print(f"{index['name']}: {{{keys}}}")
+
+
+def migrate_collection(args):
+    mongo_client = database.MongoDBClient()
+    copied = mongo_client.migrate_to_timeseries(args.granularity, args.batch_size)
+    if copied is None:
+        return
+    mongo_client.ensure_indexes()
+    daemon.invalidate(None, None, config.SOCKET_PATH)
+    logger.info(f"Migrated {copied} log entries to the time-series collection {config.COLLECTION_NAME}.")
+
+
+def parse_filter_value(field, value):
+    if field == 'datetime':
+        return parse_timestamp(value)
+    return value
+
+
+def collect_filters(args, required=True):
+    """
+    Gather the (field, operator, values) filters given with --where and with --field and its operator options.
+    """
+    filters = []
+    for where in args.where or []:
+        if len(where) < 3:
+            raise ValueError(f"--where expects FIELD OPERATOR VALUE, got: {' '.join(where)}.")
+        filters.append((where[0], where[1], where[2:]))
+    field_filters = [(operator, getattr(args, operator)) for operator in FILTER_OPERATORS
+                     if getattr(args, operator) is not None]
+    if field_filters:
+        if args.field is None:
+            raise ValueError("--field is required with --eq, --ne, --lt, --gt and --in.")
+        filters.extend((args.field, operator, values if operator == 'in' else [values])
+                       for operator, values in field_filters)
+    elif args.field is not None:
+        raise ValueError("No filter option specified for --field. You must specify one of --eq, --ne, --lt, --gt, "
+                         "--in.")
+    filters.extend(('message', operator, [getattr(args, operator)]) for operator in SEARCH_OPERATORS
+                   if getattr(args, operator, None) is not None)
+    if required and not filters:
+        raise ValueError("No filter specified. Use --field with one of --eq, --ne, --lt, --gt, --in, --where, "
+                         "--contains, --regex or --text.")
+    return filters
+
+
+def build_search_condition(operator, value):
+    """
+    Translate a message search into a query condition: a substring or a regular expression (both as $regex), or a
+    full-text search of the words in value (backed by the text index). Only regular expressions starting with ^ and
+    a literal prefix use the message index, substrings and other expressions scan the messages.
+    """
+    if operator == 'text':
+        return '$text', {'$search': value}
+    if operator == 'contains':
+        return '$regex', re.escape(value)
+    try:
+        re.compile(value)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression '{value}': {e}.")
+    return '$regex', value
+
+
+def build_query(filters):
+    """
+    Compile (field, operator, values) filters into a single MongoDB query, e.g. the filters
+    [('service', 'eq', ['api']), ('datetime', 'gt', [...]), ('datetime', 'lt', [...])] become
+    {'service': {'$eq': 'api'}, 'datetime': {'$gt': ..., '$lt': ...}}. Only the 'in' operator takes several values.
+
+    Raises ValueError for unknown fields or operators, comparisons on other fields than datetime, searches on other
+    fields than message, an operator repeated on the same field and invalid values.
+    """
+    query = {}
+    for field, operator, values in filters:
+        if field not in LOG_FIELDS:
+            raise ValueError(f"The field '{field}' is not allowed. Allowed fields are: {', '.join(LOG_FIELDS)}.")
+        if operator not in FILTER_OPERATORS + SEARCH_OPERATORS:
+            raise ValueError(f"The operator '{operator}' is not allowed. Allowed operators are: "
+                             f"{', '.join(FILTER_OPERATORS + SEARCH_OPERATORS)}.")
+        if operator in ('lt', 'gt') and field != 'datetime':
+            raise ValueError("'lt' and 'gt' filters can only be used with the 'datetime' field.")
+
+        if operator in SEARCH_OPERATORS:
+            if field != 'message':
+                raise ValueError(f"'{operator}' filters can only be used with the 'message' field.")
+            if len(values) != 1:
+                raise ValueError(f"The '{operator}' filter takes exactly one value, got: {', '.join(values)}.")
+            key, condition = build_search_condition(operator, values[0])
+            conditions = query if operator == 'text' else query.setdefault(field, {})
+            if key in conditions:
+                raise ValueError("Only one text search and one of 'contains' and 'regex' can be used.")
+            conditions[key] = condition
+            continue
+
+        conditions = query.setdefault(field, {})
+        if f'${operator}' in conditions:
+            raise ValueError(f"The '{operator}' filter is specified more than once for the field '{field}'.")
+        if operator == 'in':
+            conditions['$in'] = [parse_filter_value(field, value) for value in values]
+        elif len(values) == 1:
+            conditions[f'${operator}'] = parse_filter_value(field, values[0])
+        else:
+            raise ValueError(f"The '{operator}' filter takes exactly one value, got: {', '.join(values)}.")
+    logger.debug(f"Built query: {query}")
+    return query
+
+
+def get_logs_from_snapshot(args, query):
+    """
+    Answer a get query from a local snapshot written by export-snapshot instead of the database.
+    """
+    # numpy is only needed for snapshots, so it is not imported for the other commands.
+    import snapshot
+
+    if args.after or args.explain:
+        logger.error("Error: --after and --explain are not supported with --from-snapshot.")
+        return
+    try:
+        local_snapshot = snapshot.Snapshot(args.from_snapshot)
+        indices = local_snapshot.select(query)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to query snapshot {args.from_snapshot}: {e}")
+        return
+    if args.sort:
+        indices = local_snapshot.sort(indices, args.sort, args.desc)
+    indices = indices[args.skip:args.skip + args.limit if args.limit else None]
+
+    fields = [field for field in LOG_FIELDS if field in args.fields] if args.fields else LOG_FIELDS
+    count, _ = output.write_log_entries(local_snapshot.rows(indices, fields), sys.stdout, fields, args.format)
+    if count == 0:
+        logger.warning(f"No logs found that meet the requirements")
+
+
+def export_snapshot(args):
+    import snapshot
+
+    try:
+        query = build_query(collect_filters(args, required=False))
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+        return
+
+    mongo_client = database.MongoDBClient()
+    data = mongo_client.find_data(query, projection={'_id': 0}, sort=[('datetime', ASCENDING)],
+                                  batch_size=args.batch_size)
+    if data is None:
+        return
+    try:
+        count = snapshot.export_snapshot(data, args.output, query)
+    except Exception as e:
+        logger.error(f"Failed to export snapshot: {e}")
+        return
+    logger.info(f"Exported {count} log entries to {args.output}.")
+
+
 def get_logs(args):
-    allowed_fields = {'message', 'severity', 'service', 'datetime'}
+    try:
+        query = build_query(collect_filters(args))
+        options = build_find_options(args)
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+        return
 
-    if args.field not in allowed_fields:
-        logger.error(f"The field '{args.field}' is not allowed. Allowed fields are: {', '.join(allowed_fields)}.")
+    if args.from_snapshot:
+        get_logs_from_snapshot(args, query)
         return
 
-    if args.field != 'datetime' and (args.lt is not None or args.gt is not None):
-        logger.error("'--lt' and '--gt' filters can only be used with the 'datetime' field.")
+    try:
+        mongo_client = database.MongoDBClient()
+        if args.explain:
+            explain = mongo_client.explain_query(query, **options)
+            if explain is not None:
+                print(format_explain(explain))
+            return
+
+        data = mongo_client.find_data(query, **options)
+        if data is None:
+            return
+        fields = [field for field in LOG_FIELDS if field in args.fields] if args.fields else LOG_FIELDS
+        profiler = profiling.active()
+        if profiler is None:
+            count, last_entry = output.write_log_entries(data, sys.stdout, fields, args.format)
+        else:
+            with profiler.stage('format/print', exclude=['fetch']) as stage:
+                data = profiler.timed_iter('fetch', data)
+                count, last_entry = output.write_log_entries(data, sys.stdout, fields, args.format)
+                stage['count'] = count
+        if count == 0:
+            logger.warning(f"No logs found that meet the requirements")
+        elif args.limit and count == args.limit:
+            logger.info(f"Retrieved {count} logs, to get the next page use --after {last_entry.get('_id')}")
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+
+
+def parse_bucket(value):
+    """
+    Parse a bucket length such as '5m' into the (unit, bin size) pair used by $dateTrunc.
+    """
+    number, suffix = value[:-1], value[-1:]
+    if suffix not in BUCKET_UNITS or not number.isdigit() or int(number) < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a valid bucket, expected e.g. 30s, 5m, 1h or 1d")
+    return BUCKET_UNITS[suffix], int(number)
+
+
+def build_stats_pipeline(query, group_by, bucket=('hour', 1), top=None, summed_field=None):
+    """
+    Build the aggregation pipeline counting the log entries matching the query per group_by key.
+
+    Groups are sorted by their keys (time buckets chronologically), or by descending count when only the top groups
+    are requested. With summed_field the counts of the matching documents (e.g. rollup summaries) are summed instead
+    of counting the documents.
+    """
+    group_id = {}
+    for key in group_by:
+        if key == 'time':
+            unit, bin_size = bucket
+            group_id['time'] = {'$dateTrunc': {'date': '$datetime', 'unit': unit, 'binSize': bin_size}}
+        else:
+            group_id[key] = f'${key}'
+
+    pipeline = []
+    if query:
+        pipeline.append({'$match': query})
+    pipeline.append({'$group': {'_id': group_id, 'count': {'$sum': f'${summed_field}' if summed_field else 1}}})
+    if top:
+        pipeline.append({'$sort': {'count': -1}})
+        pipeline.append({'$limit': top})
+    else:
+        pipeline.append({'$sort': {f'_id.{key}': 1 for key in group_by}})
+    return pipeline
+
+
+def get_stats(args):
+    try:
+        query = build_query(collect_filters(args, required=False))
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+        return
+
+    group_by = list(dict.fromkeys(args.by))
+    collection_name = None
+    summed_field = None
+    if getattr(args, 'from_rollup', False):
+        if 'message' in group_by or 'message' in query or '$text' in query:
+            logger.error("Error: Rollups do not keep messages, they cannot be grouped or filtered by message.")
+            return
+        if 'time' in group_by and args.bucket[0] in ('second', 'minute'):
+            logger.error("Error: Rollups are hourly, use a bucket of at least 1h.")
+            return
+        collection_name = config.ROLLUP_COLLECTION_NAME
+        summed_field = 'count'
+    pipeline = build_stats_pipeline(query, group_by, args.bucket, args.top, summed_field)
+    mongo_client = database.MongoDBClient()
+    profiler = profiling.active()
+    if profiler is None:
+        results = mongo_client.aggregate_data(pipeline, collection_name)
+    else:
+        with profiler.stage('aggregate'):
+            results = mongo_client.aggregate_data(pipeline, collection_name)
+    if results is None:
+        return
+    try:
+        rows = [[group['_id'].get(key) for key in group_by] + [group['count']] for group in results]
+    except Exception as e:
+        logger.error(f"Failed to get stats: {e}")
+        return
+    if not rows:
+        logger.warning("No logs found that meet the requirements")
         return
+    output.write_table(rows, group_by + ['count'], sys.stdout)
 
-    filters = {
-        '$eq': args.eq,
-        '$ne': args.ne,
-        '$lt': args.lt,
-        '$gt': args.gt
-    }
 
-    set_filters = {key: val for key, val in filters.items() if val is not None}
-    count = len(set_filters)
+def parse_age(value):
+    """
+    Parse an age such as '12h' or '30d' into a timedelta.
+    """
+    try:
+        unit, number = parse_bucket(value)
+    except argparse.ArgumentTypeError:
+        raise argparse.ArgumentTypeError(f"{value} is not a valid age, expected e.g. 12h, 7d or 90d") from None
+    return timedelta(**{f'{unit}s': number})
+
+
+def build_rollup_pipeline(query, rollup_collection):
+    """
+    Build the aggregation pipeline adding the log entries matching the query to their hourly per service and
+    severity summaries in rollup_collection: number of entries, first and last datetime.
+
+    The summary of an hour that was already rolled up is added to, so entries added late are not lost.
+    """
+    hour = {'$dateTrunc': {'date': '$datetime', 'unit': 'hour'}}
+    return [
+        {'$match': query},
+        {'$group': {
+            '_id': {'service': '$service', 'severity': '$severity', 'datetime': hour},
+            'count': {'$sum': 1},
+            'first': {'$min': '$datetime'},
+            'last': {'$max': '$datetime'}
+        }},
+        {'$set': {'service': '$_id.service', 'severity': '$_id.severity', 'datetime': '$_id.datetime'}},
+        {'$merge': {
+            'into': rollup_collection,
+            'on': '_id',
+            'whenMatched': [{'$set': {
+                'count': {'$add': ['$count', '$$new.count']},
+                'first': {'$min': ['$first', '$$new.first']},
+                'last': {'$max': ['$last', '$$new.last']}
+            }}],
+            'whenNotMatched': 'insert'
+        }}
+    ]
 
-    if count == 1:
-        filter_type, filter_value = next(iter(set_filters.items()))
+
+def rollup_logs(args):
+    """
+    Compact the log entries older than args.older_than, rounded down to the hour, into hourly summaries and delete
+    them from the log collection.
+
+    The entries are rolled up by batches of args.batch_size _ids, and only the entries of a batch are deleted, so
+    entries older than the cutoff that are added while the rollup runs are never deleted without being counted. The
+    summaries of a batch are written before its entries are deleted, so a failed deletion never loses counts, but the
+    entries left behind would be counted again by the next rollup.
+    """
+    cutoff = (datetime.now() - args.older_than).replace(minute=0, second=0, microsecond=0)
+    query = {'datetime': {'$lt': cutoff}}
+    mongo_client = database.MongoDBClient()
+    # Checked before the summaries are written, entries that cannot be deleted would be counted twice.
+    if not mongo_client.supports_delete():
+        return
+    rolled_up = 0
+    while True:
+        cursor = mongo_client.find_data(query, projection={'datetime': 1}, limit=args.batch_size)
+        if cursor is None:
+            break
         try:
-            if args.field == 'datetime':
-                filter_value = datetime.strptime(filter_value, '%Y-%m-%d %H:%M:%S,%f')
-                logger.debug(f"Formated datetime:{filter_value}")
-
-            mongo_client = database.MongoDBClient()
-            data = mongo_client.find_data(args.field, filter_type, filter_value)
-            if data:
-                for x in data:
-                    print(format_log_entry(x))
-            else:
-                logger.warning(f"No logs found that meet the requirements")
-        except datetime.strptime as e:
-            logger.error(f"Invalid date format. {e}")
+            ids = [log_entry['_id'] for log_entry in cursor]
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-    else:
-        if count == 0:
-            logger.error("Error: No filter option specified. You must specify one of --eq, --ne, --lt, --gt.")
-        else:
-            logger.error("Error: Multiple filter options specified. You must specify exactly one of --eq, --ne, --lt, "
-                         "--gt.")
+            logger.error(f"Failed to get the log entries to roll up: {e}")
+            break
+        if not ids:
+            break
+        # The datetime condition is kept, it lets a time-series collection skip the buckets of newer entries.
+        batch_query = dict(query, _id={'$in': ids})
+        if mongo_client.aggregate_data(build_rollup_pipeline(batch_query, config.ROLLUP_COLLECTION_NAME)) is None:
+            break
+        deleted = mongo_client.delete_data(batch_query)
+        if deleted is None:
+            logger.error(f"Failed to delete the rolled up log entries older than {cutoff}, delete them before the "
+                         f"next rollup (prune --older-than) or they are counted twice.")
+            break
+        rolled_up += deleted
+        # Nothing left of the batch, e.g. pruned meanwhile: stop rather than risk looping on the same entries.
+        if not deleted:
+            break
+    if rolled_up:
+        daemon.invalidate(None, cutoff, config.SOCKET_PATH)
+    logger.info(f"Rolled up {rolled_up} log entries older than {cutoff} into {config.ROLLUP_COLLECTION_NAME}.")
 
 
-def main():
+def prune_logs(args):
+    """
+    Delete the log entries, or the rollup summaries with args.rollups, older than args.older_than, optionally only
+    those of some severities.
+    """
+    cutoff = datetime.now() - args.older_than
+    query = {'datetime': {'$lt': cutoff}}
+    if args.severity:
+        query['severity'] = {'$in': args.severity}
+    collection_name = config.ROLLUP_COLLECTION_NAME if args.rollups else None
+    mongo_client = database.MongoDBClient()
+    if not args.rollups and not mongo_client.supports_delete():
+        return
+    deleted = mongo_client.delete_data(query, collection_name)
+    if deleted:
+        daemon.invalidate(None, cutoff, config.SOCKET_PATH)
+    if deleted is not None:
+        logger.info(f"Pruned {deleted} {'summaries' if args.rollups else 'log entries'} older than {cutoff}.")
+
+
+def add_filter_arguments(parser):
+    parser.add_argument(
+        '--field',
+        help='The field of the log entries to filter by, such as "datetime". Note: Comparison filters --lt and --gt '
+             'are only available for "datetime" and can be combined into a range.'
+    )
+    parser.add_argument('--eq', help='Retrieve log entries where the field is equal to this value')
+    parser.add_argument('--ne', help='Retrieve log entries where the field is not equal to this value')
+    parser.add_argument(
+        '--lt',
+        help='Retrieve log entries where the field is earlier/lower than this value (only valid for "datetime" field)'
+    )
+    parser.add_argument(
+        '--gt',
+        help='Retrieve log entries where the field is later/greater than this value (only valid for "datetime" field)'
+    )
+    parser.add_argument(
+        '--in',
+        nargs='+',
+        help='Retrieve log entries where the field is equal to one of these values'
+    )
+    parser.add_argument(
+        '--where',
+        nargs='+',
+        action='append',
+        metavar='FIELD OPERATOR VALUE',
+        help=f'Additional filter, may be repeated, e.g. --where service eq api --where severity in ERROR WARNING. '
+             f'Operators: {", ".join(FILTER_OPERATORS + SEARCH_OPERATORS)}, only "in" takes several values'
+    )
+    parser.add_argument(
+        '--contains',
+        metavar='TEXT',
+        help='Retrieve log entries whose message contains this substring'
+    )
+    parser.add_argument(
+        '--regex',
+        metavar='PATTERN',
+        help='Retrieve log entries whose message matches this regular expression anywhere (e.g. "Timeout .* after '
+             '[0-9]+s"). Only patterns starting with ^ and a literal prefix use the message index, others scan all '
+             'messages'
+    )
+    parser.add_argument(
+        '--text',
+        metavar='WORDS',
+        help='Retrieve log entries whose message contains any of these words, using the text index. Quote a phrase '
+             '(\'"connection reset"\') to require it and prefix a word with "-" to exclude it'
+    )
+
+
+def query_time_range(query):
+    """
+    Return the (first, last) datetime range, None for unbounded, the results of a query depend on.
+    """
+    conditions = query.get('datetime', {})
+    if '$eq' in conditions:
+        return conditions['$eq'], conditions['$eq']
+    if '$in' in conditions:
+        return min(conditions['$in']), max(conditions['$in'])
+    return conditions.get('$gt'), conditions.get('$lt')
+
+
+def is_served_query(args):
+    """
+    Whether the parsed command is a get or stats query that the query daemon can answer.
+    """
+    return (getattr(args, 'func', None) in (get_logs, get_stats) and not args.profile and not args.profile_dump
+            and not args.no_daemon and not getattr(args, 'from_snapshot', None))
+
+
+def serve(args):
+    """
+    Answer the get and stats commands of other logs_tool.py invocations over a Unix socket, with a warm database
+    client and a cache of recent results that add, rollup, prune and migrate invalidate.
+    """
+    parser = build_parser()
+
+    def run_query(argv):
+        query_args = parser.parse_args(argv)
+        if not is_served_query(query_args):
+            raise ValueError("Only get and stats commands are answered by the daemon.")
+        try:
+            time_range = query_time_range(build_query(collect_filters(query_args, required=False)))
+        except ValueError:
+            time_range = (None, None)
+        query_args.func(query_args)
+        return time_range
+
+    if database.MongoDBClient().connect() is None:
+        return
+    cache = daemon.ResultCache(args.cache_size, args.cache_ttl)
+    try:
+        daemon.serve(args.socket, run_query, cache)
+    except (RuntimeError, OSError) as e:
+        logger.error(f"Failed to serve queries: {e}")
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Log File Manager: A tool for managing and querying log files.")
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print the wall time, CPU time, count and bytes of every stage of the command (read, parse, insert, '
+             'fetch, format/print) to stderr'
+    )
+    parser.add_argument(
+        '--profile-format',
+        choices=profiling.PROFILE_FORMATS,
+        default='table',
+        help='Format of the --profile report (default: table)'
+    )
+    parser.add_argument(
+        '--profile-dump',
+        metavar='PATH',
+        help='Also profile the command with cProfile and save the statistics to PATH, to be read with pstats'
+    )
+    parser.add_argument(
+        '--no-daemon',
+        action='store_true',
+        help='Run get and stats in this process even when a query daemon (serve) is running'
+    )
     subparsers = parser.add_subparsers(help='Available commands')
 
     add_parser = subparsers.add_parser(
         name='add',
-        help='Add a new log file to the system',
-        description='Add a log file to the system by specifying the file path. This operation stores the log file for '
-                    'further querying.'
+        help='Add new log files to the system',
+        description='Add log files to the system by specifying their paths or glob patterns. This operation stores '
+                    'the log entries for further querying.'
+    )
+    add_parser.add_argument(
+        '--file',
+        required=True,
+        nargs='+',
+        help='Paths or glob patterns (e.g. "logs/app.log.*") of the log files that need to be added. gzip, bz2 '
+             'and zstd compressed files are decompressed while they are read, "-" reads the logs from stdin'
+    )
+    add_parser.add_argument(
+        '--batch-size',
+        type=positive_int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f'Number of log entries sent to the database in a single insert (default: {DEFAULT_BATCH_SIZE})'
+    )
+    add_parser.add_argument(
+        '--workers',
+        type=positive_int,
+        default=1,
+        help='Number of processes parsing the files in parallel (default: 1, parse in the current process)'
+    )
+    add_parser.add_argument(
+        '--chunk-size',
+        type=positive_int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Size in bytes of the file chunks (extended to the end of the line) that are parsed by each worker and '
+             f'recorded in the manifest of added chunks (default: {DEFAULT_CHUNK_SIZE})'
+    )
+    add_parser.add_argument(
+        '--writers',
+        type=positive_int,
+        default=DEFAULT_WRITERS,
+        help=f'Number of threads inserting batches concurrently while the next ones are parsed, incremental runs '
+             f'insert from the current thread (default: {DEFAULT_WRITERS})'
+    )
+    add_parser.add_argument(
+        '--queue-size',
+        type=non_negative_int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=f'Number of parsed batches waiting for a writer before parsing pauses (default: {DEFAULT_QUEUE_SIZE})'
+    )
+    add_parser.add_argument(
+        '--write-concern',
+        type=write_concern,
+        help='Write concern of the inserts: number of nodes, "majority" or a tag set name, followed by ",j" to also '
+             'wait for the journal (e.g. "1", "majority,j"). Defaults to the write concern of MONGODB_URI'
+    )
+    add_parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Only add the lines appended since the previous incremental run, resuming from the checkpoints saved in '
+             'the state file. Rotated and truncated files are detected and read from the beginning'
+    )
+    add_parser.add_argument(
+        '--follow',
+        action='store_true',
+        help='Like --incremental, but keep polling the files for new lines until interrupted'
+    )
+    add_parser.add_argument(
+        '--state-file',
+        default=DEFAULT_STATE_FILE,
+        help=f'Path of the file storing the checkpoints of incremental runs (default: {DEFAULT_STATE_FILE})'
+    )
+    add_parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help=f'Seconds between checks for new lines in --follow mode (default: {DEFAULT_POLL_INTERVAL})'
     )
-    add_parser.add_argument('--file', required=True, help='Path to the log file that needs to be added')
     add_parser.set_defaults(func=add_logs)
 
 
     get_parser = subparsers.add_parser(
         name='get',
         help='Retrieve logs with specific filters',
-        description='Retrieve logs based on specified filtering conditions. Requires --field parameter and at least '
-                    'one other filter. Note: Filters --lt and --gt can only be applied to the "datetime" field.'
+        description='Retrieve logs based on specified filtering conditions, given as --field with one or more of '
+                    '--eq, --ne, --lt, --gt, --in, and/or as --where predicates. All filters are combined and applied '
+                    'by the database. Note: Filters --lt and --gt can only be applied to the "datetime" field.'
     )
+    add_filter_arguments(get_parser)
     get_parser.add_argument(
-        '--field',
-        required=True,
-        help='The field of the log entries to filter by, such as "datetime". Note: Comparison filters --lt and --gt '
-             'are only available for "datetime".'
+        '--limit',
+        type=positive_int,
+        help='Retrieve at most this many log entries. The id to pass to --after to get the next page is logged'
     )
-    get_parser.add_argument('--eq', help='Retrieve log entries where the field is equal to this value')
-    get_parser.add_argument('--ne', help='Retrieve log entries where the field is not equal to this value')
     get_parser.add_argument(
-        '--lt',
-        help='Retrieve log entries where the field is earlier/lower than this value (only valid for "datetime" field)'
+        '--skip',
+        type=non_negative_int,
+        default=0,
+        help='Skip this many matching log entries. Prefer --after for deep pages, skipped entries are still scanned'
     )
     get_parser.add_argument(
-        '--gt',
-        help='Retrieve log entries where the field is later/greater than this value (only valid for "datetime" field)'
+        '--after',
+        help='Retrieve log entries following the one with this id (keyset pagination), in the --sort order'
+    )
+    get_parser.add_argument('--sort', choices=LOG_FIELDS, help='Field to sort the log entries by')
+    get_parser.add_argument('--desc', action='store_true', help='Sort in descending order')
+    get_parser.add_argument(
+        '--fields',
+        nargs='+',
+        choices=LOG_FIELDS,
+        help='Only retrieve and print these fields of the log entries'
+    )
+    get_parser.add_argument(
+        '--format',
+        choices=output.OUTPUT_FORMATS,
+        default='text',
+        help='Output format: "text" lines in the log file layout, JSON lines or CSV with a header (default: text)'
+    )
+    get_parser.add_argument(
+        '--batch-size',
+        type=positive_int,
+        default=database.DEFAULT_CURSOR_BATCH_SIZE,
+        help=f'Number of log entries fetched from the database per round-trip '
+             f'(default: {database.DEFAULT_CURSOR_BATCH_SIZE})'
+    )
+    get_parser.add_argument(
+        '--explain',
+        action='store_true',
+        help='Instead of the log entries, print the winning query plan and the number of examined documents'
+    )
+    get_parser.add_argument(
+        '--from-snapshot',
+        metavar='PATH',
+        help='Answer the query from a local snapshot written by export-snapshot instead of the database'
     )
     get_parser.set_defaults(func=get_logs)
 
+    index_parser = subparsers.add_parser(
+        name='index',
+        help='Manage the indexes of the log collection',
+        description='Build, list or drop the indexes backing the filters of the get command. Indexes are built in the '
+                    'background and the add command builds missing ones automatically.'
+    )
+    index_parser.add_argument('action', choices=['build', 'list', 'drop'], help='Operation to perform on the indexes')
+    index_parser.set_defaults(func=manage_indexes)
+
+    migrate_parser = subparsers.add_parser(
+        name='migrate',
+        help='Convert the log collection into a time-series collection',
+        description='Convert the log collection into a time-series collection with datetime as timeField and service '
+                    'and severity as metaField. The standard collection is kept as <COLLECTION_NAME>_standard.'
+    )
+    migrate_parser.add_argument(
+        '--granularity',
+        choices=config.TIMESERIES_GRANULARITIES,
+        help=f'Granularity of the time-series buckets, close to the interval between entries of a service and severity '
+             f'(default: TIMESERIES_GRANULARITY, {config.TIMESERIES_GRANULARITY})'
+    )
+    migrate_parser.add_argument(
+        '--batch-size',
+        type=positive_int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f'Number of log entries copied in a single insert (default: {DEFAULT_BATCH_SIZE})'
+    )
+    migrate_parser.set_defaults(func=migrate_collection)
+
+    snapshot_parser = subparsers.add_parser(
+        name='export-snapshot',
+        help='Export log entries to a local columnar snapshot',
+        description='Export the log entries matching the filters (the same as for get, optional here), typically a '
+                    'datetime range, to a local columnar snapshot directory. get --from-snapshot answers repeated '
+                    'queries from it without contacting the database.'
+    )
+    add_filter_arguments(snapshot_parser)
+    snapshot_parser.add_argument('--output', required=True, metavar='PATH', help='Directory to write the snapshot to')
+    snapshot_parser.add_argument(
+        '--batch-size',
+        type=positive_int,
+        default=database.DEFAULT_CURSOR_BATCH_SIZE,
+        help=f'Number of log entries fetched from the database per round-trip '
+             f'(default: {database.DEFAULT_CURSOR_BATCH_SIZE})'
+    )
+    snapshot_parser.set_defaults(func=export_snapshot)
+
+    stats_parser = subparsers.add_parser(
+        name='stats',
+        help='Count log entries grouped by fields and time buckets',
+        description='Count the log entries matching the filters (the same as for get, optional here) grouped by '
+                    'service, severity, message and/or time bucket. The aggregation runs in the database and only '
+                    'the aggregated rows are transferred.'
+    )
+    add_filter_arguments(stats_parser)
+    stats_parser.add_argument(
+        '--by',
+        nargs='+',
+        choices=STATS_GROUPS,
+        default=['service', 'severity'],
+        help='Group the log entries by these keys, "time" groups them into --bucket intervals '
+             '(default: service severity)'
+    )
+    stats_parser.add_argument(
+        '--bucket',
+        type=parse_bucket,
+        default='1h',
+        help='Length of the time buckets used with --by time, e.g. 30s, 5m, 1h, 1d (default: 1h)'
+    )
+    stats_parser.add_argument(
+        '--top',
+        type=positive_int,
+        help='Only print the N groups with the most log entries, e.g. --by message --top 10 for the top 10 messages'
+    )
+    stats_parser.add_argument(
+        '--from-rollup',
+        action='store_true',
+        help='Sum the hourly summaries written by the rollup command instead of counting the log entries. Filters '
+             'on datetime apply to the start of the hours and messages are not available'
+    )
+    stats_parser.set_defaults(func=get_stats)
+
+    rollup_parser = subparsers.add_parser(
+        name='rollup',
+        help='Compact old log entries into hourly summaries',
+        description='Count the log entries older than --older-than per service, severity and hour into the rollup '
+                    'collection (ROLLUP_COLLECTION_NAME) and delete them from the log collection. stats '
+                    '--from-rollup answers questions about the compacted history.'
+    )
+    rollup_parser.add_argument(
+        '--older-than',
+        type=parse_age,
+        required=True,
+        metavar='AGE',
+        help='Compact the log entries older than this age, rounded down to the hour, e.g. 12h, 7d'
+    )
+    rollup_parser.add_argument(
+        '--batch-size',
+        type=positive_int,
+        default=DEFAULT_ROLLUP_BATCH_SIZE,
+        help=f'Number of log entries summarized and deleted together (default: {DEFAULT_ROLLUP_BATCH_SIZE})'
+    )
+    rollup_parser.set_defaults(func=rollup_logs)
+
+    prune_parser = subparsers.add_parser(
+        name='prune',
+        help='Delete old log entries',
+        description='Delete the log entries older than --older-than, e.g. to keep debug logs for a week and errors '
+                    'for a quarter. Run rollup first to keep their counts.'
+    )
+    prune_parser.add_argument(
+        '--older-than',
+        type=parse_age,
+        required=True,
+        metavar='AGE',
+        help='Delete the log entries older than this age, e.g. 12h, 7d, 90d'
+    )
+    prune_parser.add_argument('--severity', nargs='+', help='Only delete the log entries of these severities')
+    prune_parser.add_argument(
+        '--rollups',
+        action='store_true',
+        help='Delete the hourly summaries of the rollup collection instead of log entries'
+    )
+    prune_parser.set_defaults(func=prune_logs)
 
+    serve_parser = subparsers.add_parser(
+        name='serve',
+        help='Answer get and stats commands from a resident daemon',
+        description='Keep a pooled database client warm and answer the get and stats commands of other invocations '
+                    'over a Unix socket (LOGS_TOOL_SOCKET), caching recent results until add, rollup, prune or '
+                    'migrate change the log entries they depend on. get and stats use the daemon automatically '
+                    'while it is running.'
+    )
+    serve_parser.add_argument(
+        '--socket',
+        default=config.SOCKET_PATH,
+        help=f'Path of the Unix socket to listen on (default: LOGS_TOOL_SOCKET, {config.SOCKET_PATH})'
+    )
+    serve_parser.add_argument(
+        '--cache-size',
+        type=non_negative_int,
+        default=daemon.DEFAULT_CACHE_SIZE,
+        help=f'Number of cached query results, 0 disables the cache (default: {daemon.DEFAULT_CACHE_SIZE})'
+    )
+    serve_parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        default=daemon.DEFAULT_CACHE_TTL,
+        help=f'Seconds a result stays cached, bounding how stale results get when the logs are changed by other '
+             f'means than logs_tool.py (default: {daemon.DEFAULT_CACHE_TTL})'
+    )
+    serve_parser.set_defaults(func=serve)
+
+    return parser
+
+
+def main():
+    parser = build_parser()
     args = parser.parse_args()
 
     if hasattr(args, 'func'):
-        args.func(args)
+        if args.profile or args.profile_dump:
+            profiling.run(args.func, args, sys.stderr, args.profile_format, args.profile_dump)
+        elif not (is_served_query(args) and daemon.forward_query(sys.argv[1:], sys.stdout, sys.stderr,
+                                                                 config.SOCKET_PATH)):
+            args.func(args)
     else:
         parser.print_help()
 
@@ -0,0 +1,107 @@
+import csv
+from datetime import datetime
+import json
+
+OUTPUT_FORMATS = ('text', 'jsonl', 'csv')
+DEFAULT_CHUNK_SIZE = 1000
+
+# ((second, minute, hour, day, month, year), formatted prefix) of the last second formatted by format_timestamp.
+_last_second = (None, None)
+
+
+def format_timestamp(dt):
+    """
+    Format a datetime as 'YYYY-MM-DD HH:MM:SS,mmm', the layout of the log files.
+
+    The strftime result of the previous second is reused when consecutive datetimes share it.
+    """
+    global _last_second
+    key = (dt.second, dt.minute, dt.hour, dt.day, dt.month, dt.year)
+    cached_key, prefix = _last_second
+    if key != cached_key:
+        prefix = dt.strftime('%Y-%m-%d %H:%M:%S,')
+        _last_second = (key, prefix)
+    return f"{prefix}{dt.microsecond // 1000:03d}"
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return format_timestamp(value)
+    return value
+
+
+def _text_row(fields):
+    def format_row(entry):
+        return ' - '.join([str(_format_value(entry.get(field, ''))) for field in fields]) + '\n'
+    return format_row
+
+
+def _jsonl_row(fields):
+    def format_row(entry):
+        return json.dumps({field: _format_value(entry.get(field)) for field in fields}, ensure_ascii=False) + '\n'
+    return format_row
+
+
+def _csv_row(fields):
+    def format_row(entry):
+        return [_format_value(entry.get(field, '')) for field in fields]
+    return format_row
+
+
+def _write_lines(stream):
+    def write_chunk(chunk):
+        stream.write(''.join(chunk))
+    return write_chunk
+
+
+def write_log_entries(entries, stream, fields, output_format='text', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write the log entries to the stream as text lines, JSON lines or CSV rows (with a header).
+
+    Rows are formatted into chunks of chunk_size and each chunk is written with a single call, without per-row
+    logging. Returns the number of written entries and the last written entry (None if there were none).
+    """
+    if output_format == 'csv':
+        csv_writer = csv.writer(stream, lineterminator='\n')
+        csv_writer.writerow(fields)
+        format_row = _csv_row(fields)
+        write_chunk = csv_writer.writerows
+    elif output_format == 'jsonl':
+        format_row = _jsonl_row(fields)
+        write_chunk = _write_lines(stream)
+    elif output_format == 'text':
+        format_row = _text_row(fields)
+        write_chunk = _write_lines(stream)
+    else:
+        raise ValueError(f"Unknown output format '{output_format}'. Allowed formats are: {', '.join(OUTPUT_FORMATS)}.")
+
+    count = 0
+    last_entry = None
+    chunk = []
+    for last_entry in entries:
+        chunk.append(format_row(last_entry))
+        if len(chunk) >= chunk_size:
+            write_chunk(chunk)
+            count += len(chunk)
+            chunk.clear()
+    if chunk:
+        write_chunk(chunk)
+        count += len(chunk)
+    stream.flush()
+    return count, last_entry
+
+
+def write_table(rows, columns, stream):
+    """
+    Write the rows as a table with aligned columns under a header, numbers aligned to the right.
+    """
+    cells = [[str(_format_value(value)) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+    numeric = [all(isinstance(row[i], (int, float)) for row in rows) for i in range(len(columns))]
+
+    def format_line(values):
+        return '  '.join(value.rjust(width) if right else value.ljust(width)
+                         for value, width, right in zip(values, widths, numeric)).rstrip() + '\n'
+
+    stream.write(format_line(columns) + ''.join(format_line(row) for row in cells))
+    stream.flush()
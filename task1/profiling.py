@@ -0,0 +1,146 @@
+import cProfile
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+import output
+
+PROFILE_FORMATS = ('table', 'json')
+
+# Profiler of the running command, None unless --profile is given. Instrumented code checks it once per operation
+# and only wraps its iterators and calls when it is set, so there is no overhead when profiling is disabled.
+_profiler = None
+
+
+def active():
+    return _profiler
+
+
+class Profiler:
+    """
+    Accumulate wall time, CPU time (of the thread running the stage), number of items and bytes per stage.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, wall, cpu, count=0, size=0):
+        with self._lock:
+            stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'count': 0, 'bytes': 0})
+            stage['wall'] += wall
+            stage['cpu'] += cpu
+            stage['count'] += count
+            stage['bytes'] += size
+
+    def timed_iter(self, name, iterable, count=None, size=None):
+        """
+        Yield the items of iterable, recording the time spent producing them under name. count and size map an
+        item to its number of entries and bytes, by default every item counts as one entry.
+
+        The totals are accumulated locally and recorded once the iteration ends or is abandoned.
+        """
+        iterator = iter(iterable)
+        wall = cpu = 0.0
+        items = size_total = 0
+        try:
+            while True:
+                wall_start, cpu_start = time.perf_counter(), time.thread_time()
+                try:
+                    item = next(iterator)
+                finally:
+                    wall += time.perf_counter() - wall_start
+                    cpu += time.thread_time() - cpu_start
+                items += count(item) if count else 1
+                if size:
+                    size_total += size(item)
+                yield item
+        except StopIteration:
+            return
+        finally:
+            self.record(name, wall, cpu, items, size_total)
+
+    def wrap(self, name, function, count=None, size=None):
+        """
+        Return function recording the time of every call under name. count and size map the first argument to its
+        number of entries and bytes.
+        """
+        def timed(data, *args, **kwargs):
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            try:
+                return function(data, *args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start,
+                            count(data) if count else 1, size(data) if size else 0)
+        return timed
+
+    @contextmanager
+    def stage(self, name, exclude=()):
+        """
+        Record the time of the with block under name, minus the time recorded meanwhile for the nested stages in
+        exclude (e.g. fetching the entries that are being printed). The yielded dict takes the count and bytes.
+        """
+        def totals():
+            with self._lock:
+                return [(self.stages.get(nested, {}).get('wall', 0.0), self.stages.get(nested, {}).get('cpu', 0.0))
+                        for nested in exclude]
+
+        measured = {'count': 0, 'bytes': 0}
+        before = totals()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield measured
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            for (wall_before, cpu_before), (wall_after, cpu_after) in zip(before, totals()):
+                wall -= wall_after - wall_before
+                cpu -= cpu_after - cpu_before
+            self.record(name, max(wall, 0.0), max(cpu, 0.0), measured['count'], measured['bytes'])
+
+    def summary(self):
+        return {name: {'wall': round(stage['wall'], 6), 'cpu': round(stage['cpu'], 6), 'count': stage['count'],
+                       'bytes': stage['bytes']} for name, stage in self.stages.items()}
+
+    def write_table(self, stream):
+        total = self.stages.get('total', {}).get('wall') or 0.0
+        rows = []
+        for name, stage in self.stages.items():
+            rate = round(stage['count'] / stage['wall']) if stage['count'] and stage['wall'] else ''
+            share = f"{stage['wall'] / total:.1%}" if total else ''
+            rows.append([name, stage['count'], stage['bytes'], round(stage['wall'], 3), round(stage['cpu'], 3),
+                         rate, share])
+        output.write_table(rows, ['stage', 'count', 'bytes', 'wall s', 'cpu s', 'count/s', 'of total'], stream)
+
+
+def run(function, args, stream, output_format='table', dump_path=None):
+    """
+    Run function(args) with profiling enabled and write the per-stage summary to stream, as a table or JSON.
+
+    With dump_path the run is also profiled with cProfile and the statistics are saved there, to be read with
+    pstats (python -m pstats <dump_path>).
+    """
+    global _profiler
+    profiler = Profiler()
+    cprofile = cProfile.Profile() if dump_path else None
+    _profiler = profiler
+    try:
+        with profiler.stage('total'):
+            if cprofile is not None:
+                cprofile.enable()
+            try:
+                function(args)
+            finally:
+                if cprofile is not None:
+                    cprofile.disable()
+    finally:
+        _profiler = None
+        if cprofile is not None:
+            cprofile.dump_stats(dump_path)
+        if output_format == 'json':
+            stream.write(json.dumps(profiler.summary()) + '\n')
+            stream.flush()
+        else:
+            profiler.write_table(stream)
+    return profiler
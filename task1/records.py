@@ -0,0 +1,57 @@
+import sys
+
+LOG_RECORD_FIELDS = ('datetime', 'service', 'severity', 'message')
+
+
+class LogRecord:
+    """
+    Parsed log line, kept compact while files are parsed and batched: the fields live in slots instead of a dict and
+    service and severity, which come from a small vocabulary, are interned so all records share the same strings.
+
+    Fields can be read as attributes or, like the documents read from the database, with record['field'] and
+    record.get('field'). The record is only turned into a document by as_document when it is inserted.
+    """
+    __slots__ = LOG_RECORD_FIELDS + ('_id',)
+
+    def __init__(self, datetime, service, severity, message, _id=None):
+        self.datetime = datetime
+        self.service = sys.intern(service)
+        self.severity = sys.intern(severity)
+        self.message = message
+        self._id = _id
+
+    def __getitem__(self, field):
+        if field not in self.__slots__ or (field == '_id' and self._id is None):
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if not isinstance(other, LogRecord):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)
+        return f'LogRecord({fields})'
+
+    def as_document(self):
+        document = {'datetime': self.datetime, 'service': self.service, 'severity': self.severity,
+                    'message': self.message}
+        if self._id is not None:
+            document['_id'] = self._id
+        return document
+
+
+def to_document(record):
+    """
+    Return the document of a LogRecord, other documents are returned as they are.
+    """
+    return record.as_document() if isinstance(record, LogRecord) else record
@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import config
+
+logging.basicConfig(level=config.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+EXPORT_CHUNK_SIZE = 10000
+EPOCH = datetime(1970, 1, 1)
+ONE_MILLISECOND = timedelta(milliseconds=1)
+
+# Fixed-width columns, stored as raw little-endian arrays and memory-mapped when the snapshot is loaded.
+COLUMNS = {
+    'datetime': '<i8',
+    'service': '<i4',
+    'severity': '<i4',
+    'message_offsets': '<i8'
+}
+DICTIONARY_FIELDS = ('service', 'severity')
+
+
+def _to_milliseconds(dt):
+    return (dt - EPOCH) // ONE_MILLISECOND
+
+
+def export_snapshot(entries, path, query=None):
+    """
+    Write the log entries, which must be sorted by datetime, to a columnar snapshot in the directory path.
+
+    Timestamps are stored as milliseconds since the epoch, service and severity as codes into dictionaries kept in
+    meta.json and messages as one UTF-8 blob with an offsets column. Entries are written in chunks, so memory use does
+    not depend on the number of entries. Returns the number of written entries.
+    """
+    os.makedirs(path, exist_ok=True)
+    # Without meta.json a half-written snapshot cannot be loaded, it is only written back once the export succeeded.
+    meta_path = os.path.join(path, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    dictionaries = {field: {} for field in DICTIONARY_FIELDS}
+    files = {column: open(os.path.join(path, f'{column}.bin'), 'wb') for column in COLUMNS}
+    count = 0
+    message_offset = 0
+    try:
+        with open(os.path.join(path, 'message.bin'), 'wb') as message_file:
+            files['message_offsets'].write(np.array([0], dtype=COLUMNS['message_offsets']).tobytes())
+            chunk = {column: [] for column in COLUMNS}
+            messages = []
+            previous_timestamp = None
+            for entry in entries:
+                timestamp = _to_milliseconds(entry['datetime'])
+                if previous_timestamp is not None and timestamp < previous_timestamp:
+                    raise ValueError("Log entries of a snapshot must be sorted by datetime.")
+                previous_timestamp = timestamp
+                chunk['datetime'].append(timestamp)
+                for field in DICTIONARY_FIELDS:
+                    codes = dictionaries[field]
+                    chunk[field].append(codes.setdefault(entry[field], len(codes)))
+                message = entry['message'].encode('utf-8')
+                message_offset += len(message)
+                messages.append(message)
+                chunk['message_offsets'].append(message_offset)
+                if len(messages) >= EXPORT_CHUNK_SIZE:
+                    count += _write_chunk(files, message_file, chunk, messages)
+            count += _write_chunk(files, message_file, chunk, messages)
+    finally:
+        for file in files.values():
+            file.close()
+
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'count': count,
+        'query': repr(query),
+        'dictionaries': {field: list(codes) for field, codes in dictionaries.items()}
+    }
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file, indent=2)
+    logger.debug(f"Exported {count} log entries to the snapshot {path}")
+    return count
+
+
+def _write_chunk(files, message_file, chunk, messages):
+    for column, values in chunk.items():
+        files[column].write(np.array(values, dtype=COLUMNS[column]).tobytes())
+        values.clear()
+    message_file.write(b''.join(messages))
+    written = len(messages)
+    messages.clear()
+    return written
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot written by export_snapshot, answering get queries with vectorised scans.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json'), 'r') as file:
+            meta = json.load(file)
+        if meta.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {meta.get('version')} in {path}.")
+        self.count = meta['count']
+        self.dictionaries = meta['dictionaries']
+        self.codes = {field: {name: code for code, name in enumerate(names)}
+                      for field, names in self.dictionaries.items()}
+        self.columns = {
+            column: self._memmap(os.path.join(path, f'{column}.bin'), dtype,
+                                 self.count + 1 if column == 'message_offsets' else self.count)
+            for column, dtype in COLUMNS.items()
+        }
+        message_bytes = int(self.columns['message_offsets'][-1])
+        self.messages = self._memmap(os.path.join(path, 'message.bin'), np.uint8, message_bytes)
+
+    @staticmethod
+    def _memmap(file_path, dtype, length):
+        # np.memmap cannot map empty files.
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', shape=(length,))
+
+    def __len__(self):
+        return self.count
+
+    def message(self, index):
+        start, end = self.columns['message_offsets'][index:index + 2]
+        return self.messages[start:end].tobytes().decode('utf-8')
+
+    def _encode(self, field, value):
+        if field == 'datetime':
+            return _to_milliseconds(value)
+        return self.codes[field].get(value, -1)
+
+    def select(self, query):
+        """
+        Return the indices, in datetime order, of the rows matching a query built by logs_tool.build_query.
+
+        The datetime range is found by binary search on the sorted timestamps, other datetime, service and severity
+        conditions are vectorised comparisons and message conditions are checked on the remaining rows only.
+        """
+        timestamps = self.columns['datetime']
+        start, end = 0, self.count
+        conditions = query.get('datetime', {})
+        if '$gt' in conditions:
+            start = int(np.searchsorted(timestamps, _to_milliseconds(conditions['$gt']), side='right'))
+        if '$lt' in conditions:
+            end = max(start, int(np.searchsorted(timestamps, _to_milliseconds(conditions['$lt']), side='left')))
+
+        mask = np.ones(end - start, dtype=bool)
+        for field, conditions in query.items():
+            if field.startswith('$'):
+                raise ValueError(f"The '{field}' filter is not supported by snapshots.")
+            if field == 'message':
+                continue
+            column = self.columns[field][start:end]
+            for operator, value in conditions.items():
+                if operator == '$eq':
+                    mask &= column == self._encode(field, value)
+                elif operator == '$ne':
+                    mask &= column != self._encode(field, value)
+                elif operator == '$in':
+                    mask &= np.isin(column, [self._encode(field, item) for item in value])
+                elif operator not in ('$gt', '$lt') or field != 'datetime':
+                    raise ValueError(f"The '{operator}' filter on '{field}' is not supported by snapshots.")
+
+        indices = np.flatnonzero(mask) + start
+        message_conditions = query.get('message')
+        if message_conditions:
+            indices = np.array([i for i in indices if self._match_message(self.message(i), message_conditions)],
+                               dtype=np.int64)
+        return indices
+
+    @staticmethod
+    def _match_message(message, conditions):
+        for operator, value in conditions.items():
+            if operator == '$eq' and message != value:
+                return False
+            if operator == '$ne' and message == value:
+                return False
+            if operator == '$in' and message not in value:
+                return False
+            if operator == '$regex' and not re.search(value, message):
+                return False
+            if operator not in ('$eq', '$ne', '$in', '$regex'):
+                raise ValueError(f"The '{operator}' filter on 'message' is not supported by snapshots.")
+        return True
+
+    def sort(self, indices, field, descending=False):
+        """
+        Sort the row indices by field, keeping rows with equal values in datetime order.
+        """
+        if field == 'datetime':
+            keys = self.columns['datetime'][indices]
+        elif field == 'message':
+            _, keys = np.unique([self.message(i) for i in indices], return_inverse=True)
+        else:
+            # Codes follow first appearance, rank them by value to sort alphabetically.
+            names = self.dictionaries[field]
+            ranks = np.empty(len(names), dtype=np.int64)
+            ranks[np.argsort(names)] = np.arange(len(names))
+            keys = ranks[self.columns[field][indices]]
+        keys = np.asarray(keys, dtype=np.int64)
+        return indices[np.argsort(-keys if descending else keys, kind='stable')]
+
+    def rows(self, indices, fields, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Yield the rows at indices as log entry dicts with the given fields, decoding them chunk by chunk.
+        """
+        for chunk_start in range(0, len(indices), chunk_size):
+            chunk = indices[chunk_start:chunk_start + chunk_size]
+            values = {}
+            if 'datetime' in fields:
+                values['datetime'] = self.columns['datetime'][chunk].astype('datetime64[ms]').tolist()
+            for field in DICTIONARY_FIELDS:
+                if field in fields:
+                    names = self.dictionaries[field]
+                    values[field] = [names[code] for code in self.columns[field][chunk]]
+            if 'message' in fields:
+                values['message'] = [self.message(i) for i in chunk]
+            for row in zip(*values.values()):
+                yield dict(zip(values.keys(), row))
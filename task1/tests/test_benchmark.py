@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import benchmark
+import logs_tool
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, 'benchmark.log')
+
+    def test_generate_log_lines(self):
+        lines = list(benchmark.generate_log_lines(200, services=3, severities=['INFO', 'ERROR'],
+                                                  separator_fraction=0.5, seed=1))
+        self.assertEqual(lines, list(benchmark.generate_log_lines(200, services=3, severities=['INFO', 'ERROR'],
+                                                                  separator_fraction=0.5, seed=1)))
+        entries = logs_tool.parse_log_file(lines)
+        self.assertEqual(len(entries), 200)
+        self.assertEqual({entry['service'] for entry in entries}, {'service-0', 'service-1', 'service-2'})
+        self.assertEqual({entry['severity'] for entry in entries}, {'INFO', 'ERROR'})
+        self.assertTrue(any(' - ' in entry['message'] for entry in entries))
+        self.assertEqual(entries, sorted(entries, key=lambda entry: entry['datetime']))
+
+    def test_run_benchmark_parse(self):
+        benchmark.write_log_file(self.path, 100)
+        result = benchmark.run_benchmark('parse_file', self.path, 10)
+        self.assertEqual(result['lines'], 100)
+        self.assertGreater(result['lines_per_sec'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+
+    @unittest.skipIf(mongomock is None, "mongomock is not installed")
+    def test_run_benchmark_add_and_get(self):
+        benchmark.write_log_file(self.path, 100, services=2)
+        self.addCleanup(self.reset_database)
+        with patch.object(benchmark.database, 'MongoClient', benchmark.database.MongoClient):
+            self.assertEqual(benchmark.run_benchmark('add', self.path, 10)['lines'], 100)
+            self.assertGreater(benchmark.run_benchmark('get', self.path, 10)['lines'], 0)
+
+    @staticmethod
+    def reset_database():
+        # The MongoDBClient singleton must not keep the in-process client for the other tests.
+        mongo_client = benchmark.database.MongoDBClient()
+        mongo_client.connection = None
+        mongo_client.db = None
+        mongo_client.collections = {}
+        mongo_client.timeseries = None
+
+    def test_compare_results(self):
+        results = {'benchmarks': {'parse_line': {'lines_per_sec': 300}, 'add': {'error': 'failed'}}}
+        baseline = {'benchmarks': {'parse_line': {'lines_per_sec': 200}, 'add': {'lines_per_sec': 10}}}
+        self.assertEqual(benchmark.compare_results(results, baseline), [['parse_line', 300, 200, 1.5]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+import checkpoints
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, 'app.log')
+        self.state_file = os.path.join(self.tmp_dir.name, 'state.json')
+        with open(self.path, 'wb') as file:
+            file.write(b"first line\nsecond line\n")
+
+    def make_checkpoint(self):
+        with open(self.path, 'rb') as file:
+            return checkpoints.make_checkpoint(file, 23, b"second line\n")
+
+    def test_load_state_missing_file(self):
+        self.assertEqual(checkpoints.load_state(self.state_file), {})
+
+    def test_load_state_corrupted_file(self):
+        with open(self.state_file, 'w') as file:
+            file.write("{not json")
+        self.assertEqual(checkpoints.load_state(self.state_file), {})
+
+    def test_save_and_load_state(self):
+        state = {self.path: self.make_checkpoint(), os.path.join(self.tmp_dir.name, 'deleted.log'): {}}
+        checkpoints.save_state(self.state_file, state)
+        self.assertEqual(checkpoints.load_state(self.state_file), {self.path: state[self.path]})
+
+    def test_resume_offset_without_checkpoint(self):
+        with open(self.path, 'rb') as file:
+            self.assertEqual(checkpoints.resume_offset(file, None), 0)
+
+    def test_resume_offset_appended_file(self):
+        checkpoint = self.make_checkpoint()
+        with open(self.path, 'ab') as file:
+            file.write(b"third line\n")
+        with open(self.path, 'rb') as file:
+            self.assertEqual(checkpoints.resume_offset(file, checkpoint), 23)
+
+    def test_resume_offset_truncated_file(self):
+        checkpoint = self.make_checkpoint()
+        with open(self.path, 'wb') as file:
+            file.write(b"new\n")
+        with open(self.path, 'rb') as file:
+            self.assertEqual(checkpoints.resume_offset(file, checkpoint), 0)
+
+    def test_resume_offset_replaced_file(self):
+        checkpoint = self.make_checkpoint()
+        with open(self.path, 'wb') as file:
+            file.write(b"other line\nanother line\nthird line\n")
+        with open(self.path, 'rb') as file:
+            self.assertEqual(checkpoints.resume_offset(file, checkpoint), 0)
+
+    def test_find_checkpoint_after_rotation(self):
+        state = {self.path: self.make_checkpoint()}
+        rotated_path = self.path + '.1'
+        os.rename(self.path, rotated_path)
+        with open(self.path, 'wb') as file:
+            file.write(b"new file\n")
+        with open(rotated_path, 'rb') as file:
+            self.assertIs(checkpoints.find_checkpoint(state, rotated_path, file), state[self.path])
+        with open(self.path, 'rb') as file:
+            self.assertIsNone(checkpoints.find_checkpoint(state, self.path, file))
+
+
+if __name__ == '__main__':
+    unittest.main()
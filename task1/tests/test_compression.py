@@ -0,0 +1,101 @@
+import bz2
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import zstandard
+
+import compression
+
+
+class TestOpenLogFile(unittest.TestCase):
+    data = b''.join(f"2021-01-01 12:00:00,{i % 1000:03d} - Service - INFO - Message {i}\n".encode('utf-8')
+                    for i in range(20000))
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def write_file(self, data, name='app.log'):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_detect_compression(self):
+        self.assertEqual(compression.detect_compression(gzip.compress(b'line\n')[:4]), 'gzip')
+        self.assertEqual(compression.detect_compression(bz2.compress(b'line\n')[:4]), 'bz2')
+        self.assertEqual(compression.detect_compression(zstandard.ZstdCompressor().compress(b'line\n')[:4]), 'zstd')
+        self.assertIsNone(compression.detect_compression(b'2021'))
+        self.assertIsNone(compression.detect_compression(b''))
+
+    def test_compressed_files(self):
+        compressors = {
+            'gzip': gzip.compress,
+            'bz2': bz2.compress,
+            'zstd': zstandard.ZstdCompressor().compress
+        }
+        for name, compress in compressors.items():
+            with self.subTest(compression=name):
+                # The file name does not matter, only the magic bytes.
+                path = self.write_file(compress(self.data), 'app.log.1')
+                with compression.open_log_file(path) as file:
+                    self.assertEqual(file.readline(), self.data[:self.data.index(b'\n') + 1])
+                    self.assertEqual(file.readline() + file.read(), self.data[self.data.index(b'\n') + 1:])
+                self.assertTrue(file.closed)
+
+    def test_concatenated_members(self):
+        middle = len(self.data) // 2
+        for compress in (gzip.compress, bz2.compress, zstandard.ZstdCompressor().compress):
+            with self.subTest(compress=compress):
+                path = self.write_file(compress(self.data[:middle]) + compress(self.data[middle:]))
+                with compression.open_log_file(path) as file:
+                    self.assertEqual(file.read(), self.data)
+
+    def test_uncompressed_file(self):
+        path = self.write_file(self.data)
+        with compression.open_log_file(path) as file:
+            self.assertIsInstance(file, io.BufferedReader)
+            self.assertEqual(file.read(), self.data)
+
+    def test_short_files(self):
+        for data in (b'', b'a\n'):
+            with self.subTest(data=data):
+                with compression.open_log_file(self.write_file(data)) as file:
+                    self.assertEqual(file.read(), data)
+
+    def test_truncated_file(self):
+        path = self.write_file(gzip.compress(self.data)[:-100])
+        with compression.open_log_file(path) as file:
+            with self.assertRaises(ValueError) as context:
+                file.read()
+        self.assertIn("Compressed data ends before the end of the stream", str(context.exception))
+
+    def test_corrupt_file(self):
+        compressed = bytearray(bz2.compress(self.data))
+        compressed[20:40] = b'\0' * 20
+        path = self.write_file(bytes(compressed))
+        with compression.open_log_file(path) as file:
+            with self.assertRaises(ValueError) as context:
+                file.read()
+        self.assertIn("Invalid compressed data", str(context.exception))
+
+    def test_stdin(self):
+        for data in (self.data, gzip.compress(self.data)):
+            with self.subTest(compressed=data != self.data):
+                stdin = MagicMock(buffer=io.BytesIO(data))
+                with patch('compression.sys.stdin', stdin):
+                    with compression.open_log_file('-') as file:
+                        self.assertEqual(list(file), self.data.splitlines(keepends=True))
+                self.assertFalse(stdin.buffer.closed)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            compression.open_log_file(os.path.join(self.tmp_dir.name, 'missing.log'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import daemon
+
+logger = logging.getLogger('test_daemon')
+
+
+class TestResultCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = daemon.ResultCache(size=2)
+        for key in ('a', 'b'):
+            cache.put(key, (None, None), key, [], cache.generation)
+        cache.get('a')
+        cache.put('c', (None, None), 'c', [], cache.generation)
+        self.assertEqual(cache.get('a'), ('a', []))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_results(self):
+        cache = daemon.ResultCache(ttl=-1)
+        cache.put('a', (None, None), 'a', [], cache.generation)
+        self.assertIsNone(cache.get('a'))
+
+    def test_invalidate_overlapping_ranges(self):
+        cache = daemon.ResultCache()
+        cache.put('january', (datetime(2021, 1, 1), datetime(2021, 2, 1)), 'january', [], cache.generation)
+        cache.put('since march', (datetime(2021, 3, 1), None), 'since march', [], cache.generation)
+        cache.put('all', (None, None), 'all', [], cache.generation)
+        self.assertEqual(cache.invalidate(datetime(2021, 2, 10), datetime(2021, 2, 20)), 1)
+        self.assertIsNone(cache.get('all'))
+        self.assertIsNotNone(cache.get('january'))
+        self.assertEqual(cache.invalidate(datetime(2021, 4, 1), datetime(2021, 4, 1)), 1)
+        self.assertIsNotNone(cache.get('january'))
+        self.assertEqual(cache.invalidate(), 1)
+
+    def test_put_after_invalidation_is_ignored(self):
+        cache = daemon.ResultCache()
+        generation = cache.generation
+        cache.invalidate()
+        self.assertFalse(cache.put('a', (None, None), 'a', [], generation))
+        self.assertIsNone(cache.get('a'))
+
+
+class TestQueryServer(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, 'daemon.sock')
+        self.queries = []
+        self.server = daemon.QueryServer(self.path, self.run_query, daemon.ResultCache())
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.shutdown)
+
+    def run_query(self, argv):
+        self.queries.append(argv)
+        if argv[0] == 'fail':
+            logger.error("Query failed")
+            return None
+        print(f"{' '.join(argv)} row 1")
+        print(f"{' '.join(argv)} row 2")
+        logger.warning("Slow query")
+        return datetime(2021, 1, 1), datetime(2021, 1, 2)
+
+    def forward(self, *argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        self.assertTrue(daemon.forward_query(list(argv), stdout, stderr, self.path))
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_forward_query_caches_results(self):
+        expected = ("get --eq api row 1\nget --eq api row 2\n", "WARNING:test_daemon:Slow query\n")
+        self.assertEqual(self.forward('get', '--eq', 'api'), expected)
+        self.assertEqual(self.forward('get', '--eq', 'api'), expected)
+        self.assertEqual(len(self.queries), 1)
+        self.forward('get', '--eq', 'worker')
+        self.assertEqual(len(self.queries), 2)
+
+    def test_invalidate(self):
+        self.forward('get')
+        daemon.invalidate(datetime(2021, 3, 1), datetime(2021, 3, 2), self.path)
+        self.forward('get')
+        self.assertEqual(len(self.queries), 1)
+        daemon.invalidate(datetime(2021, 1, 1, 12), datetime(2021, 3, 2), self.path)
+        self.forward('get')
+        self.assertEqual(len(self.queries), 2)
+
+    def test_failed_queries_are_not_cached(self):
+        self.assertEqual(self.forward('fail'), ('', 'ERROR:test_daemon:Query failed\n'))
+        self.forward('fail')
+        self.assertEqual(len(self.queries), 2)
+
+    def test_rejects_other_targets(self):
+        with self.assertLogs('daemon', level='WARNING'):
+            self.assertFalse(self.server.process({'target': 'other', 'command': 'query', 'argv': ['get']},
+                                                 io.BytesIO()))
+        self.assertEqual(self.queries, [])
+
+    def test_is_running(self):
+        self.assertTrue(daemon.is_running(self.path))
+        self.assertFalse(daemon.is_running(self.path + '.missing'))
+
+    def test_socket_only_accessible_to_user(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_ignores_socket_of_other_user(self):
+        with patch('daemon.os.getuid', return_value=os.getuid() + 1):
+            with self.assertLogs('daemon', level='WARNING'):
+                self.assertFalse(daemon.is_running(self.path))
+            with self.assertLogs('daemon', level='WARNING'):
+                self.assertFalse(daemon.forward_query(['get'], io.StringIO(), io.StringIO(), self.path))
+            with self.assertRaises(RuntimeError):
+                daemon.serve(self.path, self.run_query, daemon.ResultCache())
+        self.assertEqual(self.queries, [])
+
+
+class TestWithoutDaemon(unittest.TestCase):
+    def test_forward_query_without_daemon(self):
+        stdout = io.StringIO()
+        self.assertFalse(daemon.forward_query(['get'], stdout, io.StringIO(), '/nonexistent/daemon.sock'))
+        self.assertEqual(stdout.getvalue(), '')
+
+    def test_invalidate_without_daemon(self):
+        daemon.invalidate(None, None, '/nonexistent/daemon.sock')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,26 @@
+from datetime import datetime
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
-from database import MongoDBClient
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+import database
+from database import BulkWriter, MongoDBClient
+from records import LogRecord
 
 
 class TestMongoDBClient(unittest.TestCase):
     def setUp(self):
         self.database = MongoDBClient()
 
+    def tearDown(self):
+        # The instance is a singleton, drop the connect mocks and the handles cached by the tests.
+        self.database.__dict__.pop('connect', None)
+        self.database.connection = None
+        self.database.db = None
+        self.database.collections = {}
+        self.database.timeseries = None
+
     def test_singleton_instance(self):
         first_instance = MongoDBClient()
         second_instance = MongoDBClient()
@@ -19,8 +33,26 @@ class TestMongoDBClient(unittest.TestCase):
 
         client = self.database.connect()
         self.assertIsNotNone(client)
-        mock_mongo_client.assert_called_once_with(mock_config.MONGODB_URI)
-        mock_mongo_client.return_value.admin.command.assert_called_with('ping')
+        mock_mongo_client.assert_called_once_with(
+            mock_config.MONGODB_URI,
+            maxPoolSize=mock_config.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=mock_config.MONGODB_MIN_POOL_SIZE,
+            heartbeatFrequencyMS=mock_config.MONGODB_HEARTBEAT_FREQUENCY_MS,
+            serverSelectionTimeoutMS=mock_config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=mock_config.MONGODB_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=mock_config.MONGODB_SOCKET_TIMEOUT_MS
+        )
+        mock_mongo_client.return_value.admin.command.assert_called_once_with('ping')
+
+    @patch('database.MongoClient')
+    @patch('database.config')
+    def test_connect_reuses_client_and_handles(self, mock_config, mock_mongo_client):
+        first_collection = self.database.get_collection('logs')
+        self.assertIs(self.database.connect(), mock_mongo_client.return_value)
+        self.assertIs(self.database.get_collection('logs'), first_collection)
+        mock_mongo_client.assert_called_once()
+        mock_mongo_client.return_value.admin.command.assert_called_once_with('ping')
+        mock_mongo_client.return_value.__getitem__.assert_called_once_with(mock_config.DATABASE_NAME)
 
     @patch('database.MongoClient')
     @patch('database.config')
@@ -28,7 +60,17 @@ class TestMongoDBClient(unittest.TestCase):
         mock_mongo_client.side_effect = Exception("Connection failure")
         client = self.database.connect()
         self.assertIsNone(client)
-        mock_mongo_client.assert_called_once_with(mock_config.MONGODB_URI)
+        mock_mongo_client.assert_called_once()
+        self.assertIsNone(self.database.get_collection())
+
+    @patch('database.MongoClient')
+    @patch('database.config')
+    def test_connect_ping_failure_closes_client(self, mock_config, mock_mongo_client):
+        mock_mongo_client.return_value.admin.command.side_effect = Exception("Server selection timeout")
+        self.assertIsNone(self.database.connect())
+        mock_mongo_client.return_value.close.assert_called_once()
+        self.assertIsNone(self.database.connect())
+        self.assertEqual(mock_mongo_client.return_value.close.call_count, 2)
 
     @patch('database.MongoClient')
     def test_insert_data_success(self, mock_mongo_client):
@@ -37,13 +79,14 @@ class TestMongoDBClient(unittest.TestCase):
         mock_mongo_client.return_value.__getitem__.return_value = mock_db
         mock_db.__getitem__.return_value = mock_collection
 
-        mock_collection.insert_many.return_value = MagicMock()
+        mock_collection.insert_many.return_value.inserted_ids = ['id']
 
         data = [{'key': 'value'}]
         self.database.connect = MagicMock(return_value=mock_mongo_client.return_value)
-        self.database.insert_data(data)
+        inserted = self.database.insert_data(data)
 
-        mock_collection.insert_many.assert_called_once_with(data)
+        mock_collection.insert_many.assert_called_once_with(data, ordered=True)
+        self.assertEqual(inserted, 1)
 
     @patch('database.MongoClient')
     def test_insert_data_failure(self, mock_mongo_client):
@@ -55,9 +98,293 @@ class TestMongoDBClient(unittest.TestCase):
 
         data = [{'key': 'value'}]
         self.database.connect = MagicMock(return_value=mock_mongo_client.return_value)
-        self.database.insert_data(data)
+        inserted = self.database.insert_data(data)
+
+        mock_collection.insert_many.assert_called_once_with(data, ordered=True)
+        self.assertIsNone(inserted)
+
+
+    def mock_collection(self):
+        mock_client = MagicMock()
+        mock_collection = mock_client.__getitem__.return_value.__getitem__.return_value
+        self.database.connect = MagicMock(return_value=mock_client)
+        return mock_collection
+
+    def test_ensure_indexes(self):
+        mock_collection = self.mock_collection()
+        mock_collection.create_indexes.return_value = ['datetime_1']
+        self.assertEqual(self.database.ensure_indexes(), ['datetime_1'])
+        mock_collection.create_indexes.assert_called_once_with(MongoDBClient.INDEXES)
+        names = [index.document['name'] for index in MongoDBClient.INDEXES]
+        self.assertIn('service_1_severity_1_datetime_1', names)
+        self.assertIn('message_1', names)
+
+    def test_ensure_indexes_failure(self):
+        mock_collection = self.mock_collection()
+        mock_collection.create_indexes.side_effect = Exception("Index failure")
+        self.assertIsNone(self.database.ensure_indexes())
+
+    def test_insert_data_unordered_skips_duplicates(self):
+        mock_collection = self.mock_collection()
+        mock_collection.insert_many.side_effect = BulkWriteError({
+            'nInserted': 1, 'writeErrors': [{'index': 1, 'code': 11000, 'errmsg': 'duplicate key'}]})
+        self.assertEqual(self.database.insert_data([{'_id': 1}, {'_id': 2}], ordered=False), 1)
+        mock_collection.insert_many.assert_called_once_with([{'_id': 1}, {'_id': 2}], ordered=False)
+
+    def test_insert_data_unordered_other_errors(self):
+        mock_collection = self.mock_collection()
+        mock_collection.insert_many.side_effect = BulkWriteError({
+            'nInserted': 1, 'writeErrors': [{'index': 1, 'code': 121, 'errmsg': 'validation failed'}]})
+        self.assertIsNone(self.database.insert_data([{'_id': 1}, {'_id': 2}], ordered=False))
+
+    def test_insert_data_write_concern(self):
+        mock_collection = self.mock_collection()
+        write_concern = WriteConcern(w='majority')
+        mock_collection.with_options.return_value.insert_many.return_value.inserted_ids = [1]
+        self.assertEqual(self.database.insert_data([{'_id': 1}], ordered=False, write_concern=write_concern), 1)
+        mock_collection.with_options.assert_called_once_with(write_concern=write_concern)
+
+    def test_is_timeseries(self):
+        mock_client = MagicMock()
+        self.database.connect = MagicMock(return_value=mock_client)
+        mock_client.__getitem__.return_value.list_collections.return_value = iter([{'name': 'logs',
+                                                                                      'type': 'timeseries'}])
+        self.assertTrue(self.database.is_timeseries())
+        self.assertTrue(self.database.is_timeseries())
+        mock_client.__getitem__.return_value.list_collections.assert_called_once()
+
+    def test_insert_data_converts_log_records(self):
+        mock_collection = self.mock_collection()
+        self.database.timeseries = False
+        mock_collection.insert_many.return_value.inserted_ids = [1]
+        record = LogRecord(datetime(2021, 1, 1), 'api', 'INFO', 'Message', _id=1)
+        self.assertEqual(self.database.insert_data([record]), 1)
+        mock_collection.insert_many.assert_called_once_with(
+            [{'datetime': datetime(2021, 1, 1), 'service': 'api', 'severity': 'INFO', 'message': 'Message', '_id': 1}],
+            ordered=True)
+
+    def test_insert_data_timeseries(self):
+        mock_collection = self.mock_collection()
+        self.database.timeseries = True
+        mock_collection.insert_many.return_value.inserted_ids = [1]
+        self.database.insert_data([{'_id': 1, 'datetime': 0, 'service': 'api', 'severity': 'INFO', 'message': 'm'}])
+        mock_collection.insert_many.assert_called_once_with(
+            [{'_id': 1, 'datetime': 0, 'meta': {'service': 'api', 'severity': 'INFO'}, 'message': 'm'}], ordered=True)
+
+    def test_find_data_timeseries(self):
+        mock_collection = self.mock_collection()
+        self.database.timeseries = True
+        query = {'$and': [{'service': {'$eq': 'api'}}, {'datetime': {'$gt': 0}}]}
+        self.database.find_data(query, projection={'_id': 0}, sort=[('severity', -1)], batch_size=10)
+        mock_collection.find.assert_called_once_with(
+            {'$and': [{'meta.service': {'$eq': 'api'}}, {'datetime': {'$gt': 0}}]},
+            {'datetime': 1, 'service': '$meta.service', 'severity': '$meta.severity', 'message': 1, '_id': 0},
+            skip=0, limit=0, batch_size=10)
+        mock_collection.find.return_value.sort.assert_called_once_with([('meta.severity', -1)])
+
+    def test_find_data_timeseries_after(self):
+        mock_collection = self.mock_collection()
+        self.database.timeseries = True
+        mock_collection.find_one.return_value = {'_id': 5, 'service': 'api'}
+        self.database.find_data({}, projection={'message': 1}, sort=[('service', 1)], after=5)
+        mock_collection.find_one.assert_called_once_with({'_id': 5}, {'service': '$meta.service'})
+        mock_collection.find.assert_called_once_with(
+            {'$and': [{}, {'$or': [{'meta.service': {'$gt': 'api'}}, {'meta.service': 'api', '_id': {'$gt': 5}}]}]},
+            {'message': 1}, skip=0, limit=0, batch_size=1000)
+
+    def test_aggregate_data_timeseries(self):
+        mock_collection = self.mock_collection()
+        self.database.timeseries = True
+        mock_collection.aggregate.return_value = iter([])
+        group = {'$group': {'_id': {'service': '$service'}, 'count': {'$sum': 1}}}
+        self.database.aggregate_data([{'$match': {'severity': {'$eq': 'ERROR'}}}, group])
+        mock_collection.aggregate.assert_called_once_with([
+            {'$match': {'meta.severity': {'$eq': 'ERROR'}}},
+            {'$set': {'service': '$meta.service', 'severity': '$meta.severity'}},
+            group
+        ], allowDiskUse=True)
+
+    @patch('database.config')
+    def test_migrate_to_timeseries(self, mock_config):
+        mock_config.COLLECTION_NAME = 'logs'
+        mock_config.TIMESERIES_GRANULARITY = 'seconds'
+        self.database.timeseries = False
+        mock_client = MagicMock()
+        self.database.connect = MagicMock(return_value=mock_client)
+        db = MagicMock()
+        mock_client.__getitem__.return_value = db
+        collections = {'logs': MagicMock(), 'logs_standard': MagicMock()}
+        db.__getitem__.side_effect = collections.get
+        db.list_collection_names.return_value = ['logs']
+        collections['logs_standard'].find.return_value = [
+            {'_id': i, 'datetime': i, 'service': 'api', 'severity': 'INFO', 'message': 'm'} for i in range(3)]
+        collections['logs'].insert_many.side_effect = lambda batch, ordered: MagicMock(inserted_ids=batch)
+
+        self.assertEqual(self.database.migrate_to_timeseries(batch_size=2), 3)
+        collections['logs'].rename.assert_called_once_with('logs_standard')
+        db.create_collection.assert_called_once_with('logs', timeseries={
+            'timeField': 'datetime', 'metaField': 'meta', 'granularity': 'seconds'})
+        batches = [call.args[0] for call in collections['logs'].insert_many.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertEqual(batches[1][0]['meta'], {'service': 'api', 'severity': 'INFO'})
+        self.assertTrue(self.database.is_timeseries())
+        self.assertEqual(self.database.declared_indexes(), MongoDBClient.TIMESERIES_INDEXES)
+
+    @patch('database.config')
+    def test_migrate_to_timeseries_existing_backup(self, mock_config):
+        mock_config.COLLECTION_NAME = 'logs'
+        self.database.timeseries = False
+        mock_client = MagicMock()
+        self.database.connect = MagicMock(return_value=mock_client)
+        mock_client.__getitem__.return_value.list_collection_names.return_value = ['logs', 'logs_standard']
+        self.assertIsNone(self.database.migrate_to_timeseries())
+        mock_client.__getitem__.return_value.create_collection.assert_not_called()
+
+    def test_manifest_entries(self):
+        mock_collection = self.mock_collection()
+        mock_collection.find_one.return_value = {'_id': 'abc', 'type': 'chunk'}
+        self.assertEqual(self.database.get_manifest_entry({'_id': 'abc'}), {'_id': 'abc', 'type': 'chunk'})
+        mock_collection.find_one.assert_called_once_with({'_id': 'abc'})
+        self.assertTrue(self.database.save_manifest_entry({'_id': 'abc', 'type': 'chunk'}))
+        mock_collection.replace_one.assert_called_once_with({'_id': 'abc'}, {'_id': 'abc', 'type': 'chunk'},
+                                                            upsert=True)
+
+    def test_drop_indexes_only_drops_declared_indexes(self):
+        mock_collection = self.mock_collection()
+        mock_collection.list_indexes.return_value = [{'name': '_id_'}, {'name': 'datetime_1'}, {'name': 'custom'}]
+        self.assertEqual(self.database.drop_indexes(), ['datetime_1'])
+        mock_collection.drop_index.assert_called_once_with('datetime_1')
+
+    def test_drop_indexes_drops_replaced_indexes(self):
+        mock_collection = self.mock_collection()
+        mock_collection.list_indexes.return_value = [{'name': '_id_'}, {'name': 'message_hashed'}]
+        self.assertEqual(self.database.drop_indexes(), ['message_hashed'])
+
+    def test_explain_query(self):
+        mock_collection = self.mock_collection()
+        mock_collection.find.return_value.explain.return_value = {'queryPlanner': {}}
+        self.assertEqual(self.database.explain_query({'service': {'$eq': 'api'}}), {'queryPlanner': {}})
+        mock_collection.find.assert_called_once_with({'service': {'$eq': 'api'}}, None, skip=0, limit=0,
+                                                     batch_size=1000)
+
+    def test_aggregate_data(self):
+        mock_collection = self.mock_collection()
+        mock_collection.aggregate.return_value = iter([{'_id': {'service': 'api'}, 'count': 1}])
+        pipeline = [{'$group': {'_id': {'service': '$service'}, 'count': {'$sum': 1}}}]
+        self.assertEqual(self.database.aggregate_data(pipeline), [{'_id': {'service': 'api'}, 'count': 1}])
+        mock_collection.aggregate.assert_called_once_with(pipeline, allowDiskUse=True)
+
+    def test_aggregate_data_failure(self):
+        mock_collection = self.mock_collection()
+        mock_collection.aggregate.side_effect = Exception("Aggregation failure")
+        self.assertIsNone(self.database.aggregate_data([]))
+
+    def test_aggregate_data_other_collection_not_rewritten(self):
+        mock_collection = self.mock_collection()
+        self.database.timeseries = True
+        mock_collection.aggregate.return_value = iter([])
+        pipeline = [{'$match': {'severity': {'$eq': 'ERROR'}}}]
+        self.database.aggregate_data(pipeline, 'logs_hourly')
+        mock_collection.aggregate.assert_called_once_with(pipeline, allowDiskUse=True)
+
+    def test_delete_data(self):
+        mock_collection = self.mock_collection()
+        mock_collection.delete_many.return_value.deleted_count = 3
+        self.assertEqual(self.database.delete_data({'datetime': {'$lt': 1}}), 3)
+        mock_collection.delete_many.assert_called_once_with({'datetime': {'$lt': 1}})
+
+    def test_supports_delete(self):
+        mock_client = MagicMock()
+        self.database.connect = MagicMock(return_value=mock_client)
+        self.database.timeseries = False
+        self.assertTrue(self.database.supports_delete())
+        mock_client.server_info.assert_not_called()
+        self.database.timeseries = True
+        mock_client.server_info.return_value = {'versionArray': [7, 0, 2, 0]}
+        self.assertTrue(self.database.supports_delete())
+        mock_client.server_info.return_value = {'versionArray': [6, 0, 14, 0]}
+        with self.assertLogs('database', level='ERROR') as logs:
+            self.assertFalse(self.database.supports_delete())
+        self.assertIn("needs MongoDB 7.0 or newer, the server runs 6.0", logs.output[0])
+
+    def test_delete_data_timeseries(self):
+        mock_collection = self.mock_collection()
+        self.database.timeseries = True
+        self.database.delete_data({'severity': {'$in': ['DEBUG']}})
+        mock_collection.delete_many.assert_called_once_with({'meta.severity': {'$in': ['DEBUG']}})
+
+    def test_delete_data_failure(self):
+        mock_collection = self.mock_collection()
+        mock_collection.delete_many.side_effect = Exception("Delete failure")
+        with self.assertLogs('database', level='ERROR'):
+            self.assertIsNone(self.database.delete_data({}))
+
+    def test_find_data_streams_single_cursor(self):
+        mock_collection = self.mock_collection()
+        cursor = self.database.find_data({'service': {'$eq': 'api'}}, projection={'message': 1}, limit=5, batch_size=10)
+        self.assertIs(cursor, mock_collection.find.return_value.sort.return_value)
+        mock_collection.find.assert_called_once_with({'service': {'$eq': 'api'}}, {'message': 1}, skip=0, limit=5,
+                                                     batch_size=10)
+        mock_collection.find.return_value.sort.assert_called_once_with([('_id', 1)])
+        mock_collection.count_documents.assert_not_called()
+
+    def test_find_data_sort(self):
+        mock_collection = self.mock_collection()
+        cursor = self.database.find_data({'service': {'$eq': 'api'}}, sort=[('datetime', -1)])
+        mock_collection.find.return_value.sort.assert_called_once_with([('datetime', -1)])
+        self.assertIs(cursor, mock_collection.find.return_value.sort.return_value)
+
+    def test_find_data_after_without_sort(self):
+        mock_collection = self.mock_collection()
+        self.database.find_data({'service': {'$eq': 'api'}}, after='id')
+        query = mock_collection.find.call_args.args[0]
+        self.assertEqual(query, {'$and': [{'service': {'$eq': 'api'}}, {'_id': {'$gt': 'id'}}]})
+        mock_collection.find.return_value.sort.assert_called_once_with([('_id', 1)])
+
+    def test_find_data_after_with_sort(self):
+        mock_collection = self.mock_collection()
+        mock_collection.find_one.return_value = {'_id': 'id', 'datetime': 'anchor'}
+        self.database.find_data({'service': {'$eq': 'api'}}, sort=[('datetime', -1)], after='id')
+        mock_collection.find_one.assert_called_once_with({'_id': 'id'}, {'datetime': 1})
+        query = mock_collection.find.call_args.args[0]
+        self.assertEqual(query['$and'][1], {'$or': [
+            {'datetime': {'$lt': 'anchor'}},
+            {'datetime': 'anchor', '_id': {'$gt': 'id'}}
+        ]})
+        mock_collection.find.return_value.sort.assert_called_once_with([('datetime', -1), ('_id', 1)])
+
+    def test_find_data_after_unknown_id(self):
+        mock_collection = self.mock_collection()
+        mock_collection.find_one.return_value = None
+        self.assertIsNone(self.database.find_data({'service': {'$eq': 'api'}}, sort=[('datetime', 1)], after='id'))
+
+
+
+class TestBulkWriter(unittest.TestCase):
+    def test_submit_applies_backpressure(self):
+        release = threading.Event()
+        mock_client = MagicMock()
+        mock_client.insert_data.side_effect = lambda batch, **kwargs: release.wait() and len(batch)
+        writer = BulkWriter(mock_client, writers=1, max_pending=2)
+        futures = [writer.submit([{'_id': 1}]), writer.submit([{'_id': 2}, {'_id': 3}])]
+
+        blocked = threading.Thread(target=lambda: futures.append(writer.submit([{'_id': 4}])))
+        blocked.start()
+        blocked.join(timeout=0.1)
+        self.assertTrue(blocked.is_alive())
+
+        release.set()
+        blocked.join()
+        self.assertEqual([future.result() for future in futures], [1, 2, 1])
+        writer.close()
+        mock_client.insert_data.assert_called_with([{'_id': 4}], ordered=False, write_concern=None)
 
-        mock_collection.insert_many.assert_called_once_with(data)
+    def test_failed_batch(self):
+        mock_client = MagicMock()
+        mock_client.insert_data.return_value = None
+        with BulkWriter(mock_client, writers=2, max_pending=4) as writer:
+            future = writer.submit([{'_id': 1}])
+        self.assertIsNone(future.result())
 
 
 if __name__ == '__main__':
@@ -1,8 +1,44 @@
+import bz2
+import gzip
+import io
+import json
+import os
+import tempfile
 import unittest
 from datetime import datetime
-from unittest.mock import mock_open, patch
+from argparse import ArgumentTypeError, Namespace
+from unittest.mock import MagicMock, patch
 
 import logs_tool
+import snapshot
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+
+class TestParseTimestamp(unittest.TestCase):
+    def test_parse_timestamp_fixed_width(self):
+        self.assertEqual(logs_tool.parse_timestamp("2021-01-01 12:00:00,123"), datetime(2021, 1, 1, 12, 0, 0, 123000))
+
+    def test_parse_timestamp_same_second_reuses_prefix(self):
+        first = logs_tool.parse_timestamp("2021-01-01 12:00:00,123")
+        second = logs_tool.parse_timestamp("2021-01-01 12:00:00,456")
+        third = logs_tool.parse_timestamp("2021-01-01 12:00:01,000")
+        self.assertEqual(first, datetime(2021, 1, 1, 12, 0, 0, 123000))
+        self.assertEqual(second, datetime(2021, 1, 1, 12, 0, 0, 456000))
+        self.assertEqual(third, datetime(2021, 1, 1, 12, 0, 1))
+
+    def test_parse_timestamp_falls_back_to_strptime(self):
+        self.assertEqual(logs_tool.parse_timestamp("2021-01-01 12:00:00,5"), datetime(2021, 1, 1, 12, 0, 0, 500000))
+        self.assertEqual(logs_tool.parse_timestamp("2021-1-1 12:00:00,123456"), datetime(2021, 1, 1, 12, 0, 0, 123456))
+
+    def test_parse_timestamp_invalid(self):
+        for timestamp in ("2021:01-01 12:00:00,123", "2021-13-01 12:00:00,123", "2021-01-01 12:00:00,12a", ""):
+            with self.subTest(timestamp=timestamp):
+                with self.assertRaises(ValueError):
+                    logs_tool.parse_timestamp(timestamp)
 
 
 class TestParseLogLine(unittest.TestCase):
@@ -15,7 +51,7 @@ class TestParseLogLine(unittest.TestCase):
             'message': 'This is a test message'
         }
         result = logs_tool.parse_log_line(line)
-        self.assertEqual(result, expected_result)
+        self.assertEqual(result.as_document(), expected_result)
 
     def test_parse_log_line_message_with_split_signs(self):
         line = "2021-01-01 12:00:00,123 - TestService - INFO - This is a test message - and this is also message"
@@ -26,7 +62,17 @@ class TestParseLogLine(unittest.TestCase):
             'message': 'This is a test message - and this is also message'
         }
         result = logs_tool.parse_log_line(line)
-        self.assertEqual(result, expected_result)
+        self.assertEqual(result.as_document(), expected_result)
+
+    def test_parse_log_line_interns_service_and_severity(self):
+        first = logs_tool.parse_log_line("2021-01-01 12:00:00,123 - TestService - INFO - Message one")
+        second = logs_tool.parse_log_line("2021-01-01 12:00:01,456 - " + "Test" + "Service - IN" + "FO - Message two")
+        self.assertIs(first.service, second.service)
+        self.assertIs(first.severity, second.severity)
+        self.assertEqual(first['message'], 'Message one')
+        self.assertIsNone(first.get('_id'))
+        with self.assertRaises(KeyError):
+            first['_id']
 
     def test_parse_log_line_malformed(self):
         line = "Malformed log line"
@@ -87,31 +133,824 @@ class TestParseLogFile(unittest.TestCase):
             self.assertEqual(result, None)
 
 
-class TestReadLogFile(unittest.TestCase):
-    def test_read_log_file_valid(self):
-        file_data = "First line\nSecond line\nThird line"
-        m = mock_open(read_data=file_data)
-        with patch('builtins.open', m):
-            result = logs_tool.read_log_file('dummy_path')
-        self.assertEqual(['First line\n', 'Second line\n', 'Third line'], result)
-
-    def test_read_log_file_not_found_error(self):
-        with patch('builtins.open', mock_open()) as mocked_open:
-            mocked_open.side_effect = FileNotFoundError()
-            result = logs_tool.read_log_file('fake_path')
-            self.assertIsNone(result)
-
-    def test_read_log_file_permission_error(self):
-        with patch('builtins.open', mock_open()) as mocked_open:
-            mocked_open.side_effect = PermissionError()
-            result = logs_tool.read_log_file('fake_path')
-            self.assertIsNone(result)
-
-    def test_read_log_file_generic_exception(self):
-        with patch('builtins.open', mock_open()) as mocked_open:
-            mocked_open.side_effect = Exception('Unexpected error')
-            result = logs_tool.read_log_file('fake_path')
-            self.assertIsNone(result)
+class TestIterLogEntries(unittest.TestCase):
+    def test_iter_log_entries_skips_blank_lines(self):
+        lines = [
+            "2021-01-01 12:00:00,123 - TestService - INFO - Message one\n",
+            "\n",
+            "2021-01-01 12:01:00,456 - TestService - ERROR - Message two\n"
+        ]
+        result = list(logs_tool.iter_log_entries(lines))
+        self.assertEqual([entry['message'] for entry in result], ['Message one', 'Message two'])
+
+    def test_iter_log_entries_is_lazy(self):
+        lines = iter([
+            "2021-01-01 12:00:00,123 - TestService - INFO - Message one\n",
+            "Malformed log line\n"
+        ])
+        entries = logs_tool.iter_log_entries(lines)
+        self.assertEqual(next(entries)['message'], 'Message one')
+        with self.assertRaises(ValueError) as context:
+            next(entries)
+        self.assertIn("Error parsing line 2", str(context.exception))
+
+
+class TestBatchLogs(unittest.TestCase):
+    def test_batch_logs(self):
+        self.assertEqual(list(logs_tool.batch_logs(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_batch_logs_empty(self):
+        self.assertEqual(list(logs_tool.batch_logs([], 2)), [])
+
+
+def insert_without_duplicates(inserted_ids):
+    def insert_data(batch, ordered=True, write_concern=None):
+        new_ids = {entry['_id'] for entry in batch} - inserted_ids
+        inserted_ids.update(new_ids)
+        return len(new_ids)
+    return insert_data
+
+
+def use_manifest(mock_client, manifest):
+    def get_manifest_entry(query):
+        return next((entry for entry in manifest.values()
+                     if all(entry.get(key) == value for key, value in query.items())), None)
+
+    def save_manifest_entry(entry):
+        manifest[entry['_id']] = entry
+        return True
+
+    mock_client.get_manifest_entry.side_effect = get_manifest_entry
+    mock_client.save_manifest_entry.side_effect = save_manifest_entry
+
+
+class TestAddLogs(unittest.TestCase):
+    lines = [
+        "2021-01-01 12:00:00,123 - TestService - INFO - Message one\n",
+        "2021-01-01 12:01:00,456 - TestService - ERROR - Message two\n",
+        "2021-01-01 12:02:00,789 - TestService - DEBUG - Message three\n"
+    ]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, 'app.log')
+        with open(self.path, 'w') as file:
+            file.writelines(self.lines)
+        self.inserted_ids = set()
+        self.manifest = {}
+        patcher = patch('logs_tool.database.MongoDBClient')
+        self.mock_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.mock_client.insert_data.side_effect = insert_without_duplicates(self.inserted_ids)
+        use_manifest(self.mock_client, self.manifest)
+
+    def make_args(self, **kwargs):
+        defaults = {'file': [self.path], 'batch_size': 2, 'workers': 1, 'chunk_size': logs_tool.DEFAULT_CHUNK_SIZE,
+                    'writers': 1, 'queue_size': 0, 'write_concern': None, 'incremental': False, 'follow': False}
+        return Namespace(**{**defaults, **kwargs})
+
+    def inserted_batches(self):
+        return [call.args[0] for call in self.mock_client.insert_data.call_args_list]
+
+    def test_add_logs_inserts_in_batches(self):
+        logs_tool.add_logs(self.make_args())
+        batches = self.inserted_batches()
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertEqual(batches[1][0]['message'], 'Message three')
+        self.mock_client.insert_data.assert_called_with(batches[1], ordered=False, write_concern=None)
+        self.assertEqual(len(self.inserted_ids), 3)
+
+    def test_add_logs_keeps_repeated_lines(self):
+        heartbeat = "2021-01-01 12:05:00,000 - TestService - INFO - Heartbeat\n"
+        with open(self.path, 'w') as file:
+            file.writelines(self.lines[:1] + [heartbeat] * 3)
+        logs_tool.add_logs(self.make_args(chunk_size=1))
+        self.assertEqual(len(self.inserted_ids), 4)
+        self.manifest.clear()
+        logs_tool.add_logs(self.make_args(batch_size=10))
+        self.assertEqual(len(self.inserted_ids), 4)
+
+    def test_add_logs_skips_added_file(self):
+        logs_tool.add_logs(self.make_args())
+        logs_tool.add_logs(self.make_args())
+        self.assertEqual(self.mock_client.insert_data.call_count, 2)
+        self.assertEqual(sorted(entry['type'] for entry in self.manifest.values()), ['chunk', 'file'])
+
+    def test_add_logs_skips_added_chunks(self):
+        logs_tool.add_logs(self.make_args(chunk_size=1))
+        with open(self.path, 'a') as file:
+            file.write("2021-01-01 12:03:00,000 - TestService - INFO - Message four\n")
+        logs_tool.add_logs(self.make_args(chunk_size=1))
+        self.assertEqual([entry['message'] for entry in self.inserted_batches()[-1]], ['Message four'])
+        self.assertEqual(len(self.inserted_ids), 4)
+
+    def test_add_logs_resumes_after_insert_failure(self):
+        insert_results = iter([insert_without_duplicates(self.inserted_ids), lambda batch, **kwargs: None])
+        self.mock_client.insert_data.side_effect = lambda batch, **kwargs: next(insert_results)(batch, **kwargs)
+        logs_tool.add_logs(self.make_args(chunk_size=1))
+        self.assertEqual(len(self.manifest), 1)
+
+        self.mock_client.insert_data.side_effect = insert_without_duplicates(self.inserted_ids)
+        logs_tool.add_logs(self.make_args(chunk_size=1))
+        self.assertEqual(len(self.inserted_ids), 3)
+        self.assertEqual(len(self.manifest), 4)
+
+    def test_add_logs_stops_on_parse_error(self):
+        with open(self.path, 'w') as file:
+            file.writelines(self.lines[:1] + ["Malformed log line\n"] + self.lines[1:])
+        with self.assertLogs('logs_tool', level='ERROR') as logs:
+            logs_tool.add_logs(self.make_args(batch_size=1))
+        self.assertEqual(self.mock_client.insert_data.call_count, 1)
+        self.assertIn("Error parsing line at byte 59", logs.output[0])
+
+    def test_add_logs_multiple_files(self):
+        second_path = os.path.join(self.tmp_dir.name, 'other.log')
+        with open(second_path, 'w') as file:
+            file.write("2021-01-01 12:03:00,000 - OtherService - INFO - Message four\n")
+        logs_tool.add_logs(self.make_args(file=[self.path, second_path], batch_size=10))
+        self.assertEqual([len(batch) for batch in self.inserted_batches()], [3, 1])
+
+    def test_add_logs_with_workers(self):
+        logs_tool.add_logs(self.make_args(workers=2, chunk_size=64, batch_size=10))
+        entries = [entry for batch in self.inserted_batches() for entry in batch]
+        self.assertEqual([entry['message'] for entry in entries], ['Message one', 'Message two', 'Message three'])
+
+    def test_add_logs_with_writers(self):
+        write_concern = logs_tool.write_concern('majority,j')
+        logs_tool.add_logs(self.make_args(chunk_size=1, batch_size=1, writers=3, queue_size=1,
+                                          write_concern=write_concern))
+        self.assertEqual(len(self.inserted_ids), 3)
+        self.assertEqual(len(self.manifest), 4)
+        for call in self.mock_client.insert_data.call_args_list:
+            self.assertEqual(call.kwargs, {'ordered': False, 'write_concern': write_concern})
+
+    def test_write_concern(self):
+        self.assertEqual(logs_tool.write_concern('2').document, {'w': 2})
+        self.assertEqual(logs_tool.write_concern('majority,j').document, {'w': 'majority', 'j': True})
+        for value in ('', 'majority,x', '0,j'):
+            with self.subTest(value=value):
+                with self.assertRaises(ArgumentTypeError):
+                    logs_tool.write_concern(value)
+
+    def test_add_logs_compressed_file(self):
+        compressed_path = os.path.join(self.tmp_dir.name, 'app.log.1')
+        with open(compressed_path, 'wb') as file:
+            file.write(bz2.compress(''.join(self.lines).encode('utf-8')))
+        logs_tool.add_logs(self.make_args(file=[compressed_path], chunk_size=64, batch_size=10))
+        entries = [entry for batch in self.inserted_batches() for entry in batch]
+        self.assertEqual([entry['message'] for entry in entries], ['Message one', 'Message two', 'Message three'])
+
+    def test_add_logs_stdin(self):
+        stdin = MagicMock(buffer=io.BytesIO(gzip.compress(''.join(self.lines).encode('utf-8'))))
+        with patch('compression.sys.stdin', stdin):
+            logs_tool.add_logs(self.make_args(file=['-'], batch_size=10))
+            logs_tool.add_logs(self.make_args(file=['-'], batch_size=10))
+        self.assertEqual([len(batch) for batch in self.inserted_batches()], [3])
+        self.assertEqual([entry['path'] for entry in self.manifest.values()], ['-'])
+
+    @patch('logs_tool.daemon')
+    def test_add_logs_invalidates_daemon_cache(self, mock_daemon):
+        mock_daemon.is_running.return_value = True
+        logs_tool.add_logs(self.make_args())
+        mock_daemon.invalidate.assert_called_once_with(datetime(2021, 1, 1, 12, 0, 0, 123000),
+                                                       datetime(2021, 1, 1, 12, 2, 0, 789000),
+                                                       logs_tool.config.SOCKET_PATH)
+
+    @patch('logs_tool.daemon')
+    def test_add_logs_without_daemon(self, mock_daemon):
+        mock_daemon.is_running.return_value = False
+        logs_tool.add_logs(self.make_args())
+        mock_daemon.invalidate.assert_not_called()
+
+    def test_add_logs_missing_file(self):
+        with self.assertLogs('logs_tool', level='ERROR'):
+            logs_tool.add_logs(self.make_args(file=[os.path.join(self.tmp_dir.name, 'missing.log')]))
+        self.mock_client.insert_data.assert_not_called()
+
+
+class TestLogChunks(unittest.TestCase):
+    lines = [f"2021-01-01 12:00:{i:02d},{i:03d} - Service{i % 3} - INFO - Message {i} - part\n" for i in range(40)]
+
+    def test_content_id(self):
+        entries = logs_tool.parse_log_file(self.lines[:2] + self.lines[:1])
+        ids = [logs_tool.content_id(entry, 0) for entry in entries]
+        self.assertIsInstance(ids[0], logs_tool.ObjectId)
+        self.assertNotEqual(ids[0], ids[1])
+        self.assertEqual(ids[0], ids[2])
+        self.assertNotEqual(ids[0], logs_tool.content_id(entries[2], 100))
+
+    def test_chunk_ids_do_not_depend_on_chunk_size(self):
+        data = ''.join(self.lines[:3] * 3).encode('utf-8')
+        ids = {}
+        for chunk_size in (1, 100, 10 ** 6):
+            ids[chunk_size] = [entry._id for offset, chunk in logs_tool.iter_log_chunks(io.BytesIO(data), chunk_size)
+                               for entry in logs_tool.parse_log_chunk('app.log', offset, chunk)]
+        self.assertEqual(len(set(ids[1])), 9)
+        self.assertEqual(ids[1], ids[100])
+        self.assertEqual(ids[1], ids[10 ** 6])
+
+    def test_iter_log_chunks_aligns_to_lines(self):
+        data = ''.join(self.lines).encode('utf-8')
+        expected = logs_tool.parse_log_file(self.lines)
+        for chunk_size in (1, 7, 64, 100, 10 ** 6):
+            with self.subTest(chunk_size=chunk_size):
+                chunks = list(logs_tool.iter_log_chunks(io.BytesIO(data), chunk_size))
+                self.assertEqual(b''.join(chunk for _, chunk in chunks), data)
+                self.assertTrue(all(chunk.endswith(b'\n') for _, chunk in chunks))
+                entries = [entry for offset, chunk in chunks
+                           for entry in logs_tool.parse_log_chunk('app.log', offset, chunk)]
+                for entry in entries:
+                    entry._id = None
+                self.assertEqual(entries, expected)
+
+    def test_parse_log_chunk_malformed_line(self):
+        with self.assertRaises(ValueError) as context:
+            logs_tool.parse_log_chunk('app.log', 100, self.lines[0].encode('utf-8') + b"Malformed log line\n")
+        self.assertIn("app.log: Error parsing line at byte 161", str(context.exception))
+
+    def test_expand_log_paths(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'app.log')
+            second_path = os.path.join(tmp_dir, 'app.log.1')
+            for file_path in (path, second_path):
+                open(file_path, 'w').close()
+            missing_path = os.path.join(tmp_dir, 'missing.log')
+            result = logs_tool.expand_log_paths([os.path.join(tmp_dir, 'app.log*'), missing_path])
+        self.assertEqual(result, [path, second_path, missing_path])
+
+
+class TestIncrementalAdd(unittest.TestCase):
+    lines = [
+        "2021-01-01 12:00:00,123 - TestService - INFO - Message one\n",
+        "2021-01-01 12:01:00,456 - TestService - ERROR - Message two\n",
+        "2021-01-01 12:02:00,789 - TestService - DEBUG - Message three\n"
+    ]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, 'app.log')
+        self.args = Namespace(file=[self.path], batch_size=2, workers=1, incremental=True, follow=False,
+                              state_file=os.path.join(self.tmp_dir.name, 'state.json'), poll_interval=0)
+
+    def write(self, text, mode='a'):
+        with open(self.path, mode) as file:
+            file.write(text)
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_add_logs_incremental_only_adds_new_lines(self, mock_client):
+        mock_client.return_value.insert_data.side_effect = insert_without_duplicates(set())
+        self.write(''.join(self.lines[:2]) + "2021-01-01 12:02:00,789 - Test", mode='w')
+        logs_tool.add_logs(self.args)
+        self.assertEqual(mock_client.return_value.insert_data.call_count, 1)
+
+        self.write("Service - DEBUG - Message three\n")
+        logs_tool.add_logs(self.args)
+        self.assertEqual(mock_client.return_value.insert_data.call_count, 2)
+        last_batch = mock_client.return_value.insert_data.call_args.args[0]
+        self.assertEqual([entry['message'] for entry in last_batch], ['Message three'])
+
+        logs_tool.add_logs(self.args)
+        self.assertEqual(mock_client.return_value.insert_data.call_count, 2)
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_add_logs_incremental_rejects_compressed_file(self, mock_client):
+        with gzip.open(self.path, 'wt') as file:
+            file.write(''.join(self.lines))
+        with self.assertLogs('logs_tool', level='ERROR') as logs:
+            logs_tool.add_logs(self.args)
+        self.assertIn("compressed files cannot be added incrementally", logs.output[0])
+        mock_client.return_value.insert_data.assert_not_called()
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_add_logs_incremental_truncated_file(self, mock_client):
+        mock_client.return_value.insert_data.side_effect = insert_without_duplicates(set())
+        self.write(''.join(self.lines), mode='w')
+        logs_tool.add_logs(self.args)
+        self.write(self.lines[2], mode='w')
+        logs_tool.add_logs(self.args)
+        last_batch = mock_client.return_value.insert_data.call_args.args[0]
+        self.assertEqual([entry['message'] for entry in last_batch], ['Message three'])
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_add_logs_incremental_insert_failure_keeps_checkpoint(self, mock_client):
+        mock_client.return_value.insert_data.side_effect = [2, None, 1]
+        self.write(''.join(self.lines), mode='w')
+        logs_tool.add_logs(self.args)
+        logs_tool.add_logs(self.args)
+        last_batch = mock_client.return_value.insert_data.call_args.args[0]
+        self.assertEqual([entry['message'] for entry in last_batch], ['Message three'])
+
+    def test_iter_new_log_lines(self):
+        self.write("first\nsecond\npartial", mode='w')
+        with open(self.path, 'rb') as file:
+            self.assertEqual(list(logs_tool.iter_new_log_lines(file, 6)), [(b"second\n", 13)])
+
+
+class TestBuildQuery(unittest.TestCase):
+    def test_build_query_single_filter(self):
+        self.assertEqual(logs_tool.build_query([('service', 'ne', ['api'])]), {'service': {'$ne': 'api'}})
+
+    def test_build_query_datetime_in(self):
+        query = logs_tool.build_query([('datetime', 'in', ['2021-01-01 00:00:00,000', '2021-01-01 00:00:01,000'])])
+        self.assertEqual(query, {'datetime': {'$in': [datetime(2021, 1, 1), datetime(2021, 1, 1, 0, 0, 1)]}})
+
+    def test_build_query_repeated_operator(self):
+        with self.assertRaises(ValueError):
+            logs_tool.build_query([('service', 'eq', ['a']), ('service', 'eq', ['b'])])
+
+    def test_build_query_several_values_without_in(self):
+        with self.assertRaises(ValueError):
+            logs_tool.build_query([('service', 'eq', ['a', 'b'])])
+
+    def test_build_query_message_search(self):
+        query = logs_tool.build_query([('message', 'contains', ['took 1.5s (retry)']), ('message', 'ne', ['x']),
+                                       ('message', 'text', ['timeout -debug'])])
+        self.assertEqual(query, {'message': {'$regex': r'took\ 1\.5s\ \(retry\)', '$ne': 'x'},
+                                 '$text': {'$search': 'timeout -debug'}})
+        self.assertEqual(logs_tool.build_query([('message', 'regex', ['Timeout|Error'])]),
+                         {'message': {'$regex': 'Timeout|Error'}})
+        self.assertEqual(logs_tool.build_query([('message', 'regex', ['^User [0-9]+'])]),
+                         {'message': {'$regex': '^User [0-9]+'}})
+
+    def test_build_query_invalid_search(self):
+        invalid_filters = [
+            [('service', 'contains', ['api'])],
+            [('message', 'regex', ['(unclosed'])],
+            [('message', 'contains', ['a']), ('message', 'regex', ['b'])],
+            [('message', 'text', ['a', 'b'])]
+        ]
+        for filters in invalid_filters:
+            with self.subTest(filters=filters):
+                with self.assertRaises(ValueError):
+                    logs_tool.build_query(filters)
+
+
+class TestFormatLogEntry(unittest.TestCase):
+    entry = {
+        '_id': 'id',
+        'datetime': datetime(2021, 1, 1, 12, 0, 0, 123000),
+        'service': 'TestService',
+        'severity': 'INFO',
+        'message': 'Message one'
+    }
+
+    def test_format_log_entry(self):
+        self.assertEqual(logs_tool.format_log_entry(self.entry),
+                         "2021-01-01 12:00:00,123 - TestService - INFO - Message one")
+
+    def test_format_log_entry_selected_fields(self):
+        self.assertEqual(logs_tool.format_log_entry(self.entry, ['datetime', 'message']),
+                         "2021-01-01 12:00:00,123 - Message one")
+
+    def test_format_log_entry_missing_key(self):
+        self.assertIsNone(logs_tool.format_log_entry({'datetime': self.entry['datetime']}))
+
+
+class TestGetLogs(unittest.TestCase):
+    @staticmethod
+    def make_args(**kwargs):
+        defaults = {'field': 'service', 'eq': None, 'ne': None, 'lt': None, 'gt': None, 'in': None, 'where': None,
+                    'limit': None, 'skip': 0, 'after': None, 'sort': None, 'desc': False, 'fields': None,
+                    'format': 'text', 'batch_size': 1000, 'explain': False, 'from_snapshot': None}
+        return Namespace(**{**defaults, **kwargs})
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_streams_cursor(self, mock_client, mock_stdout):
+        mock_client.return_value.find_data.return_value = iter([TestFormatLogEntry.entry])
+        logs_tool.get_logs(self.make_args(eq='TestService'))
+        self.assertEqual(mock_stdout.getvalue(), "2021-01-01 12:00:00,123 - TestService - INFO - Message one\n")
+        mock_client.return_value.find_data.return_value = iter([])
+        with self.assertLogs('logs_tool', level='WARNING'):
+            logs_tool.get_logs(self.make_args(eq='TestService'))
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_message_search(self, mock_client, mock_stdout):
+        mock_client.return_value.find_data.return_value = iter([TestFormatLogEntry.entry])
+        logs_tool.get_logs(self.make_args(field=None, contains='one', text='Message'))
+        mock_client.return_value.find_data.assert_called_once_with(
+            {'message': {'$regex': 'one'}, '$text': {'$search': 'Message'}}, skip=0, limit=0, batch_size=1000)
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_profiled(self, mock_client, mock_stdout):
+        mock_client.return_value.find_data.return_value = iter([TestFormatLogEntry.entry] * 3)
+        stream = io.StringIO()
+        profiler = logs_tool.profiling.run(logs_tool.get_logs, self.make_args(eq='TestService'), stream, 'json')
+        self.assertEqual(len(mock_stdout.getvalue().splitlines()), 3)
+        self.assertEqual(profiler.stages['fetch']['count'], 3)
+        self.assertEqual(profiler.stages['format/print']['count'], 3)
+        self.assertEqual(set(json.loads(stream.getvalue())), {'total', 'fetch', 'format/print'})
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_invalid_regex(self, mock_client):
+        with self.assertLogs('logs_tool', level='ERROR'):
+            logs_tool.get_logs(self.make_args(field=None, regex='[a-'))
+        mock_client.return_value.find_data.assert_not_called()
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_paging_options(self, mock_client, mock_stdout):
+        mock_client.return_value.find_data.return_value = iter([TestFormatLogEntry.entry])
+        args = self.make_args(eq='TestService', limit=1, skip=2, sort='datetime', desc=True,
+                              after='65f1c2a4b6e8d9a1b2c3d4e5', fields=['message', 'datetime'], batch_size=50)
+        with self.assertLogs('logs_tool', level='INFO') as logs:
+            logs_tool.get_logs(args)
+        mock_client.return_value.find_data.assert_called_once_with(
+            {'service': {'$eq': 'TestService'}}, skip=2, limit=1, batch_size=50,
+            projection={'message': 1, 'datetime': 1}, sort=[('datetime', -1)],
+            after=logs_tool.ObjectId('65f1c2a4b6e8d9a1b2c3d4e5')
+        )
+        self.assertEqual(mock_stdout.getvalue(), "2021-01-01 12:00:00,123 - Message one\n")
+        self.assertIn("--after id", logs.output[-1])
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_compound_filters(self, mock_client, mock_stdout):
+        mock_client.return_value.find_data.return_value = iter([])
+        args = self.make_args(field='datetime', gt='2021-01-01 00:00:00,000', lt='2021-01-02 00:00:00,000',
+                              where=[['service', 'eq', 'TestService'], ['severity', 'in', 'ERROR', 'WARNING']])
+        with self.assertLogs('logs_tool', level='WARNING'):
+            logs_tool.get_logs(args)
+        query = mock_client.return_value.find_data.call_args.args[0]
+        self.assertEqual(query, {
+            'service': {'$eq': 'TestService'},
+            'severity': {'$in': ['ERROR', 'WARNING']},
+            'datetime': {'$lt': datetime(2021, 1, 2), '$gt': datetime(2021, 1, 1)}
+        })
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_invalid_filters(self, mock_client):
+        invalid_args = [
+            self.make_args(),
+            self.make_args(field=None),
+            self.make_args(field=None, eq='TestService'),
+            self.make_args(field='unknown', eq='value'),
+            self.make_args(lt='2021-01-01 00:00:00,000'),
+            self.make_args(field='datetime', gt='not a date'),
+            self.make_args(eq='TestService', where=[['service', 'eq', 'Other']]),
+            self.make_args(field=None, where=[['service', 'like', 'Test']]),
+            self.make_args(field=None, where=[['service', 'eq']])
+        ]
+        for args in invalid_args:
+            with self.subTest(args=args):
+                with self.assertLogs('logs_tool', level='ERROR'):
+                    logs_tool.get_logs(args)
+        mock_client.return_value.find_data.assert_not_called()
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_jsonl_format(self, mock_client, mock_stdout):
+        mock_client.return_value.find_data.return_value = iter([TestFormatLogEntry.entry])
+        logs_tool.get_logs(self.make_args(eq='TestService', format='jsonl', fields=['severity', 'datetime']))
+        self.assertEqual(mock_stdout.getvalue(), '{"datetime": "2021-01-01 12:00:00,123", "severity": "INFO"}\n')
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_from_snapshot(self, mock_client, mock_stdout):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            entries = logs_tool.parse_log_file(TestAddLogs.lines)
+            snapshot.export_snapshot(iter(entries), tmp_dir)
+            args = self.make_args(field='datetime', gt='2021-01-01 12:00:00,123', from_snapshot=tmp_dir,
+                                  where=[['severity', 'ne', 'INFO']], sort='severity', limit=1, skip=1)
+            logs_tool.get_logs(args)
+        self.assertEqual(mock_stdout.getvalue(), "2021-01-01 12:01:00,456 - TestService - ERROR - Message two\n")
+        mock_client.assert_not_called()
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_export_snapshot(self, mock_client):
+        entries = logs_tool.parse_log_file(TestAddLogs.lines)
+        mock_client.return_value.find_data.return_value = iter(entries)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            args = Namespace(field='service', eq='TestService', ne=None, lt=None, gt=None, where=None, output=tmp_dir,
+                             batch_size=500, **{'in': None})
+            logs_tool.export_snapshot(args)
+            self.assertEqual(len(snapshot.Snapshot(tmp_dir)), 3)
+        mock_client.return_value.find_data.assert_called_once_with(
+            {'service': {'$eq': 'TestService'}}, projection={'_id': 0}, sort=[('datetime', 1)], batch_size=500
+        )
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_invalid_after(self, mock_client):
+        with self.assertLogs('logs_tool', level='ERROR'):
+            logs_tool.get_logs(self.make_args(eq='TestService', after='not-an-id'))
+        mock_client.return_value.find_data.assert_not_called()
+
+
+class TestStats(unittest.TestCase):
+    @staticmethod
+    def make_args(**kwargs):
+        defaults = {'field': None, 'eq': None, 'ne': None, 'lt': None, 'gt': None, 'in': None, 'where': None,
+                    'by': ['service', 'severity'], 'bucket': ('hour', 1), 'top': None}
+        return Namespace(**{**defaults, **kwargs})
+
+    def test_parse_bucket(self):
+        self.assertEqual(logs_tool.parse_bucket('5m'), ('minute', 5))
+        self.assertEqual(logs_tool.parse_bucket('1d'), ('day', 1))
+        for value in ('m', '0h', '5w', '1.5h'):
+            with self.subTest(value=value):
+                with self.assertRaises(ArgumentTypeError):
+                    logs_tool.parse_bucket(value)
+
+    def test_build_stats_pipeline_time_buckets(self):
+        pipeline = logs_tool.build_stats_pipeline({'severity': {'$eq': 'ERROR'}}, ['service', 'time'], ('minute', 5))
+        self.assertEqual(pipeline, [
+            {'$match': {'severity': {'$eq': 'ERROR'}}},
+            {'$group': {
+                '_id': {
+                    'service': '$service',
+                    'time': {'$dateTrunc': {'date': '$datetime', 'unit': 'minute', 'binSize': 5}}
+                },
+                'count': {'$sum': 1}
+            }},
+            {'$sort': {'_id.service': 1, '_id.time': 1}}
+        ])
+
+    def test_build_stats_pipeline_top(self):
+        pipeline = logs_tool.build_stats_pipeline({}, ['message'], top=3)
+        self.assertEqual(pipeline, [
+            {'$group': {'_id': {'message': '$message'}, 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}},
+            {'$limit': 3}
+        ])
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_stats(self, mock_client, mock_stdout):
+        mock_client.return_value.aggregate_data.return_value = [
+            {'_id': {'service': 'api', 'time': datetime(2021, 1, 1, 12, 5)}, 'count': 120},
+            {'_id': {'service': 'worker', 'time': datetime(2021, 1, 1, 12, 10)}, 'count': 7}
+        ]
+        args = self.make_args(where=[['severity', 'eq', 'ERROR']], by=['service', 'time'], bucket=('minute', 5))
+        logs_tool.get_stats(args)
+        pipeline = mock_client.return_value.aggregate_data.call_args.args[0]
+        self.assertEqual(pipeline[0], {'$match': {'severity': {'$eq': 'ERROR'}}})
+        self.assertEqual(mock_stdout.getvalue().splitlines(), [
+            "service  time                     count",
+            "api      2021-01-01 12:05:00,000    120",
+            "worker   2021-01-01 12:10:00,000      7"
+        ])
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_stats_from_rollup(self, mock_client, mock_stdout):
+        mock_client.return_value.aggregate_data.return_value = [{'_id': {'service': 'api'}, 'count': 1200}]
+        logs_tool.get_stats(self.make_args(by=['service'], from_rollup=True))
+        pipeline, collection_name = mock_client.return_value.aggregate_data.call_args.args
+        self.assertEqual(pipeline[0], {'$group': {'_id': {'service': '$service'}, 'count': {'$sum': '$count'}}})
+        self.assertEqual(collection_name, logs_tool.config.ROLLUP_COLLECTION_NAME)
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_stats_from_rollup_rejects_finer_details(self, mock_client):
+        for args in (self.make_args(by=['message'], from_rollup=True),
+                     self.make_args(by=['time'], bucket=('minute', 5), from_rollup=True)):
+            with self.subTest(by=args.by):
+                with self.assertLogs('logs_tool', level='ERROR'):
+                    logs_tool.get_stats(args)
+        mock_client.return_value.aggregate_data.assert_not_called()
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_stats_no_results(self, mock_client):
+        mock_client.return_value.aggregate_data.return_value = []
+        with self.assertLogs('logs_tool', level='WARNING'):
+            logs_tool.get_stats(self.make_args())
+
+
+class TestRetention(unittest.TestCase):
+    def test_parse_age(self):
+        self.assertEqual(logs_tool.parse_age('12h'), logs_tool.timedelta(hours=12))
+        self.assertEqual(logs_tool.parse_age('30d'), logs_tool.timedelta(days=30))
+        with self.assertRaises(ArgumentTypeError):
+            logs_tool.parse_age('30')
+
+    def test_build_rollup_pipeline(self):
+        query = {'datetime': {'$lt': datetime(2021, 1, 1, 12)}}
+        pipeline = logs_tool.build_rollup_pipeline(query, 'logs_hourly')
+        self.assertEqual(pipeline[0], {'$match': query})
+        self.assertEqual(pipeline[1]['$group']['_id'], {
+            'service': '$service',
+            'severity': '$severity',
+            'datetime': {'$dateTrunc': {'date': '$datetime', 'unit': 'hour'}}
+        })
+        merge = pipeline[-1]['$merge']
+        self.assertEqual(merge['into'], 'logs_hourly')
+        self.assertEqual(merge['whenMatched'][0]['$set']['count'], {'$add': ['$count', '$$new.count']})
+
+    @patch('logs_tool.datetime')
+    @patch('logs_tool.database.MongoDBClient')
+    def test_rollup_logs(self, mock_client, mock_datetime):
+        mock_datetime.now.return_value = datetime(2021, 1, 8, 12, 34, 56)
+        mock_client.return_value.find_data.side_effect = [[{'_id': 1}, {'_id': 2}], [{'_id': 3}], []]
+        mock_client.return_value.aggregate_data.return_value = []
+        mock_client.return_value.delete_data.side_effect = [2, 1]
+        with self.assertLogs('logs_tool', level='INFO') as logs:
+            logs_tool.rollup_logs(Namespace(older_than=logs_tool.timedelta(days=7), batch_size=2))
+        query = {'datetime': {'$lt': datetime(2021, 1, 1, 12)}}
+        mock_client.return_value.find_data.assert_called_with(query, projection={'datetime': 1}, limit=2)
+        batches = [dict(query, _id={'$in': [1, 2]}), dict(query, _id={'$in': [3]})]
+        self.assertEqual([call.args[0][0] for call in mock_client.return_value.aggregate_data.call_args_list],
+                         [{'$match': batch} for batch in batches])
+        self.assertEqual([call.args[0] for call in mock_client.return_value.delete_data.call_args_list], batches)
+        self.assertIn("Rolled up 3 log entries", logs.output[-1])
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_rollup_logs_keeps_entries_when_rollup_fails(self, mock_client):
+        mock_client.return_value.find_data.return_value = [{'_id': 1}]
+        mock_client.return_value.aggregate_data.return_value = None
+        logs_tool.rollup_logs(Namespace(older_than=logs_tool.timedelta(days=7), batch_size=2))
+        mock_client.return_value.delete_data.assert_not_called()
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_rollup_logs_stops_when_deletion_fails(self, mock_client):
+        mock_client.return_value.find_data.return_value = [{'_id': 1}]
+        mock_client.return_value.aggregate_data.return_value = []
+        mock_client.return_value.delete_data.return_value = None
+        with self.assertLogs('logs_tool', level='ERROR'):
+            logs_tool.rollup_logs(Namespace(older_than=logs_tool.timedelta(days=7), batch_size=2))
+        mock_client.return_value.aggregate_data.assert_called_once()
+
+    @patch('logs_tool.database.MongoDBClient')
+    def test_rollup_and_prune_rejected_without_delete_support(self, mock_client):
+        mock_client.return_value.supports_delete.return_value = False
+        logs_tool.rollup_logs(Namespace(older_than=logs_tool.timedelta(days=7), batch_size=2))
+        logs_tool.prune_logs(Namespace(older_than=logs_tool.timedelta(days=7), severity=None, rollups=False))
+        mock_client.return_value.aggregate_data.assert_not_called()
+        mock_client.return_value.delete_data.assert_not_called()
+        logs_tool.prune_logs(Namespace(older_than=logs_tool.timedelta(days=7), severity=None, rollups=True))
+        mock_client.return_value.delete_data.assert_called_once()
+
+    @patch('logs_tool.datetime')
+    @patch('logs_tool.database.MongoDBClient')
+    def test_prune_logs(self, mock_client, mock_datetime):
+        mock_datetime.now.return_value = datetime(2021, 1, 8, 12)
+        mock_client.return_value.delete_data.return_value = 2
+        logs_tool.prune_logs(Namespace(older_than=logs_tool.timedelta(days=7), severity=['DEBUG'], rollups=False))
+        mock_client.return_value.delete_data.assert_called_once_with(
+            {'datetime': {'$lt': datetime(2021, 1, 1, 12)}, 'severity': {'$in': ['DEBUG']}}, None)
+
+    @patch('logs_tool.datetime')
+    @patch('logs_tool.database.MongoDBClient')
+    def test_prune_rollups(self, mock_client, mock_datetime):
+        mock_datetime.now.return_value = datetime(2021, 1, 8, 12)
+        logs_tool.prune_logs(Namespace(older_than=logs_tool.timedelta(days=365), severity=None, rollups=True))
+        mock_client.return_value.delete_data.assert_called_once_with(
+            {'datetime': {'$lt': datetime(2020, 1, 9, 12)}}, logs_tool.config.ROLLUP_COLLECTION_NAME)
+
+
+class TestQueryDaemon(unittest.TestCase):
+    def test_query_time_range(self):
+        first, last = datetime(2021, 1, 1), datetime(2021, 1, 2)
+        self.assertEqual(logs_tool.query_time_range({'service': {'$eq': 'api'}}), (None, None))
+        self.assertEqual(logs_tool.query_time_range({'datetime': {'$gt': first}}), (first, None))
+        self.assertEqual(logs_tool.query_time_range({'datetime': {'$gt': first, '$lt': last}}), (first, last))
+        self.assertEqual(logs_tool.query_time_range({'datetime': {'$in': [last, first]}}), (first, last))
+
+    def test_is_served_query(self):
+        parser = logs_tool.build_parser()
+        self.assertTrue(logs_tool.is_served_query(parser.parse_args(['get', '--field', 'service', '--eq', 'api'])))
+        self.assertTrue(logs_tool.is_served_query(parser.parse_args(['stats', '--by', 'service'])))
+        for argv in (['--no-daemon', 'stats'], ['--profile-dump', 'stats.prof', 'stats'],
+                     ['get', '--from-snapshot', 'snapshot'], ['index', 'list']):
+            with self.subTest(argv=argv):
+                self.assertFalse(logs_tool.is_served_query(parser.parse_args(argv)))
+
+    def test_parse_profile_flags(self):
+        parser = logs_tool.build_parser()
+        args = parser.parse_args(['--profile', 'get', '--field', 'service', '--eq', 'api'])
+        self.assertTrue(args.profile)
+        self.assertEqual(args.profile_format, 'table')
+        self.assertIs(args.func, logs_tool.get_logs)
+        self.assertFalse(logs_tool.is_served_query(args))
+        args = parser.parse_args(['--profile', '--profile-format', 'json', 'add', '--file', 'app.log'])
+        self.assertEqual((args.profile, args.profile_format, args.func), (True, 'json', logs_tool.add_logs))
+
+    @patch('logs_tool.profiling.run')
+    def test_main_profiles_command(self, mock_run):
+        with patch('sys.argv', ['logs_tool.py', '--profile', '--profile-format', 'json', 'stats']):
+            logs_tool.main()
+        args = mock_run.call_args.args[1]
+        mock_run.assert_called_once_with(logs_tool.get_stats, args, logs_tool.sys.stderr, 'json', None)
+
+    @patch('logs_tool.get_stats')
+    @patch('logs_tool.daemon.forward_query')
+    def test_main_forwards_to_daemon(self, mock_forward_query, mock_get_stats):
+        argv = ['stats', '--by', 'service']
+        for forwarded in (True, False):
+            mock_forward_query.return_value = forwarded
+            with patch('sys.argv', ['logs_tool.py'] + argv):
+                logs_tool.main()
+            mock_forward_query.assert_called_with(argv, logs_tool.sys.stdout, logs_tool.sys.stderr,
+                                                  logs_tool.config.SOCKET_PATH)
+        self.assertEqual(mock_get_stats.call_count, 1)
+
+
+@unittest.skipIf(mongomock is None, "mongomock is not installed")
+class TestGetLogsPagination(unittest.TestCase):
+    lines = [f"2021-01-01 12:00:{i // 3:02d},000 - Service{i % 4} - {('INFO', 'ERROR', 'DEBUG')[i % 3]} - Message {i}\n"
+             for i in range(30)]
+
+    def setUp(self):
+        for patcher in (patch('database.MongoClient', mongomock.MongoClient),
+                        patch.multiple(logs_tool.config, MONGODB_URI='mongodb://localhost', DATABASE_NAME='test',
+                                       COLLECTION_NAME='logs')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.reset_database)
+        self.reset_database()
+        entries = logs_tool.parse_log_file(self.lines)
+        for position, entry in enumerate(entries):
+            entry._id = logs_tool.content_id(entry, position)
+        mongo_client = logs_tool.database.MongoDBClient()
+        mongo_client.timeseries = False
+        mongo_client.insert_data(entries)
+
+    @staticmethod
+    def reset_database():
+        mongo_client = logs_tool.database.MongoDBClient()
+        mongo_client.connection = None
+        mongo_client.db = None
+        mongo_client.collections = {}
+        mongo_client.timeseries = None
+
+    def read_pages(self, **kwargs):
+        messages = []
+        after = None
+        while True:
+            stdout = io.StringIO()
+            with patch('sys.stdout', stdout), self.assertLogs('logs_tool', level='INFO') as logs:
+                logs_tool.get_logs(TestGetLogs.make_args(field='datetime', gt='2020-01-01 00:00:00,000', limit=5,
+                                                         after=after, format='jsonl', **kwargs))
+            messages.extend(json.loads(line)['message'] for line in stdout.getvalue().splitlines())
+            hints = [line for line in logs.output if '--after' in line]
+            if not hints:
+                return messages
+            after = hints[0].rsplit(' ', 1)[1]
+
+    def test_after_pages_through_all_entries(self):
+        for kwargs in ({}, {'sort': 'severity'}, {'sort': 'datetime', 'desc': True}):
+            with self.subTest(**kwargs):
+                messages = self.read_pages(**kwargs)
+                self.assertEqual(sorted(messages), sorted(f"Message {i}" for i in range(30)))
+
+
+class TestExplain(unittest.TestCase):
+    explain = {
+        'queryPlanner': {
+            'winningPlan': {
+                'stage': 'FETCH',
+                'inputStage': {'stage': 'IXSCAN', 'indexName': 'service_1_severity_1_datetime_1'}
+            }
+        },
+        'executionStats': {'nReturned': 3, 'totalKeysExamined': 3, 'totalDocsExamined': 3, 'executionTimeMillis': 1}
+    }
+
+    def test_describe_plan(self):
+        plan = {'stage': 'OR', 'inputStages': [{'stage': 'IXSCAN', 'indexName': 'a'}, {'stage': 'COLLSCAN'}]}
+        self.assertEqual(logs_tool.describe_plan(plan), "OR <- [IXSCAN (a), COLLSCAN]")
+
+    def test_format_explain(self):
+        result = logs_tool.format_explain(self.explain)
+        self.assertIn("Winning plan: FETCH <- IXSCAN (service_1_severity_1_datetime_1)", result)
+        self.assertIn("Documents examined: 3", result)
+
+    def test_format_explain_slot_based_engine(self):
+        explain = {'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'COLLSCAN'}}}}
+        self.assertIn("Winning plan: COLLSCAN", logs_tool.format_explain(explain))
+        self.assertIn("Documents examined: n/a", logs_tool.format_explain(explain))
+
+    @patch('builtins.print')
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_explain(self, mock_client, mock_print):
+        mock_client.return_value.explain_query.return_value = self.explain
+        args = TestGetLogs.make_args(eq='TestService', explain=True)
+        logs_tool.get_logs(args)
+        mock_client.return_value.explain_query.assert_called_once_with({'service': {'$eq': 'TestService'}}, skip=0,
+                                                                       limit=0, batch_size=1000)
+        mock_client.return_value.find_data.assert_not_called()
+        mock_print.assert_called_once_with(logs_tool.format_explain(self.explain))
+
+
+    @patch('builtins.print')
+    @patch('logs_tool.database.MongoDBClient')
+    def test_get_logs_explain_prefix_regex(self, mock_client, mock_print):
+        explain = {
+            'queryPlanner': {
+                'winningPlan': {
+                    'stage': 'FETCH',
+                    'inputStage': {'stage': 'IXSCAN', 'indexName': 'message_1',
+                                   'indexBounds': {'message': ['["User ", "User!")']}}
+                }
+            },
+            'executionStats': {'nReturned': 2, 'totalKeysExamined': 2, 'totalDocsExamined': 2}
+        }
+        mock_client.return_value.explain_query.return_value = explain
+        logs_tool.get_logs(TestGetLogs.make_args(field=None, regex='^User [0-9]+', explain=True))
+        mock_client.return_value.explain_query.assert_called_once_with({'message': {'$regex': '^User [0-9]+'}}, skip=0,
+                                                                       limit=0, batch_size=1000)
+        self.assertIn("Winning plan: FETCH <- IXSCAN (message_1)", mock_print.call_args.args[0])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,79 @@
+import io
+import unittest
+from datetime import datetime
+
+import output
+
+FIELDS = ['datetime', 'service', 'severity', 'message']
+
+
+class TestFormatTimestamp(unittest.TestCase):
+    def test_format_timestamp(self):
+        timestamps = [
+            datetime(2021, 1, 1, 12, 0, 0, 123000),
+            datetime(2021, 1, 1, 12, 0, 0, 5000),
+            datetime(2021, 1, 2, 12, 0, 0, 999999),
+            datetime(2021, 1, 2, 12, 0, 1)
+        ]
+        for timestamp in timestamps:
+            with self.subTest(timestamp=timestamp):
+                self.assertEqual(output.format_timestamp(timestamp),
+                                 timestamp.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3])
+
+
+class TestWriteLogEntries(unittest.TestCase):
+    entries = [
+        {'_id': 1, 'datetime': datetime(2021, 1, 1, 12, 0, 0, 123000), 'service': 'TestService', 'severity': 'INFO',
+         'message': 'Message one'},
+        {'_id': 2, 'datetime': datetime(2021, 1, 1, 12, 1, 0, 456000), 'service': 'TestService', 'severity': 'ERROR',
+         'message': 'Message "two", with comma'}
+    ]
+
+    def write(self, output_format, fields=FIELDS, chunk_size=output.DEFAULT_CHUNK_SIZE):
+        stream = io.StringIO()
+        result = output.write_log_entries(iter(self.entries), stream, fields, output_format, chunk_size)
+        return stream.getvalue(), result
+
+    def test_write_text(self):
+        text, (count, last_entry) = self.write('text', chunk_size=1)
+        self.assertEqual(text, "2021-01-01 12:00:00,123 - TestService - INFO - Message one\n"
+                               "2021-01-01 12:01:00,456 - TestService - ERROR - Message \"two\", with comma\n")
+        self.assertEqual(count, 2)
+        self.assertIs(last_entry, self.entries[1])
+
+    def test_write_jsonl(self):
+        text, _ = self.write('jsonl', fields=['datetime', 'message'])
+        self.assertEqual(text.splitlines()[1], '{"datetime": "2021-01-01 12:01:00,456", '
+                                               '"message": "Message \\"two\\", with comma"}')
+
+    def test_write_csv(self):
+        text, (count, _) = self.write('csv')
+        self.assertEqual(text.splitlines(), [
+            "datetime,service,severity,message",
+            "\"2021-01-01 12:00:00,123\",TestService,INFO,Message one",
+            "\"2021-01-01 12:01:00,456\",TestService,ERROR,\"Message \"\"two\"\", with comma\""
+        ])
+        self.assertEqual(count, 2)
+
+    def test_write_no_entries(self):
+        stream = io.StringIO()
+        self.assertEqual(output.write_log_entries(iter([]), stream, FIELDS), (0, None))
+        self.assertEqual(stream.getvalue(), "")
+
+    def test_write_unknown_format(self):
+        with self.assertRaises(ValueError):
+            output.write_log_entries(iter([]), io.StringIO(), FIELDS, 'xml')
+
+
+
+class TestWriteTable(unittest.TestCase):
+    def test_write_table(self):
+        stream = io.StringIO()
+        output.write_table([['api', 1500], ['worker', 3]], ['service', 'count'], stream)
+        self.assertEqual(stream.getvalue(), "service  count\n"
+                                            "api       1500\n"
+                                            "worker       3\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+import profiling
+
+
+class TestProfiler(unittest.TestCase):
+    def test_timed_iter(self):
+        profiler = profiling.Profiler()
+        chunks = [b'abc', b'de']
+        self.assertEqual(list(profiler.timed_iter('read', chunks, size=len)), chunks)
+        self.assertEqual(profiler.stages['read']['count'], 2)
+        self.assertEqual(profiler.stages['read']['bytes'], 5)
+
+    def test_timed_iter_records_abandoned_iteration(self):
+        profiler = profiling.Profiler()
+        iterator = profiler.timed_iter('parse', [[1, 2], [3]], count=len)
+        next(iterator)
+        iterator.close()
+        self.assertEqual(profiler.stages['parse']['count'], 2)
+
+    def test_wrap(self):
+        profiler = profiling.Profiler()
+        insert = profiler.wrap('insert', lambda batch, ordered=True: ordered, count=len)
+        self.assertFalse(insert([1, 2, 3], ordered=False))
+        insert([4])
+        self.assertEqual(profiler.stages['insert']['count'], 4)
+
+    def test_stage_excludes_nested_stages(self):
+        profiler = profiling.Profiler()
+        with profiler.stage('format/print', exclude=['fetch']) as stage:
+            profiler.record('fetch', 10.0, 10.0, 3)
+            stage['count'] = 3
+        self.assertEqual(profiler.stages['format/print']['count'], 3)
+        self.assertEqual(profiler.stages['format/print']['wall'], 0.0)
+        self.assertEqual(profiler.stages['fetch']['wall'], 10.0)
+
+    def test_write_table(self):
+        profiler = profiling.Profiler()
+        profiler.record('total', 2.0, 1.0)
+        profiler.record('parse', 1.0, 1.0, 100, 2048)
+        stream = io.StringIO()
+        profiler.write_table(stream)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[0].split(), ['stage', 'count', 'bytes', 'wall', 's', 'cpu', 's', 'count/s', 'of',
+                                            'total'])
+        self.assertEqual(lines[2].split(), ['parse', '100', '2048', '1.0', '1.0', '100', '50.0%'])
+
+
+class TestRun(unittest.TestCase):
+    def test_run_writes_json_summary(self):
+        def command(args):
+            self.assertIs(profiling.active(), profiler_seen.setdefault('profiler', profiling.active()))
+            time.sleep(0.01)
+
+        profiler_seen = {}
+        stream = io.StringIO()
+        profiler = profiling.run(command, None, stream, 'json')
+        self.assertIs(profiler_seen['profiler'], profiler)
+        self.assertIsNone(profiling.active())
+        summary = json.loads(stream.getvalue())
+        self.assertGreaterEqual(summary['total']['wall'], 0.01)
+
+    def test_run_dumps_cprofile_statistics(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'command.prof')
+            profiling.run(lambda args: sorted(range(100)), None, io.StringIO(), dump_path=path)
+            self.assertTrue(pstats.Stats(path).total_calls > 0)
+
+    def test_run_reports_when_the_command_fails(self):
+        def command(args):
+            raise RuntimeError("failed")
+
+        stream = io.StringIO()
+        with self.assertRaises(RuntimeError):
+            profiling.run(command, None, stream)
+        self.assertIn('total', stream.getvalue())
+        self.assertIsNone(profiling.active())
+
+
+if __name__ == '__main__':
+    unittest.main()
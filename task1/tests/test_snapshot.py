@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+import unittest.mock
+from datetime import datetime, timedelta
+
+import snapshot
+
+
+def make_entries(count):
+    start = datetime(2021, 1, 1, 12, 0, 0)
+    return [
+        {
+            'datetime': start + timedelta(seconds=i),
+            'service': f'Service{i % 3}',
+            'severity': 'ERROR' if i % 4 == 0 else 'INFO',
+            'message': f'Message {i} - żółw'
+        }
+        for i in range(count)
+    ]
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, 'snapshot')
+        self.entries = make_entries(25)
+        with unittest.mock.patch('snapshot.EXPORT_CHUNK_SIZE', 10):
+            self.assertEqual(snapshot.export_snapshot(iter(self.entries), self.path), 25)
+        self.snapshot = snapshot.Snapshot(self.path)
+
+    def select(self, query):
+        return [int(i) for i in self.snapshot.select(query)]
+
+    def test_rows_round_trip(self):
+        self.assertEqual(len(self.snapshot), 25)
+        rows = list(self.snapshot.rows(self.snapshot.select({}), ['datetime', 'service', 'severity', 'message']))
+        self.assertEqual(rows, self.entries)
+
+    def test_rows_selected_fields(self):
+        rows = list(self.snapshot.rows(self.snapshot.select({}), ['message'], chunk_size=4))
+        self.assertEqual(rows[-1], {'message': 'Message 24 - żółw'})
+
+    def test_select_datetime_range(self):
+        query = {'datetime': {'$gt': datetime(2021, 1, 1, 12, 0, 3), '$lt': datetime(2021, 1, 1, 12, 0, 7)}}
+        self.assertEqual(self.select(query), [4, 5, 6])
+
+    def test_select_dictionary_fields(self):
+        query = {'service': {'$eq': 'Service1'}, 'severity': {'$in': ['ERROR', 'UNKNOWN']}}
+        self.assertEqual(self.select(query), [4, 16])
+        self.assertEqual(self.select({'service': {'$eq': 'Unknown'}}), [])
+        self.assertEqual(len(self.select({'service': {'$ne': 'Service0'}})), 16)
+
+    def test_select_message(self):
+        query = {'message': {'$in': ['Message 3 - żółw', 'Message 4 - żółw']}, 'severity': {'$eq': 'ERROR'}}
+        self.assertEqual(self.select(query), [4])
+
+    def test_select_message_regex(self):
+        self.assertEqual(self.select({'message': {'$regex': '^(?:Message 2)'}, 'severity': {'$eq': 'INFO'}}),
+                         [2, 21, 22, 23])
+        with self.assertRaises(ValueError):
+            self.snapshot.select({'$text': {'$search': 'Message'}})
+
+    def test_sort(self):
+        indices = self.snapshot.select({'datetime': {'$lt': datetime(2021, 1, 1, 12, 0, 4)}})
+        self.assertEqual([int(i) for i in self.snapshot.sort(indices, 'service', descending=True)], [2, 1, 0, 3])
+        self.assertEqual([int(i) for i in self.snapshot.sort(indices, 'datetime', descending=True)], [3, 2, 1, 0])
+
+    def test_export_requires_sorted_entries(self):
+        with self.assertRaises(ValueError):
+            snapshot.export_snapshot(reversed(self.entries), self.path)
+        with self.assertRaises(OSError):
+            snapshot.Snapshot(self.path)
+
+    def test_empty_snapshot(self):
+        path = os.path.join(self.tmp_dir.name, 'empty')
+        snapshot.export_snapshot(iter([]), path)
+        self.assertEqual(len(snapshot.Snapshot(path).select({'service': {'$eq': 'Service1'}})), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,20 +1,88 @@
-from fastapi import FastAPI, HTTPException
-import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 import logging
 
+import events
+import sender
 import sqs
 import config
 
 logging.basicConfig(level=config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+QUEUE_FULL = "Too many pending messages, retry later."
+ACCEPTED = {'status': 'accepted'}
+REJECTED = {'status': 'rejected', 'detail': QUEUE_FULL}
+# Content types of request bodies with one event per line, other bodies of POST /events are read as a JSON array.
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+message_sender = sender.MessageSender(config.SENDER_THREADS, config.SENDER_QUEUE_SIZE,
+                                      linger=config.SENDER_LINGER_MS / 1000)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    message_sender.start()
+    yield
+    message_sender.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/event")
 def post_event(msg: dict):
-    if 'msg' not in msg:
-        logger.warning("Missing 'msg' key in the payload.")
-        raise HTTPException(status_code=400, detail="Missing 'msg' key in the payload.")
-    threading.Thread(target=sqs.send_message_to_queue, args=(msg['msg'],)).start()
-    return {"status": f"Message received: {msg['msg']}"}
+    message, error = events.validate_event(msg)
+    if error:
+        logger.warning(error)
+        raise HTTPException(status_code=400, detail=error)
+    if not message_sender.submit(message):
+        raise HTTPException(status_code=503, detail=QUEUE_FULL, headers={"Retry-After": "1"})
+    return {"status": f"Message received: {message}"}
+
+
+@app.post("/events")
+async def post_events(request: Request, response: Response):
+    """
+    Accept many events, as a JSON array or NDJSON. The body is validated while it is received and the valid messages
+    are handed to the sender in batches. Returns the result of every event, in the order of the body.
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    results = []
+    pending = []
+
+    def submit_pending():
+        accepted = message_sender.submit_many([message for _, message in pending])
+        for position, (index, _) in enumerate(pending):
+            results[index] = ACCEPTED if position < accepted else REJECTED
+        pending.clear()
+
+    try:
+        async for message, error in events.iter_events(request.stream(), ndjson=content_type in NDJSON_CONTENT_TYPES):
+            if error:
+                results.append({'status': 'invalid', 'detail': error})
+                continue
+            results.append(None)
+            pending.append((len(results) - 1, message))
+            if len(pending) >= sqs.MAX_BATCH_SIZE:
+                submit_pending()
+    except events.EventTooLarge as e:
+        submit_pending()
+        logger.warning(f"Rejected events body: {e}")
+        raise HTTPException(status_code=413, detail={'error': str(e), 'results': results})
+    except ValueError as e:
+        submit_pending()
+        logger.warning(f"Malformed events body: {e}")
+        raise HTTPException(status_code=400, detail={'error': str(e), 'results': results})
+    submit_pending()
+
+    counts = {status: sum(result['status'] == status for result in results)
+              for status in ('accepted', 'invalid', 'rejected')}
+    if counts['rejected']:
+        response.headers['Retry-After'] = '1'
+    return {**counts, 'results': results}
+
+
+@app.get("/queue")
+def get_queue():
+    return message_sender.stats()
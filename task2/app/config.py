@@ -14,6 +14,17 @@ def set_and_check_env_var(var_name):
     return value
 
 
+def get_int_env_var(var_name, default):
+    value = os.getenv(var_name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Invalid {var_name}: {value}. Using default value: {default}.")
+        return default
+
+
 LOG_LEVEL = os.getenv('LOG_LEVEL', '').upper()
 
 if LOG_LEVEL not in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
@@ -27,9 +38,27 @@ else:
 MONGODB_URI = set_and_check_env_var('MONGODB_URI')
 DATABASE_NAME = set_and_check_env_var('DATABASE_NAME')
 COLLECTION_NAME = set_and_check_env_var('COLLECTION_NAME')
+
+# Connection pool of the MongoDB driver. The driver monitors the servers in the background every
+# MONGODB_HEARTBEAT_FREQUENCY_MS instead of the application checking the connection before each operation.
+MONGODB_MAX_POOL_SIZE = get_int_env_var('MONGODB_MAX_POOL_SIZE', 100)
+MONGODB_MIN_POOL_SIZE = get_int_env_var('MONGODB_MIN_POOL_SIZE', 0)
+MONGODB_HEARTBEAT_FREQUENCY_MS = get_int_env_var('MONGODB_HEARTBEAT_FREQUENCY_MS', 10000)
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = get_int_env_var('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 30000)
+MONGODB_CONNECT_TIMEOUT_MS = get_int_env_var('MONGODB_CONNECT_TIMEOUT_MS', 20000)
+# 0 waits for the responses of the server without a timeout.
+MONGODB_SOCKET_TIMEOUT_MS = get_int_env_var('MONGODB_SOCKET_TIMEOUT_MS', 0)
 AWS_DEFAULT_REGION = set_and_check_env_var('AWS_DEFAULT_REGION')
 AWS_ENDPOINT_URL = set_and_check_env_var('AWS_ENDPOINT_URL')
 AWS_ACCESS_KEY_ID = set_and_check_env_var('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = set_and_check_env_var('AWS_SECRET_ACCESS_KEY')
 WORKER_QUEUE_URL = set_and_check_env_var('WORKER_QUEUE_URL')
 API_PORT = set_and_check_env_var('API_PORT')
+
+# POST /event hands the messages to SENDER_THREADS threads through a queue of at most SENDER_QUEUE_SIZE messages,
+# requests are rejected with 503 while it is full.
+SENDER_THREADS = get_int_env_var('SENDER_THREADS', 4)
+SENDER_QUEUE_SIZE = get_int_env_var('SENDER_QUEUE_SIZE', 1000)
+# The messages are sent in batches of up to 10, a sender waits up to SENDER_LINGER_MS after the first message of a
+# batch for more.
+SENDER_LINGER_MS = get_int_env_var('SENDER_LINGER_MS', 10)
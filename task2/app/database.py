@@ -1,4 +1,7 @@
 import logging
+import threading
+
+from pymongo.errors import BulkWriteError
 from pymongo.mongo_client import MongoClient
 
 import config
@@ -6,6 +9,22 @@ import config
 logging.basicConfig(level=config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+DUPLICATE_KEY_ERROR = 11000
+
+
+def client_options():
+    """
+    Options of the MongoClient: pool sizing, server monitoring interval and timeouts from config.
+    """
+    return {
+        'maxPoolSize': config.MONGODB_MAX_POOL_SIZE,
+        'minPoolSize': config.MONGODB_MIN_POOL_SIZE,
+        'heartbeatFrequencyMS': config.MONGODB_HEARTBEAT_FREQUENCY_MS,
+        'serverSelectionTimeoutMS': config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        'connectTimeoutMS': config.MONGODB_CONNECT_TIMEOUT_MS,
+        'socketTimeoutMS': config.MONGODB_SOCKET_TIMEOUT_MS
+    }
+
 
 class MongoDBClient:
     """
@@ -21,27 +40,73 @@ class MongoDBClient:
             logger.info("Creating the instance")
             cls._instance = super(MongoDBClient, cls).__new__(cls)
             cls._instance.connection = None
+            cls._instance.collection = None
+            cls._instance._lock = threading.Lock()
         return cls._instance
 
     def connect(self):
-        if self.connection is None or self.connection.admin.command("ping", check=True).get('ok') != 1.0:
-            try:
-                self.connection = MongoClient(config.MONGODB_URI)
-                self.connection.admin.command('ping')
-                logger.info("Connected to database")
-            except Exception as e:
-                logger.error(f"Failed to connect to MongoDB: {e}")
-                self.connection = None
+        """
+        Return the MongoClient, created and checked with a single ping on first use, or None if the server cannot be
+        reached.
+
+        The client is then reused: its connection pool and background server monitoring (every
+        MONGODB_HEARTBEAT_FREQUENCY_MS) replace checking the connection before each operation.
+        """
+        if self.connection is None:
+            with self._lock:
+                if self.connection is None:
+                    connection = None
+                    try:
+                        connection = MongoClient(config.MONGODB_URI, **client_options())
+                        connection.admin.command('ping')
+                        self.connection = connection
+                        logger.info("Connected to database")
+                    except Exception as e:
+                        logger.error(f"Failed to connect to MongoDB: {e}")
+                        # Stop the monitoring threads of the client, the next call creates a new one.
+                        if connection is not None:
+                            connection.close()
         return self.connection
 
-    def insert_data(self, data):
-        client = self.connect()
-        if client is not None:
+    def get_collection(self):
+        """
+        Return the handle of the collection, cached after the first call.
+        """
+        if self.collection is None:
+            client = self.connect()
+            if client is None:
+                return None
+            self.collection = client[config.DATABASE_NAME][config.COLLECTION_NAME]
+        return self.collection
+
+    def insert_data(self, data, ordered=True):
+        """
+        Insert the documents with a single insert_many. Returns the positions in data of the documents that are
+        stored, counting documents whose _id already exists as stored, or None if nothing could be inserted.
+
+        With ordered=False every document is attempted, so a failing document does not stop the following ones.
+        """
+        collection = self.get_collection()
+        if collection is not None:
             try:
-                db = client[config.DATABASE_NAME]
-                collection = db[config.COLLECTION_NAME]
-                collection.insert_many(data)
+                collection.insert_many(data, ordered=ordered)
                 logger.info(f"Inserted data successfully")
                 logger.debug(f"Inserted data: {data}")
+                return list(range(len(data)))
+            except BulkWriteError as e:
+                if e.details.get('writeConcernErrors'):
+                    logger.error(f"Failed to insert data: {e}")
+                    return None
+                errors = e.details.get('writeErrors', [])
+                # An ordered insert stops at its first error, the following documents are not attempted.
+                attempted = errors[0]['index'] + 1 if ordered and errors else len(data)
+                failed = {error['index'] for error in errors if error['code'] != DUPLICATE_KEY_ERROR}
+                stored = [i for i in range(attempted) if i not in failed]
+                if len(stored) < len(data):
+                    logger.error(f"Failed to insert {len(data) - len(stored)} of {len(data)} documents: {e}")
+                else:
+                    logger.info(f"Inserted data successfully, skipped {len(errors)} already stored documents")
+                return stored
             except Exception as e:
                 logger.error(f"Failed to insert data: {e}")
+        return None
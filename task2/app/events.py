@@ -0,0 +1,141 @@
+import codecs
+import json
+import re
+
+import sqs
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Longest JSON text of one event that is parsed. Escaping can make the text of a valid message longer than the
+# message, larger events are rejected without waiting for their end, as their message could not be sent anyway.
+MAX_EVENT_LENGTH = 2 * sqs.MAX_BATCH_BYTES + 1024
+_decoder = json.JSONDecoder()
+# Text at the end of the data that may be the start of a number or of a literal, completed by the next chunk.
+_PARTIAL_NUMBER = re.compile(r'[-+.\deE]+')
+_LITERALS = ('true', 'false', 'null', 'NaN', 'Infinity', '-Infinity')
+
+
+class EventTooLarge(ValueError):
+    pass
+
+
+def validate_event(event):
+    """
+    Return the message of an event and None, or None and the reason the event is invalid.
+    """
+    if not isinstance(event, dict) or 'msg' not in event:
+        return None, "Missing 'msg' key in the payload."
+    message = event['msg']
+    if not isinstance(message, str):
+        return None, "The 'msg' value must be a string."
+    if sqs.message_size(message) > sqs.MAX_BATCH_BYTES:
+        return None, "The 'msg' value is larger than 256 KB."
+    return message, None
+
+
+class _ArrayParser:
+    """
+    Incremental parser of a JSON array, yielding its items as soon as the text fed so far contains them.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.state = 'start'
+        self.count = 0
+
+    def feed(self, text, final=False):
+        buffer = self.buffer + text
+        position = 0
+        try:
+            while True:
+                position = WHITESPACE.match(buffer, position).end()
+                if position == len(buffer):
+                    break
+                char = buffer[position]
+                if self.state == 'start':
+                    if char != '[':
+                        raise ValueError("The body must be a JSON array.")
+                    self.state = 'first'
+                    position += 1
+                elif self.state == 'separator':
+                    if char not in ',]':
+                        raise ValueError(f"Expected ',' or ']' after item {self.count - 1}.")
+                    self.state = 'item' if char == ',' else 'end'
+                    position += 1
+                elif self.state == 'end':
+                    raise ValueError("Unexpected data after the JSON array.")
+                elif char == ']' and self.state == 'first':
+                    self.state = 'end'
+                    position += 1
+                else:
+                    try:
+                        item, end = _decoder.raw_decode(buffer, position)
+                    except ValueError as e:
+                        if final or not _is_incomplete(e, buffer):
+                            raise ValueError(f"Invalid JSON in item {self.count}: {e}") from None
+                        break
+                    # A number at the end of the text may continue in the next chunk.
+                    if end == len(buffer) and not final:
+                        break
+                    position = end
+                    self.state = 'separator'
+                    self.count += 1
+                    yield item
+        finally:
+            self.buffer = buffer[position:]
+        # Whatever is left is the start of an unfinished item, parsed again from its start with every chunk.
+        if len(self.buffer) > MAX_EVENT_LENGTH:
+            raise EventTooLarge(f"Event {self.count} is longer than {MAX_EVENT_LENGTH} characters.")
+        if final and self.state != 'end':
+            raise ValueError("The JSON array is not terminated.")
+
+
+def _is_incomplete(error, text):
+    """
+    Whether a JSONDecodeError of text may be due to the end of the text only, rather than to invalid JSON.
+    """
+    if error.pos >= len(text) or error.msg.startswith('Unterminated string'):
+        return True
+    if error.msg.startswith('Invalid \\uXXXX escape'):
+        return error.pos + 6 > len(text)
+    rest = text[error.pos:]
+    return bool(_PARTIAL_NUMBER.fullmatch(rest)) or any(literal.startswith(rest) for literal in _LITERALS)
+
+
+def _parse_line(line):
+    try:
+        return validate_event(json.loads(line))
+    except ValueError as e:
+        return None, f"Invalid JSON: {e}"
+
+
+async def iter_events(chunks, ndjson=False):
+    """
+    Parse and validate the events of a request body, given as an async iterator of byte chunks, as the chunks arrive.
+
+    The body is a JSON array of events, or with ndjson one event per line. Yields a (message, error) pair per event,
+    see validate_event. Raises ValueError if the body is not a JSON array, or not UTF-8, and EventTooLarge as soon as
+    an event is longer than MAX_EVENT_LENGTH.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    if ndjson:
+        buffer = ''
+        count = 0
+        async for chunk in chunks:
+            *lines, buffer = (buffer + decoder.decode(chunk)).split('\n')
+            for line in lines:
+                if line.strip():
+                    count += 1
+                    yield _parse_line(line)
+            if len(buffer) > MAX_EVENT_LENGTH:
+                raise EventTooLarge(f"Event {count} is longer than {MAX_EVENT_LENGTH} characters.")
+        buffer += decoder.decode(b'', final=True)
+        if buffer.strip():
+            yield _parse_line(buffer)
+        return
+
+    parser = _ArrayParser()
+    async for chunk in chunks:
+        for event in parser.feed(decoder.decode(chunk)):
+            yield validate_event(event)
+    for event in parser.feed(decoder.decode(b'', final=True), final=True):
+        yield validate_event(event)
@@ -10,18 +10,31 @@ logging.basicConfig(level=config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
+def process_messages(mongo_client, messages):
+    """
+    Store a batch of received messages with a single insert and delete the stored ones from the queue with a single
+    batch request. Messages that could not be stored stay in the queue and are received again after their
+    visibility timeout.
+
+    The SQS message id is used as the _id of the document, so a message received again after it was stored but
+    not deleted is not stored twice.
+    """
+    documents = [{"_id": message['MessageId'], "msg": message['Body']} for message in messages]
+    stored = mongo_client.insert_data(documents, ordered=False)
+    if stored:
+        sqs.delete_messages([messages[i] for i in stored])
+
+
 def check_queue():
     """
-    This function continuously checks the SQS queue for new messages. If a message is found,
-    it inserts the message into the MongoDB collection and starts a thread to
-    delete the message from the queue.
+    This function continuously checks the SQS queue for new messages, receiving up to 10 at a time, and moves
+    them to the MongoDB collection.
     """
     mongo_client = database.MongoDBClient()
     while True:
-        message = sqs.get_from_queue()
-        if message:
-            mongo_client.insert_data([{"msg": message['Body']}])
-            threading.Thread(target=sqs.delete_from_queue, args=(message['ReceiptHandle'],)).start()
+        messages = sqs.receive_messages()
+        if messages:
+            process_messages(mongo_client, messages)
 
 
 if __name__ == "__main__":
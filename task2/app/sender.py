@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+import time
+
+import config
+import sqs
+
+logging.basicConfig(level=config.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MessageSender:
+    """
+    Fixed pool of threads sending the submitted messages to the SQS queue, fed by a bounded in-memory queue.
+
+    submit never blocks: when max_pending messages are already waiting the message is refused, so bursts of requests
+    are pushed back to the clients instead of piling up threads and memory.
+
+    Each thread sends the messages in batches of up to sqs.MAX_BATCH_SIZE messages and sqs.MAX_BATCH_BYTES bytes. It
+    waits up to linger seconds after the first message of a batch for more before sending it.
+    """
+
+    def __init__(self, threads, max_pending, linger=0.0):
+        self.threads = threads
+        self.max_pending = max_pending
+        self.linger = linger
+        self.sent = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._workers = []
+        self._lock = threading.Lock()
+        # Held while messages are queued and while the threads are started or told to stop, so no message can be
+        # queued behind the stop sentinels.
+        self._submit_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        with self._submit_lock:
+            if self.running:
+                return
+            self._workers = [threading.Thread(target=self._run, name=f"sender-{i}", daemon=True)
+                             for i in range(self.threads)]
+            for worker in self._workers:
+                worker.start()
+        logger.info(f"Started {self.threads} sender threads")
+
+    def stop(self, timeout=None):
+        """
+        Send the messages still waiting, then stop the threads.
+        """
+        with self._submit_lock:
+            workers, self._workers = self._workers, []
+            for _ in workers:
+                self._queue.put(_STOP)
+        for worker in workers:
+            worker.join(timeout)
+        logger.info(f"Stopped the sender threads, sent {self.sent} messages, {self.failed} failed")
+
+    def submit(self, message):
+        """
+        Queue the message for sending. Returns False if the sender is not running or its queue is full.
+        """
+        return self.submit_many([message]) == 1
+
+    def submit_many(self, messages):
+        """
+        Queue the messages for sending, in order, until the queue is full. Returns the number of queued messages.
+        """
+        with self._submit_lock:
+            if not self.running:
+                return 0
+            for count, message in enumerate(messages):
+                try:
+                    self._queue.put_nowait(message)
+                except queue.Full:
+                    logger.warning(f"Send queue is full ({self.max_pending} messages), refusing "
+                                   f"{len(messages) - count} messages")
+                    return count
+            return len(messages)
+
+    def join(self):
+        """
+        Wait until every submitted message was sent or failed.
+        """
+        self._queue.join()
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'capacity': self.max_pending,
+            'threads': len(self._workers),
+            'sent': self.sent,
+            'failed': self.failed
+        }
+
+    def _collect(self, message):
+        """
+        Collect the batch starting with message, or the next queued one if None. Returns the batch and the message
+        taken from the queue that did not fit in it, if any.
+        """
+        if message is None:
+            message = self._queue.get()
+        batch, size = [], 0
+        deadline = time.monotonic() + self.linger
+        while message is not _STOP:
+            message_size = sqs.message_size(message)
+            if batch and size + message_size > sqs.MAX_BATCH_BYTES:
+                return batch, message
+            batch.append(message)
+            size += message_size
+            if len(batch) >= sqs.MAX_BATCH_SIZE:
+                return batch, None
+            try:
+                message = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                return batch, None
+        return batch, _STOP
+
+    def _run(self):
+        carried = None
+        while True:
+            batch, carried = self._collect(carried)
+            if batch:
+                try:
+                    failed = len(sqs.send_messages(batch))
+                    with self._lock:
+                        self.sent += len(batch) - failed
+                        self.failed += failed
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            if carried is _STOP:
+                self._queue.task_done()
+                return
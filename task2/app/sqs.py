@@ -1,4 +1,5 @@
 import logging
+import time
 import boto3
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, EndpointConnectionError
 
@@ -7,6 +8,15 @@ import config
 logging.basicConfig(level=config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+# Largest number of messages SQS returns from one receive_message call and accepts in one batch request.
+MAX_BATCH_SIZE = 10
+# Largest total size of the message bodies of one send_message_batch call.
+MAX_BATCH_BYTES = 256 * 1024
+# Entries of a batch that failed on the side of SQS are sent again up to SEND_RETRIES times, waiting
+# SEND_RETRY_DELAY seconds before the first retry and twice as long before each next one.
+SEND_RETRIES = 3
+SEND_RETRY_DELAY = 0.1
+
 
 def create_sqs_client():
     try:
@@ -32,48 +42,88 @@ def create_sqs_client():
 sqs = create_sqs_client()
 
 
-def get_from_queue():
+def receive_messages(max_messages=MAX_BATCH_SIZE):
+    """
+    Receive up to max_messages (at most 10) messages from the queue, waiting up to 20 seconds for the first one.
+    Returns the list of received messages, empty if there were none or receiving failed.
+    """
     if not sqs:
         logger.error("SQS client is not initialized.")
-        return None
+        return []
     try:
         response = sqs.receive_message(
             QueueUrl=config.WORKER_QUEUE_URL,
-            MaxNumberOfMessages=1,
+            MaxNumberOfMessages=max_messages,
             WaitTimeSeconds=20
         )
-        if 'Messages' in response:
-            return response['Messages'][0]
-        else:
-            return None
+        return response.get('Messages', [])
     except Exception as e:
-        logger.error(f"Error retrieving message from queue: {e}")
-        return None
+        logger.error(f"Error retrieving messages from queue: {e}")
+        return []
 
 
-def delete_from_queue(receipt_handle):
+def delete_messages(messages):
+    """
+    Delete the received messages (at most 10) from the queue with a single batch request. Returns the messages that
+    could not be deleted, which are received again once their visibility timeout expires.
+    """
     if not sqs:
         logger.error("SQS client is not initialized.")
-        return
+        return messages
+    if not messages:
+        return []
     try:
-        sqs.delete_message(
+        response = sqs.delete_message_batch(
             QueueUrl=config.WORKER_QUEUE_URL,
-            ReceiptHandle=receipt_handle
+            Entries=[{'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']} for i, message in enumerate(messages)]
         )
-        logger.info("Message deleted from queue successfully.")
     except Exception as e:
-        logger.error(f"Error deleting message from queue: {e}")
+        logger.error(f"Error deleting messages from queue: {e}")
+        return messages
+    failed = response.get('Failed', [])
+    for failure in failed:
+        logger.error(f"Error deleting message from queue: {failure.get('Code')} {failure.get('Message', '')}")
+    logger.info(f"Deleted {len(messages) - len(failed)} messages from queue successfully.")
+    return [messages[int(failure['Id'])] for failure in failed]
+
 
+def message_size(message):
+    return len(message.encode('utf-8'))
 
-def send_message_to_queue(message):
+
+def send_messages(messages, retries=SEND_RETRIES):
+    """
+    Send the messages (at most 10, of at most 256 KB together) to the queue with a single batch request. Entries that
+    failed are sent again, without the ones that were sent, unless SQS rejected them as invalid.
+    Returns the messages that could not be sent.
+    """
     if not sqs:
         logger.error("SQS client is not initialized.")
-        return
-    try:
-        sqs.send_message(
-            QueueUrl=config.WORKER_QUEUE_URL,
-            MessageBody=message
-        )
-        logger.info(f"Message sent to queue: {message}")
-    except Exception as e:
-        logger.error(f"Error sending message to queue: {e}")
+        return messages
+    pending = dict(enumerate(messages))
+    failed = {}
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(SEND_RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            response = sqs.send_message_batch(
+                QueueUrl=config.WORKER_QUEUE_URL,
+                Entries=[{'Id': str(i), 'MessageBody': message} for i, message in pending.items()]
+            )
+        except Exception as e:
+            logger.error(f"Error sending messages to queue: {e}")
+            continue
+        retried = {}
+        for failure in response.get('Failed', []):
+            i = int(failure['Id'])
+            logger.error(f"Error sending message to queue: {failure.get('Code')} {failure.get('Message', '')}")
+            if failure.get('SenderFault'):
+                failed[i] = pending[i]
+            else:
+                retried[i] = pending[i]
+        logger.info(f"Sent {len(pending) - len(response.get('Failed', []))} messages to queue successfully.")
+        pending = retried
+        if not pending:
+            break
+    failed.update(pending)
+    return [failed[i] for i in sorted(failed)]
@@ -8,23 +8,100 @@ from fastapi.testclient import TestClient
 from unittest.mock import patch
 import api
 
-client = TestClient(api.app)
-
 
 class TestAPI(unittest.TestCase):
 
-    @patch('sqs.send_message_to_queue')
-    def test_post_event_success(self, mock_send_message_to_queue):
-        response = client.post("/event", json={"msg": "Hello, SQS!"})
+    def setUp(self):
+        # The context manager runs the lifespan of the app, which starts and stops the sender threads.
+        self.client = TestClient(api.app)
+        self.client.__enter__()
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+
+    @patch('sqs.send_messages', return_value=[])
+    def test_post_event_success(self, mock_send_messages):
+        response = self.client.post("/event", json={"msg": "Hello, SQS!"})
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"status": "Message received: Hello, SQS!"})
-        mock_send_message_to_queue.assert_called_once_with("Hello, SQS!")
+        api.message_sender.join()
+        mock_send_messages.assert_called_once_with(["Hello, SQS!"])
 
     def test_post_event_missing_msg_key(self):
-        response = client.post("/event", json={"message": "This is wrong"})
+        response = self.client.post("/event", json={"message": "This is wrong"})
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json(), {"detail": "Missing 'msg' key in the payload."})
 
+    def test_post_event_msg_not_string(self):
+        response = self.client.post("/event", json={"msg": 42})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "The 'msg' value must be a string."})
+
+    @patch.object(api.message_sender, 'submit', return_value=False)
+    def test_post_event_queue_full(self, mock_submit):
+        response = self.client.post("/event", json={"msg": "Hello, SQS!"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        mock_submit.assert_called_once_with("Hello, SQS!")
+
+    @patch('sqs.send_messages', return_value=[])
+    def test_post_events_json_array(self, mock_send_messages):
+        body = [{"msg": f"message {i}"} for i in range(25)] + [{"message": "wrong"}, {"msg": 1}]
+        response = self.client.post("/events", json=body)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['accepted'], result['invalid'], result['rejected']), (25, 2, 0))
+        self.assertEqual(result['results'][0], {'status': 'accepted'})
+        self.assertEqual(result['results'][25:], [{'status': 'invalid', 'detail': "Missing 'msg' key in the payload."},
+                                                  {'status': 'invalid', 'detail': "The 'msg' value must be a string."}])
+        api.message_sender.join()
+        sent = [message for call in mock_send_messages.call_args_list for message in call.args[0]]
+        self.assertEqual(sorted(sent), sorted(f"message {i}" for i in range(25)))
+
+    @patch('sqs.send_messages', return_value=[])
+    def test_post_events_ndjson(self, mock_send_messages):
+        body = '{"msg": "first"}\nnot json\n\n{"msg": "second"}'
+        response = self.client.post("/events", content=body, headers={"Content-Type": "application/x-ndjson"})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['accepted'], result['invalid'], result['rejected']), (2, 1, 0))
+        self.assertEqual(result['results'][1]['status'], 'invalid')
+        self.assertTrue(result['results'][1]['detail'].startswith('Invalid JSON'))
+
+    def test_post_events_queue_full(self):
+        with patch.object(api.message_sender, 'submit_many', side_effect=lambda messages: 1) as mock_submit_many:
+            response = self.client.post("/events", json=[{"msg": "first"}, {"msg": "second"}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(response.json()['results'], [{'status': 'accepted'},
+                                                      {'status': 'rejected', 'detail': api.QUEUE_FULL}])
+        mock_submit_many.assert_called_once_with(["first", "second"])
+
+    def test_post_events_malformed_body(self):
+        with patch.object(api.message_sender, 'submit_many', side_effect=len):
+            response = self.client.post("/events", content='[{"msg": "first"}, {"msg"',
+                                        headers={"Content-Type": "application/json"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail']['results'], [{'status': 'accepted'}])
+
+    def test_post_events_item_too_large(self):
+        async def iter_events(chunks, ndjson=False):
+            yield "first", None
+            raise api.events.EventTooLarge("Event 1 is longer than 100 characters.")
+
+        with patch.object(api.message_sender, 'submit_many', side_effect=len), \
+                patch('events.iter_events', iter_events):
+            response = self.client.post("/events", json=[{"msg": "first"}, {"msg": "x" * 1000}])
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['detail'], {'error': "Event 1 is longer than 100 characters.",
+                                                     'results': [{'status': 'accepted'}]})
+
+    def test_get_queue(self):
+        response = self.client.get("/queue")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['capacity'], api.config.SENDER_QUEUE_SIZE)
+        self.assertEqual(response.json()['threads'], api.config.SENDER_THREADS)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -5,6 +5,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 import unittest
 from unittest.mock import MagicMock, patch
+from pymongo.errors import BulkWriteError
 from database import MongoDBClient
 
 
@@ -12,6 +13,12 @@ class TestMongoDBClient(unittest.TestCase):
     def setUp(self):
         self.database = MongoDBClient()
 
+    def tearDown(self):
+        # The instance is a singleton, drop the connect mocks and the handles cached by the tests.
+        self.database.__dict__.pop('connect', None)
+        self.database.connection = None
+        self.database.collection = None
+
     def test_singleton_instance(self):
         first_instance = MongoDBClient()
         second_instance = MongoDBClient()
@@ -24,8 +31,26 @@ class TestMongoDBClient(unittest.TestCase):
 
         client = self.database.connect()
         self.assertIsNotNone(client)
-        mock_mongo_client.assert_called_once_with(mock_config.MONGODB_URI)
-        mock_mongo_client.return_value.admin.command.assert_called_with('ping')
+        mock_mongo_client.assert_called_once_with(
+            mock_config.MONGODB_URI,
+            maxPoolSize=mock_config.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=mock_config.MONGODB_MIN_POOL_SIZE,
+            heartbeatFrequencyMS=mock_config.MONGODB_HEARTBEAT_FREQUENCY_MS,
+            serverSelectionTimeoutMS=mock_config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=mock_config.MONGODB_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=mock_config.MONGODB_SOCKET_TIMEOUT_MS
+        )
+        mock_mongo_client.return_value.admin.command.assert_called_once_with('ping')
+
+    @patch('database.MongoClient')
+    @patch('database.config')
+    def test_insert_data_reuses_client_and_collection(self, mock_config, mock_mongo_client):
+        self.database.insert_data([{'msg': 'first'}])
+        self.database.insert_data([{'msg': 'second'}])
+        mock_mongo_client.assert_called_once()
+        mock_mongo_client.return_value.admin.command.assert_called_once_with('ping')
+        collection = mock_mongo_client.return_value.__getitem__.return_value.__getitem__.return_value
+        self.assertEqual(collection.insert_many.call_count, 2)
 
     @patch('database.MongoClient')
     @patch('database.config')
@@ -33,7 +58,16 @@ class TestMongoDBClient(unittest.TestCase):
         mock_mongo_client.side_effect = Exception("Connection failure")
         client = self.database.connect()
         self.assertIsNone(client)
-        mock_mongo_client.assert_called_once_with(mock_config.MONGODB_URI)
+        mock_mongo_client.assert_called_once()
+
+    @patch('database.MongoClient')
+    @patch('database.config')
+    def test_connect_ping_failure_closes_client(self, mock_config, mock_mongo_client):
+        mock_mongo_client.return_value.admin.command.side_effect = Exception("Server selection timeout")
+        self.assertIsNone(self.database.connect())
+        mock_mongo_client.return_value.close.assert_called_once()
+        self.assertIsNone(self.database.connect())
+        self.assertEqual(mock_mongo_client.return_value.close.call_count, 2)
 
     @patch('database.MongoClient')
     def test_insert_data_success(self, mock_mongo_client):
@@ -46,9 +80,9 @@ class TestMongoDBClient(unittest.TestCase):
 
         data = [{'key': 'value'}]
         self.database.connect = MagicMock(return_value=mock_mongo_client.return_value)
-        self.database.insert_data(data)
+        self.assertEqual(self.database.insert_data(data), [0])
 
-        mock_collection.insert_many.assert_called_once_with(data)
+        mock_collection.insert_many.assert_called_once_with(data, ordered=True)
 
     @patch('database.MongoClient')
     def test_insert_data_failure(self, mock_mongo_client):
@@ -60,9 +94,44 @@ class TestMongoDBClient(unittest.TestCase):
 
         data = [{'key': 'value'}]
         self.database.connect = MagicMock(return_value=mock_mongo_client.return_value)
-        self.database.insert_data(data)
-
-        mock_collection.insert_many.assert_called_once_with(data)
+        self.assertIsNone(self.database.insert_data(data))
+
+        mock_collection.insert_many.assert_called_once_with(data, ordered=True)
+
+    def mock_collection(self):
+        mock_client = MagicMock()
+        self.database.connect = MagicMock(return_value=mock_client)
+        return mock_client.__getitem__.return_value.__getitem__.return_value
+
+    def test_insert_data_unordered_partial_failure(self):
+        mock_collection = self.mock_collection()
+        mock_collection.insert_many.side_effect = BulkWriteError({
+            'writeErrors': [{'index': 1, 'code': 11000, 'errmsg': 'duplicate key'},
+                            {'index': 2, 'code': 121, 'errmsg': 'document failed validation'}],
+            'writeConcernErrors': [],
+            'nInserted': 2
+        })
+        data = [{'_id': str(i)} for i in range(4)]
+        self.assertEqual(self.database.insert_data(data, ordered=False), [0, 1, 3])
+        mock_collection.insert_many.assert_called_once_with(data, ordered=False)
+
+    def test_insert_data_ordered_stops_at_first_error(self):
+        mock_collection = self.mock_collection()
+        mock_collection.insert_many.side_effect = BulkWriteError({
+            'writeErrors': [{'index': 1, 'code': 121, 'errmsg': 'document failed validation'}],
+            'writeConcernErrors': [],
+            'nInserted': 1
+        })
+        self.assertEqual(self.database.insert_data([{}, {}, {}]), [0])
+
+    def test_insert_data_write_concern_error(self):
+        mock_collection = self.mock_collection()
+        mock_collection.insert_many.side_effect = BulkWriteError({
+            'writeErrors': [],
+            'writeConcernErrors': [{'code': 64, 'errmsg': 'waiting for replication timed out'}],
+            'nInserted': 2
+        })
+        self.assertIsNone(self.database.insert_data([{}, {}], ordered=False))
 
 
 if __name__ == '__main__':
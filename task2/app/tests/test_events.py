@@ -0,0 +1,111 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import events
+
+
+async def _chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def parse(chunks, ndjson=False):
+    async def collect():
+        return [event async for event in events.iter_events(_chunks(chunks), ndjson=ndjson)]
+    return asyncio.run(collect())
+
+
+class TestValidateEvent(unittest.TestCase):
+
+    def test_valid_event(self):
+        self.assertEqual(events.validate_event({'msg': 'hello'}), ('hello', None))
+
+    def test_invalid_events(self):
+        self.assertEqual(events.validate_event({'message': 'hello'}), (None, "Missing 'msg' key in the payload."))
+        self.assertEqual(events.validate_event(['msg']), (None, "Missing 'msg' key in the payload."))
+        self.assertEqual(events.validate_event({'msg': 1}), (None, "The 'msg' value must be a string."))
+
+    @patch('events.sqs.MAX_BATCH_BYTES', 4)
+    def test_message_too_large(self):
+        self.assertEqual(events.validate_event({'msg': 'hello'}), (None, "The 'msg' value is larger than 256 KB."))
+
+
+class TestIterEvents(unittest.TestCase):
+
+    def test_json_array_split_across_chunks(self):
+        body = '[{"msg": "a"}, {"msg": "ż"}, 12, {"msg": "b"}]'.encode('utf-8')
+        chunks = [body[i:i + 3] for i in range(0, len(body), 3)]
+        self.assertEqual(parse(chunks), [('a', None), ('ż', None), (None, "Missing 'msg' key in the payload."),
+                                         ('b', None)])
+
+    def test_empty_json_array(self):
+        self.assertEqual(parse([b' [ ', b'] ']), [])
+
+    def test_malformed_json_array(self):
+        for body in (b'{"msg": "a"}', b'[{"msg": "a"} {"msg": "b"}]', b'[{"msg": "a"}', b'[{"msg": "a"}] x'):
+            with self.subTest(body=body):
+                with self.assertRaises(ValueError):
+                    parse([body])
+
+    def test_items_before_malformed_data_are_yielded(self):
+        async def collect(seen):
+            async for event in events.iter_events(_chunks([b'[{"msg": "a"}, {"msg": "b"}, ]']), ndjson=False):
+                seen.append(event)
+
+        seen = []
+        with self.assertRaises(ValueError):
+            asyncio.run(collect(seen))
+        self.assertEqual(seen, [('a', None), ('b', None)])
+
+    @patch('events.MAX_EVENT_LENGTH', 20)
+    def test_syntax_error_before_end_of_data(self):
+        async def collect(seen):
+            chunks = [b'[{"msg": "a"}, {bad}, ' + b' ' * 30] + [b'{"msg": "b"}, '] * 10 + [b'{"msg": "c"}]']
+            async for event in events.iter_events(_chunks(chunks), ndjson=False):
+                seen.append(event)
+
+        seen = []
+        with self.assertRaises(ValueError) as context:
+            asyncio.run(collect(seen))
+        self.assertNotIsInstance(context.exception, events.EventTooLarge)
+        self.assertIn("Invalid JSON in item 1", str(context.exception))
+        self.assertEqual(seen, [('a', None)])
+
+    def test_items_split_inside_tokens(self):
+        body = '[{"msg": "a\\u00e9", "n": -1.5e+3, "t": true, "f": false, "z": null}]'.encode('utf-8')
+        for size in range(1, len(body)):
+            with self.subTest(size=size):
+                chunks = [body[i:i + size] for i in range(0, len(body), size)]
+                self.assertEqual(parse(chunks), [('a\u00e9', None)])
+
+    @patch('events.MAX_EVENT_LENGTH', 20)
+    def test_event_too_large(self):
+        for ndjson, body in ((False, b'[{"msg": "a"}, {"msg": "'), (True, b'{"msg": "a"}\n{"msg": "')):
+            with self.subTest(ndjson=ndjson):
+                async def collect(seen):
+                    chunks = [body] + [b'x' * 8] * 10 + [b'"}]' if not ndjson else b'"}']
+                    async for event in events.iter_events(_chunks(chunks), ndjson=ndjson):
+                        seen.append(event)
+
+                seen = []
+                with self.assertRaises(events.EventTooLarge) as context:
+                    asyncio.run(collect(seen))
+                self.assertEqual(seen, [('a', None)])
+                self.assertIn("Event 1 is longer than 20 characters", str(context.exception))
+
+    def test_ndjson(self):
+        result = parse([b'{"msg": "a"}\n{"ms', b'g": "b"}\n\nnot json\n{"msg": "c"}'], ndjson=True)
+        self.assertEqual(result[:2], [('a', None), ('b', None)])
+        self.assertIsNone(result[2][0])
+        self.assertTrue(result[2][1].startswith('Invalid JSON'))
+        self.assertEqual(result[3], ('c', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
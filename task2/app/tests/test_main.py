@@ -0,0 +1,46 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+import main
+
+MESSAGES = [{'MessageId': f'id-{i}', 'Body': f'message {i}', 'ReceiptHandle': f'handle-{i}'} for i in range(3)]
+
+
+class TestCheckQueue(unittest.TestCase):
+    @patch('main.sqs')
+    def test_process_messages_deletes_stored_messages(self, mock_sqs):
+        mongo_client = MagicMock()
+        mongo_client.insert_data.return_value = [0, 2]
+        main.process_messages(mongo_client, MESSAGES)
+        mongo_client.insert_data.assert_called_once_with(
+            [{'_id': 'id-0', 'msg': 'message 0'}, {'_id': 'id-1', 'msg': 'message 1'},
+             {'_id': 'id-2', 'msg': 'message 2'}],
+            ordered=False
+        )
+        mock_sqs.delete_messages.assert_called_once_with([MESSAGES[0], MESSAGES[2]])
+
+    @patch('main.sqs')
+    def test_process_messages_keeps_messages_when_insert_fails(self, mock_sqs):
+        mongo_client = MagicMock()
+        mongo_client.insert_data.return_value = None
+        main.process_messages(mongo_client, MESSAGES)
+        mock_sqs.delete_messages.assert_not_called()
+
+    @patch('main.database.MongoDBClient')
+    @patch('main.sqs')
+    def test_check_queue_processes_batches(self, mock_sqs, mock_mongo_client):
+        mock_sqs.receive_messages.side_effect = [MESSAGES, [], KeyboardInterrupt]
+        mock_mongo_client.return_value.insert_data.return_value = [0, 1, 2]
+        with self.assertRaises(KeyboardInterrupt):
+            main.check_queue()
+        mock_mongo_client.return_value.insert_data.assert_called_once()
+        mock_sqs.delete_messages.assert_called_once_with(MESSAGES)
+
+
+if __name__ == '__main__':
+    unittest.main()
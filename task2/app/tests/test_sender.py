@@ -0,0 +1,120 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import unittest
+from unittest.mock import patch
+
+import sender
+
+
+class TestMessageSender(unittest.TestCase):
+
+    @patch('sender.sqs.send_messages')
+    def test_sends_submitted_messages(self, mock_send):
+        mock_send.side_effect = lambda batch: [message for message in batch if message == 'bad']
+        message_sender = sender.MessageSender(2, 10)
+        message_sender.start()
+        for message in ('a', 'bad', 'c'):
+            self.assertTrue(message_sender.submit(message))
+        message_sender.join()
+        message_sender.stop()
+        sent = [message for call in mock_send.call_args_list for message in call.args[0]]
+        self.assertEqual(sorted(sent), ['a', 'bad', 'c'])
+        self.assertEqual(message_sender.stats(), {'depth': 0, 'capacity': 10, 'threads': 0, 'sent': 2, 'failed': 1})
+
+    def test_submit_refused_when_not_running(self):
+        self.assertFalse(sender.MessageSender(1, 10).submit('a'))
+
+    @patch('sender.sqs.send_messages')
+    def test_submit_refused_when_queue_full(self, mock_send):
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocked_send(batch):
+            started.set()
+            release.wait()
+            return []
+
+        mock_send.side_effect = blocked_send
+        message_sender = sender.MessageSender(1, 2)
+        message_sender.start()
+        self.assertTrue(message_sender.submit('a'))
+        started.wait()
+        self.assertTrue(message_sender.submit('b'))
+        self.assertTrue(message_sender.submit('c'))
+        self.assertFalse(message_sender.submit('d'))
+        self.assertEqual(message_sender.depth(), 2)
+        release.set()
+        message_sender.stop()
+        self.assertEqual([call.args[0] for call in mock_send.call_args_list], [['a'], ['b', 'c']])
+
+    @patch('sender.sqs.send_messages', return_value=[])
+    def test_stop_sends_pending_messages(self, mock_send):
+        message_sender = sender.MessageSender(3, 100)
+        message_sender.start()
+        for i in range(50):
+            message_sender.submit(str(i))
+        message_sender.stop()
+        self.assertEqual(sum(len(call.args[0]) for call in mock_send.call_args_list), 50)
+        self.assertFalse(message_sender.running)
+
+    @patch('sender.sqs.send_messages', return_value=[])
+    def test_message_submitted_while_stopping_is_sent(self, mock_send):
+        message_sender = sender.MessageSender(1, 10)
+        message_sender.start()
+        stopping = threading.Thread(target=message_sender.stop)
+        put_nowait = message_sender._queue.put_nowait
+
+        def put_while_stopping(message):
+            # stop() runs between the check of submit_many and the put.
+            stopping.start()
+            stopping.join(0.1)
+            put_nowait(message)
+
+        with patch.object(message_sender._queue, 'put_nowait', put_while_stopping):
+            self.assertTrue(message_sender.submit('a'))
+        stopping.join()
+        mock_send.assert_called_once_with(['a'])
+        self.assertEqual(message_sender.depth(), 0)
+
+
+class TestCollect(unittest.TestCase):
+
+    def setUp(self):
+        self.message_sender = sender.MessageSender(1, 100)
+
+    def test_batch_limited_to_max_batch_size(self):
+        for i in range(12):
+            self.message_sender._queue.put(str(i))
+        batch, carried = self.message_sender._collect(None)
+        self.assertEqual(batch, [str(i) for i in range(10)])
+        self.assertIsNone(carried)
+        self.assertEqual(self.message_sender.depth(), 2)
+
+    @patch('sender.sqs.MAX_BATCH_BYTES', 10)
+    def test_batch_limited_to_max_batch_bytes(self):
+        for message in ('aaaa', 'bbbb', 'cccc'):
+            self.message_sender._queue.put(message)
+        batch, carried = self.message_sender._collect(None)
+        self.assertEqual(batch, ['aaaa', 'bbbb'])
+        self.assertEqual(carried, 'cccc')
+        self.assertEqual(self.message_sender._collect(carried), (['cccc'], None))
+
+    def test_batch_waits_for_linger(self):
+        self.message_sender.linger = 0.5
+        self.message_sender._queue.put('a')
+        threading.Timer(0.05, self.message_sender._queue.put, args=('b',)).start()
+        batch, _ = self.message_sender._collect(None)
+        self.assertEqual(batch, ['a', 'b'])
+
+    def test_batch_ends_at_stop(self):
+        self.message_sender._queue.put('a')
+        self.message_sender._queue.put(sender._STOP)
+        self.assertEqual(self.message_sender._collect(None), (['a'], sender._STOP))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -54,67 +54,94 @@ class TestSQSFunctions(unittest.TestCase):
         self.assertIsNone(sqs_client)
 
     @patch('sqs.sqs')
-    def test_get_from_queue_success(self, mock_sqs):
-        mock_sqs.receive_message.return_value = {
-            'Messages': [{'Body': 'test message', 'ReceiptHandle': 'test_receipt_handle'}]}
-        message = sqs.get_from_queue()
+    def test_receive_messages_success(self, mock_sqs):
+        messages = [{'MessageId': str(i), 'Body': f'message {i}', 'ReceiptHandle': f'handle {i}'} for i in range(3)]
+        mock_sqs.receive_message.return_value = {'Messages': messages}
+        received = sqs.receive_messages()
         mock_sqs.receive_message.assert_called_once_with(
             QueueUrl=config.WORKER_QUEUE_URL,
-            MaxNumberOfMessages=1,
+            MaxNumberOfMessages=10,
             WaitTimeSeconds=20
         )
-        self.assertEqual(message, {'Body': 'test message', 'ReceiptHandle': 'test_receipt_handle'})
+        self.assertEqual(received, messages)
 
     @patch('sqs.sqs')
-    def test_get_from_queue_no_message(self, mock_sqs):
+    def test_receive_messages_no_message(self, mock_sqs):
         mock_sqs.receive_message.return_value = {}
-        message = sqs.get_from_queue()
-        mock_sqs.receive_message.assert_called_once_with(
-            QueueUrl=config.WORKER_QUEUE_URL,
-            MaxNumberOfMessages=1,
-            WaitTimeSeconds=20
-        )
-        self.assertIsNone(message)
+        self.assertEqual(sqs.receive_messages(), [])
 
     @patch('sqs.sqs')
-    def test_get_from_queue_error(self, mock_sqs):
+    def test_receive_messages_error(self, mock_sqs):
         mock_sqs.receive_message.side_effect = Exception("Error receiving message")
-        message = sqs.get_from_queue()
-        self.assertIsNone(message)
+        self.assertEqual(sqs.receive_messages(), [])
 
     @patch('sqs.sqs')
-    def test_delete_from_queue_success(self, mock_sqs):
-        sqs.delete_from_queue('test_receipt_handle')
-        mock_sqs.delete_message.assert_called_once_with(
+    def test_delete_messages_success(self, mock_sqs):
+        mock_sqs.delete_message_batch.return_value = {'Successful': [{'Id': '0'}, {'Id': '1'}]}
+        messages = [{'ReceiptHandle': 'first'}, {'ReceiptHandle': 'second'}]
+        self.assertEqual(sqs.delete_messages(messages), [])
+        mock_sqs.delete_message_batch.assert_called_once_with(
             QueueUrl=config.WORKER_QUEUE_URL,
-            ReceiptHandle='test_receipt_handle'
+            Entries=[{'Id': '0', 'ReceiptHandle': 'first'}, {'Id': '1', 'ReceiptHandle': 'second'}]
         )
 
     @patch('sqs.sqs')
-    def test_delete_from_queue_error(self, mock_sqs):
-        mock_sqs.delete_message.side_effect = Exception("Error deleting message")
-        sqs.delete_from_queue('test_receipt_handle')
+    def test_delete_messages_partial_failure(self, mock_sqs):
+        mock_sqs.delete_message_batch.return_value = {
+            'Successful': [{'Id': '0'}],
+            'Failed': [{'Id': '1', 'Code': 'ReceiptHandleIsInvalid', 'SenderFault': True}]
+        }
+        messages = [{'ReceiptHandle': 'first'}, {'ReceiptHandle': 'second'}]
+        self.assertEqual(sqs.delete_messages(messages), [messages[1]])
+
+    @patch('sqs.sqs')
+    def test_delete_messages_error(self, mock_sqs):
+        mock_sqs.delete_message_batch.side_effect = Exception("Error deleting messages")
+        messages = [{'ReceiptHandle': 'first'}]
+        self.assertEqual(sqs.delete_messages(messages), messages)
 
     @patch('sqs.sqs')
-    def test_send_message_to_queue_success(self, mock_sqs):
-        sqs.send_message_to_queue('test message')
-        mock_sqs.send_message.assert_called_once_with(
+    def test_delete_messages_empty(self, mock_sqs):
+        self.assertEqual(sqs.delete_messages([]), [])
+        mock_sqs.delete_message_batch.assert_not_called()
+
+    @patch('sqs.sqs')
+    def test_send_messages_success(self, mock_sqs):
+        mock_sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}, {'Id': '1'}]}
+        self.assertEqual(sqs.send_messages(['first', 'second']), [])
+        mock_sqs.send_message_batch.assert_called_once_with(
             QueueUrl=config.WORKER_QUEUE_URL,
-            MessageBody='test message'
+            Entries=[{'Id': '0', 'MessageBody': 'first'}, {'Id': '1', 'MessageBody': 'second'}]
         )
 
+    @patch('sqs.time.sleep')
+    @patch('sqs.sqs')
+    def test_send_messages_retries_failed_entries(self, mock_sqs, mock_sleep):
+        mock_sqs.send_message_batch.side_effect = [
+            {'Successful': [{'Id': '0'}], 'Failed': [{'Id': '1', 'Code': 'InternalError', 'SenderFault': False},
+                                                     {'Id': '2', 'Code': 'InvalidMessageContents',
+                                                      'SenderFault': True}]},
+            {'Successful': [{'Id': '1'}]}
+        ]
+        self.assertEqual(sqs.send_messages(['first', 'second', 'third']), ['third'])
+        self.assertEqual(mock_sqs.send_message_batch.call_args_list[1].kwargs['Entries'],
+                         [{'Id': '1', 'MessageBody': 'second'}])
+        mock_sleep.assert_called_once_with(sqs.SEND_RETRY_DELAY)
+
+    @patch('sqs.time.sleep')
     @patch('sqs.sqs')
-    def test_send_message_to_queue_error(self, mock_sqs):
-        mock_sqs.send_message.side_effect = Exception("Error sending message")
-        sqs.send_message_to_queue('test message')
+    def test_send_messages_error(self, mock_sqs, mock_sleep):
+        mock_sqs.send_message_batch.side_effect = Exception("Error sending messages")
+        self.assertEqual(sqs.send_messages(['first', 'second'], retries=2), ['first', 'second'])
+        self.assertEqual(mock_sqs.send_message_batch.call_count, 3)
 
     @patch.object(sqs.logger, 'error')
     @patch('sqs.sqs', None)
     def test_client_not_initialized(self, mock_logger_error):
         functions_to_test = [
-            (sqs.get_from_queue, (), {}),
-            (sqs.delete_from_queue, ('test_receipt_handle',), {}),
-            (sqs.send_message_to_queue, ('test message',), {})
+            (sqs.receive_messages, (), {}),
+            (sqs.delete_messages, ([{'ReceiptHandle': 'test_receipt_handle'}],), {}),
+            (sqs.send_messages, (['test message'],), {})
         ]
 
         for func, args, kwargs in functions_to_test: